@@ -42,9 +42,9 @@ from .grammar.elements  import (ElementBase, Sequence, Alternative,
                                 Empty, Impossible)
 
 from .grammar.context   import Context, AppContext, FuncContext
-from .grammar.list      import ListBase, List, DictList
+from .grammar.list      import ListBase, List, DictList, SetList
 from .grammar.recobs    import (RecognitionObserver, RecognitionHistory,
-                                PlaybackHistory)
+                                PlaybackHistory, CorpusRecorder)
 from .grammar.recobs_callbacks   import (CallbackRecognitionObserver,
                                          register_beginning_callback,
                                          register_recognition_callback,
@@ -59,7 +59,7 @@ from .actions           import (ActionBase, DynStrActionBase, ActionError,
                                 Mimic, Playback, WaitWindow, FocusWindow,
                                 Function, StartApp, BringApp, PlaySound,
                                 Typeable, Keyboard, typeables, RunCommand,
-                                ContextAction)
+                                CommandPool, ContextAction)
 
 if sys.platform.startswith("win"):
     from .actions       import (KeyboardInput, MouseInput, HardwareInput,
@@ -67,10 +67,7 @@ if sys.platform.startswith("win"):
 
 # --------------------------------------------------------------------------
 
-if sys.platform.startswith("win"):
-    from .windows.clipboard import Clipboard
-else:
-    from .util              import Clipboard
+from .windows           import Clipboard
 
 # --------------------------------------------------------------------------
 
@@ -73,9 +73,7 @@ def _on_begin():
     print("Speech start detected.")
 
 
-def _on_recognition(words):
-    message = u"Recognized: %s" % u" ".join(words)
-
+def _print_text(message):
     # This only seems to be an issue with Python 2.7 on Windows.
     if six.PY2:
         encoding = sys.stdout.encoding or "ascii"
@@ -83,6 +81,10 @@ def _on_recognition(words):
     print(message)
 
 
+def _on_recognition(words):
+    _print_text(u"Recognized: %s" % u" ".join(words))
+
+
 def _on_failure():
     print("Sorry, what was that?")
 
@@ -217,10 +219,104 @@ def cli_cmd_load_directory(args):
     return return_code
 
 
+def cli_cmd_bench(args):
+    # Import locally because this module is only needed for this command.
+    from dragonfly.bench import read_corpus, replay_corpus
+
+    # Set the logging level.
+    _set_logging_level(args)
+
+    # Read the corpus file. Return early if it is invalid.
+    try:
+        entries = read_corpus(args.corpus)
+    except (IOError, OSError, ValueError) as e:
+        LOG.error(e)
+        return 1
+
+    # Initialise the specified engine. Return early if there was an error.
+    engine = _init_engine(args)
+    if engine is None:
+        return 1
+
+    # Connect to the engine, load command modules and replay the corpus,
+    # printing a latency report afterwards.
+    LOG.debug("Benchmarking with engine '%s'", args.engine)
+    with engine.connection():
+        return_code = _load_cmd_modules(args)
+        LOG.info("Replaying %d utterance(s) %d time(s)", len(entries),
+                 args.repeat)
+        results = replay_corpus(entries, engine, execute=not args.no_execute,
+                                repeat=args.repeat)
+
+    print(results.format_report())
+    if results.failures:
+        LOG.warning("%d of %d replayed utterance(s) failed",
+                    results.failures, len(results.samples))
+
+    # Return the success of module loading.
+    return return_code
+
+
+def cli_cmd_transcribe(args):
+    # Import locally because this module is only needed for this command.
+    import io
+    import json
+    from dragonfly.engines.backend_kaldi.transcribe import (
+        read_file_list, transcribe_files, TranscriptionStats)
+
+    # Set the logging level.
+    _set_logging_level(args)
+
+    # Read the file list. Return early if it is invalid.
+    try:
+        items = read_file_list(args.file_list)
+    except (IOError, OSError, ValueError) as e:
+        LOG.error(e)
+        return 1
+
+    # Flatten the command module file lists. Each worker process loads the
+    # command modules itself.
+    module_files = []
+    for lst in args.files:
+        for f in lst:
+            module_files.append(f.name)
+            f.close()
+
+    # Transcribe the files, writing results in input order as they become
+    # available.
+    LOG.info("Transcribing %d file(s)", len(items))
+    stats = TranscriptionStats()
+    if args.output:
+        output = io.open(args.output, "w", encoding="utf-8")
+    else:
+        output = None
+    try:
+        for result in transcribe_files(items, module_files,
+                                       args.engine_options, args.processes):
+            stats.add(result)
+            line = six.text_type(json.dumps(result, ensure_ascii=False))
+            if output:
+                output.write(line + u"\n")
+            else:
+                _print_text(line)
+    except EngineError as e:
+        LOG.error(e)
+        return 1
+    finally:
+        if output:
+            output.close()
+
+    # Print the accuracy summary to stderr, keeping stdout for results.
+    sys.stderr.write(stats.format_report() + "\n")
+    return 1 if stats.errors else 0
+
+
 _COMMAND_MAP = {
     "test": cli_cmd_test,
     "load": cli_cmd_load,
     "load-directory": cli_cmd_load_directory,
+    "bench": cli_cmd_bench,
+    "transcribe": cli_cmd_transcribe,
 }
 
 
@@ -271,6 +367,24 @@ def _valid_file_or_pattern(string):
     return [file_type(string)]
 
 
+def _valid_file_path(string):
+    if not os.path.isfile(string):
+        msg = "%r is not a valid file path" % string
+        raise argparse.ArgumentTypeError(msg)
+    return string
+
+
+def _positive_int(string):
+    try:
+        value = int(string)
+    except ValueError:
+        value = 0
+    if value < 1:
+        msg = "%r is not a positive integer" % string
+        raise argparse.ArgumentTypeError(msg)
+    return value
+
+
 def _valid_directory_path(string):
     if not os.path.isdir(string):
         msg = "%r is not a valid directory path" % string
@@ -395,6 +509,64 @@ def make_arg_parser():
         no_recobs_messages_argument, log_level_argument, quiet_argument
     )
 
+    # Create the parser for the "bench" command.
+    parser_bench = subparsers.add_parser(
+        "bench",
+        help="Replay a recorded utterance corpus through a dragonfly engine "
+        "and report latency percentiles per phase and per grammar."
+    )
+    corpus_argument = _build_argument(
+        "corpus", type=_valid_file_path,
+        help="Corpus file with one JSON utterance entry per line."
+    )
+    engine_argument = _build_argument(
+        "-e", "--engine", default="text",
+        help="Name of the engine to use for replaying the corpus."
+    )
+    repeat_argument = _build_argument(
+        "-r", "--repeat", default=1, type=_positive_int,
+        help="Number of times to replay the corpus."
+    )
+    no_execute_argument = _build_argument(
+        "--no-execute", default=False, action="store_true",
+        help="Only parse utterances without processing recognized rules. "
+             "Only applies to the \"text\" engine."
+    )
+    _add_arguments(
+        parser_bench,
+        corpus_argument, cmd_module_files_argument, engine_argument,
+        engine_options_argument, language_argument, repeat_argument,
+        no_execute_argument, log_level_argument, quiet_argument
+    )
+
+    # Create the parser for the "transcribe" command.
+    parser_transcribe = subparsers.add_parser(
+        "transcribe",
+        help="Transcribe wave files with the Kaldi engine using a pool of "
+        "worker processes and write the results as JSON lines."
+    )
+    file_list_argument = _build_argument(
+        "file_list", type=_valid_file_path,
+        help="File with one wave file path per line, such as a retain.tsv "
+             "file. Reference text in the fifth tab-separated column is "
+             "used for measuring accuracy."
+    )
+    processes_argument = _build_argument(
+        "-p", "--processes", default=None, type=_positive_int,
+        help="Number of worker processes. By default, this is the number of "
+             "CPUs."
+    )
+    output_argument = _build_argument(
+        "--output", default=None,
+        help="File to write JSON lines results to instead of stdout."
+    )
+    _add_arguments(
+        parser_transcribe,
+        file_list_argument, cmd_module_files_argument,
+        engine_options_argument, processes_argument, output_argument,
+        log_level_argument, quiet_argument
+    )
+
     # Return the argument parser.
     return parser
 
@@ -27,7 +27,7 @@ from .action_playback     import Playback
 from .action_base         import (ActionBase, DynStrActionBase,
                                   Repeat, ActionError)
 from .action_mimic        import Mimic
-from .action_cmd          import RunCommand
+from .action_cmd          import RunCommand, CommandPool
 from .action_context      import ContextAction
 from .keyboard            import Keyboard, Typeable
 from .typeables           import typeables
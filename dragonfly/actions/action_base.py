@@ -30,6 +30,8 @@ import logging
 
 from six import PY2, integer_types, text_type
 
+from ..engines.base.timing import timed_phase
+
 
 #---------------------------------------------------------------------------
 
@@ -95,8 +97,9 @@ class ActionBase(object):
     def execute(self, data=None):
         self._log_exec.debug("Executing action: %s (%s)", self, data)
         try:
-            if self._execute(data) is False:
-                raise ActionError(str(self))
+            with timed_phase("action", type(self)):
+                if self._execute(data) is False:
+                    raise ActionError(str(self))
         except ActionError as e:
             self._log_exec.error("Execution failed: %s", e)
             return False
@@ -117,6 +117,47 @@ Example using a subclass::
     Ping().execute()
 
 
+Execution pools, futures and callbacks
+----------------------------------------------------------------------------
+
+Each execution of a :class:`RunCommand` action creates a
+:class:`concurrent.futures.Future` object, available through the action's
+:attr:`future` property.  Its result is the command's return code.  The
+optional *callback* argument is called with the future once the command
+has finished.
+
+Asynchronous commands are normally started immediately and processed in a
+new thread.  Frequently run commands may instead be run using a
+:class:`CommandPool`, which processes commands in a bounded number of
+worker threads.  Commands queued in a pool are cancelled when the engine
+disconnects.
+
+Short commands may also be run using a persistent shell process, which
+avoids starting a new shell for each execution.  This is only supported on
+POSIX platforms.  The command's output is collected before the
+:meth:`process_command` method is called with a :class:`Popen`-like
+object.  Commands run this way cannot read from stdin.
+
+Persistent shells are kept by the thread executing synchronous commands
+(normally the engine thread) and by :class:`CommandPool` worker threads.
+They are terminated when the engine disconnects and started again when
+needed.  Asynchronous commands not run in a pool are started as a new
+process, as usual, since their threads are not reused.
+
+Example using a pool, a persistent shell and a callback::
+
+    from __future__ import print_function
+    from dragonfly import RunCommand, CommandPool
+
+    pool = CommandPool(max_workers=2)
+
+    def callback(future):
+        print("git status returned %d" % future.result())
+
+    RunCommand('git status', pool=pool, persistent_shell=True,
+               callback=callback).execute()
+
+
 Class reference
 ----------------------------------------------------------------------------
 
@@ -124,19 +165,201 @@ Class reference
 
 from __future__ import print_function
 
+from concurrent.futures import Future
+import io
 import locale
 import os
 import shlex
 import subprocess
 import threading
+import uuid
 
 from six import string_types, binary_type
+from six.moves import queue, shlex_quote
 
 from .action_base import ActionBase
 
 # --------------------------------------------------------------------------
 
 
+class _ShellProcess(object):
+    """ :class:`Popen`-like object for a command run by a persistent shell.
+    """
+
+    def __init__(self, returncode, output):
+        self.returncode = returncode
+        self.stdout = io.BytesIO(output)
+        self.stdin = None
+        self.pid = None
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self):
+        return self.returncode
+
+
+class _ShellWorker(object):
+    """ Persistent POSIX shell process for running short commands. """
+
+    def __init__(self):
+        self._proc = None
+        self._marker = ("__dragonfly_%s__" % uuid.uuid4().hex).encode()
+
+    def run(self, command):
+        """
+        Run a command string and return a (return code, output) tuple.
+        """
+        if self._proc is None or self._proc.poll() is not None:
+            self._proc = subprocess.Popen(["/bin/sh"],
+                                          stdout=subprocess.PIPE,
+                                          stderr=subprocess.STDOUT,
+                                          stdin=subprocess.PIPE)
+
+        # Run the command in a sub-shell, then print a marker line with the
+        # return code.  The marker is preceded by a newline in case the
+        # output doesn't end with one.
+        script = (u"(%s) </dev/null 2>&1\nprintf '\\n%s %%d\\n' $?\n"
+                  % (command, self._marker.decode()))
+        self._proc.stdin.write(script.encode(locale.getpreferredencoding()))
+        self._proc.stdin.flush()
+
+        output = []
+        for line in iter(self._proc.stdout.readline, b''):
+            if line.startswith(self._marker):
+                returncode = int(line[len(self._marker):].strip())
+                return returncode, b''.join(output)[:-1]
+            output.append(line)
+
+        # The shell exited unexpectedly.
+        self._proc = None
+        raise RuntimeError("Persistent shell exited while running %r"
+                           % command)
+
+    def terminate(self):
+        if self._proc is not None and self._proc.poll() is None:
+            self._proc.terminate()
+        self._proc = None
+
+
+_thread_local = threading.local()
+_shell_workers = []
+_shell_workers_lock = threading.Lock()
+_shell_workers_engines = set()
+
+
+def _get_shell_worker():
+    # Shell workers are not thread-safe, so use one per thread.  This is
+    # only called from long-lived threads: the thread executing synchronous
+    # commands and pool worker threads.
+    worker = getattr(_thread_local, "shell_worker", None)
+    if worker is None:
+        worker = _ShellWorker()
+        _thread_local.shell_worker = worker
+        with _shell_workers_lock:
+            _shell_workers.append(worker)
+
+    # Terminate the shells when the current engine disconnects.
+    from dragonfly.engines import get_current_engine
+    engine = get_current_engine()
+    if engine is not None and engine not in _shell_workers_engines:
+        _shell_workers_engines.add(engine)
+        engine.register_disconnect_callback(_terminate_shell_workers)
+    return worker
+
+
+def _terminate_shell_workers():
+    # Workers start a new shell if they are used again.
+    with _shell_workers_lock:
+        workers = list(_shell_workers)
+    for worker in workers:
+        worker.terminate()
+
+
+class CommandPool(object):
+    """
+        Pool of daemon worker threads for running :class:`RunCommand`
+        actions asynchronously.
+
+        Commands are run in the order they are submitted.  At most
+        *max_workers* commands are run at the same time; other commands
+        are queued until a worker is available.  Queued commands are
+        cancelled when the engine used to execute them disconnects.
+
+        Worker threads are daemonized so that running commands cannot
+        stop the Python process from exiting.
+
+    """
+
+    def __init__(self, max_workers=4):
+        """
+            Constructor arguments:
+             - *max_workers* (int, default 4) -- maximum number of commands
+               to run concurrently.
+
+        """
+        if max_workers < 1:
+            raise ValueError("max_workers must be greater than 0")
+        self.max_workers = max_workers
+        self._queue = queue.Queue()
+        self._threads = []
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._engines = set()
+
+    def submit(self, function, *args):
+        """
+            Schedule a function to be called with the given arguments in a
+            worker thread and return a :class:`Future` for its result.
+        """
+        future = Future()
+        with self._lock:
+            self._pending.add(future)
+            if len(self._threads) < self.max_workers:
+                thread = threading.Thread(target=self._worker,
+                                          name="CommandPoolThread")
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+        future.add_done_callback(self._discard)
+        self._register_disconnect_callback()
+        self._queue.put((future, function, args))
+        return future
+
+    def cancel_pending(self):
+        """
+            Cancel all queued commands which haven't started yet.
+
+            :returns: the number of cancelled commands
+            :rtype: int
+        """
+        with self._lock:
+            pending = list(self._pending)
+        return len([future for future in pending if future.cancel()])
+
+    def _discard(self, future):
+        with self._lock:
+            self._pending.discard(future)
+
+    def _register_disconnect_callback(self):
+        # Cancel queued commands when the current engine disconnects.
+        from dragonfly.engines import get_current_engine
+        engine = get_current_engine()
+        if engine is not None and engine not in self._engines:
+            self._engines.add(engine)
+            engine.register_disconnect_callback(self.cancel_pending)
+
+    def _worker(self):
+        while True:
+            future, function, args = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(function(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+
 class RunCommand(ActionBase):
     """
         Start an application from the command-line.
@@ -148,9 +371,12 @@ class RunCommand(ActionBase):
     """
     command = None
     synchronous = False
+    pool = None
+    persistent_shell = False
 
     def __init__(self, command=None, process_command=None,
-                 synchronous=False, hide_window=True):
+                 synchronous=False, hide_window=True, pool=None,
+                 persistent_shell=False, callback=None):
         """
             Constructor arguments:
              - *command* (str or list) -- the command to run when this
@@ -168,10 +394,23 @@ class RunCommand(ActionBase):
                application window. Set to *False* if using this action with
                GUI programs. This argument only applies to Windows. It has
                no effect on other platforms.
+             - *pool* (:class:`CommandPool`, default *None*) -- optional
+               pool to run the command in if running asynchronously. The
+               command is started when a pool worker becomes available.
+             - *persistent_shell* (bool, default *False*) -- whether to run
+               the command using a persistent shell process instead of
+               starting a new process. This argument only applies to POSIX
+               platforms and to commands that are synchronous or run in a
+               pool. Commands are parsed the same way in either case, so
+               shell syntax such as pipes and variables is not interpreted.
+             - *callback* (callable) -- optional callable to invoke with
+               the execution's :class:`Future` object once the command has
+               finished.
 
         """
         ActionBase.__init__(self)
         self._proc = None
+        self._future = None
 
         # Complex handling of arguments because of clashing use of the names
         # at the class level: property & class-value.
@@ -188,8 +427,17 @@ class RunCommand(ActionBase):
             raise TypeError("process_command must be a callable object or "
                             "None")
 
+        if not (callback is None or callable(callback)):
+            raise TypeError("callback must be a callable object or None")
+
+        if pool is not None:
+            self.pool = pool
+        if persistent_shell is not False:
+            self.persistent_shell = persistent_shell
+
         self._process_command = process_command
         self._hide_window = hide_window
+        self._callback = callback
 
         # Set the string used for representing actions.
         if isinstance(self.command, list):
@@ -205,6 +453,15 @@ class RunCommand(ActionBase):
         """
         return self._proc
 
+    @property
+    def future(self):
+        """
+            The :class:`Future` object for the most recent execution of
+            this action, otherwise ``None``. Its result is the command's
+            return code.
+        """
+        return self._future
+
     # pylint: disable=no-self-use
     def process_command(self, proc):
         """
@@ -221,8 +478,17 @@ class RunCommand(ActionBase):
 
             print(line, end='')
 
-    def _execute(self, data=None):
-        self._log.info("Executing: %s", self.command)
+    def _start_process(self, persistent_shell=False):
+        """ Start the command and return its :class:`Popen` object. """
+        # Run the command using a persistent shell if requested.  Command
+        # strings are split using shlex as below and each argument is
+        # quoted, so that the shell doesn't interpret them.
+        command = self.command
+        if persistent_shell and os.name == "posix":
+            if isinstance(command, string_types):
+                command = shlex.split(command)
+            command = " ".join(shlex_quote(arg) for arg in command)
+            return _ShellProcess(*_get_shell_worker().run(command))
 
         # Suppress showing the new CMD.exe window on Windows.
         startupinfo = None
@@ -231,42 +497,82 @@ class RunCommand(ActionBase):
             startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
 
         # Pre-process self.command before passing it to subprocess.Popen.
-        command = self.command
         if isinstance(command, string_types):
             # Split command strings using shlex before passing it to Popen.
             # Use POSIX mode only if on a POSIX platform.
             command = shlex.split(command, posix=os.name == "posix")
+        return subprocess.Popen(command,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT,
+                                stdin=subprocess.PIPE,
+                                startupinfo=startupinfo)
+
+    def _process(self, proc):
+        """ Process the command and return its return code. """
         try:
-            self._proc = subprocess.Popen(command,
-                                          stdout=subprocess.PIPE,
-                                          stderr=subprocess.STDOUT,
-                                          stdin=subprocess.PIPE,
-                                          startupinfo=startupinfo)
+            if self._process_command:
+                process_func = self._process_command
+            else:
+                process_func = self.process_command
+            process_func(proc)
+            return_code = proc.wait()
+            if return_code != 0:
+                self._log.error("Command %s failed with return code "
+                                "%d", self._str, return_code)
+            return return_code
+        except Exception as e:
+            self._log.exception("Exception processing command %s: %s",
+                                self._str, e)
+            raise
+        finally:
+            # Other executions of this action may have started another
+            # process since.
+            if self._proc is proc:
+                self._proc = None
+
+    def _run(self):
+        """ Start and process the command in a pool worker thread. """
+        try:
+            proc = self._proc = self._start_process(self.persistent_shell)
+        except Exception as e:
+            self._log.exception("Exception from starting subprocess %s: "
+                                "%s", self._str, e)
+            raise
+        return self._process(proc)
+
+    def _execute(self, data=None):
+        self._log.info("Executing: %s", self.command)
+
+        # Run the command in a pool if one is set and the command is
+        # asynchronous.
+        if self.pool is not None and not self.synchronous:
+            future = self.pool.submit(self._run)
+            self._set_future(future)
+            return True
+
+        future = Future()
+        future.set_running_or_notify_cancel()
+        self._set_future(future)
+        try:
+            # Persistent shells run commands to completion, so they are
+            # only used for synchronous commands here.
+            proc = self._proc = self._start_process(self.persistent_shell and
+                                                    self.synchronous)
         except Exception as e:
             self._log.exception("Exception from starting subprocess %s: "
                                 "%s", self._str, e)
+            future.set_exception(e)
             return False
 
         # Call process_command either synchronously or asynchronously.
         def call():
             try:
-                if self._process_command:
-                    process_func = self._process_command
-                else:
-                    process_func = self.process_command
-                process_func(self._proc)
-                return_code = self._proc.wait()
-                if return_code != 0:
-                    self._log.error("Command %s failed with return code "
-                                    "%d", self._str, return_code)
-                    return False
-                return True
+                return_code = self._process(proc)
             except Exception as e:
-                self._log.exception("Exception processing command %s: %s",
-                                    self._str, e)
+                future.set_exception(e)
                 return False
-            finally:
-                self._proc = None
+            future.set_result(return_code)
+            return return_code == 0
 
         if self.synchronous:
             return call()
@@ -274,6 +580,11 @@ class RunCommand(ActionBase):
         # Execute in a new daemonized thread so that the command cannot
         # stop the SR engine from exiting.
         thread = threading.Thread(target=call)
-        thread.setDaemon(True)
+        thread.daemon = True
         thread.start()
         return True
+
+    def _set_future(self, future):
+        self._future = future
+        if self._callback:
+            future.add_done_callback(self._callback)
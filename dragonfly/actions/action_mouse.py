@@ -69,6 +69,13 @@ The code below moves the mouse cursor 25 pixels right and 25 pixels up
     #  by the given number of pixels.
     Mouse("<25, -25>").execute()
 
+On X11, mouse events are sent using the XTest extension over a persistent
+display connection, if available.  The events of each :class:`Mouse`
+action are sent to the X server together after the last event or before
+a pause.  Consecutive cursor movements are coalesced and relative
+movements are computed by the X server.  The *pynput* library is used
+instead if the XTest extension cannot be used.
+
 
 Mouse specification format
 ............................................................................
@@ -159,7 +166,7 @@ from ..windows.window   import Window
 
 from .mouse import (ButtonEvent, PauseEvent, MoveRelativeEvent,
                     MoveScreenEvent, MoveWindowEvent, PLATFORM_BUTTON_FLAGS,
-                    PLATFORM_WHEEL_FLAGS)
+                    PLATFORM_WHEEL_FLAGS, flush_events)
 
 # Imported for backwards-compatibility: these functions used to live here.
 from .mouse import get_cursor_position, set_cursor_position
@@ -344,8 +351,12 @@ class Mouse(DynStrActionBase):
     def _execute_events(self, events):
         """ Send events. """
         window = Window.get_foreground()
-        for event in events:
-            event.execute(window)
+        try:
+            for event in events:
+                event.execute(window)
+        finally:
+            # Send any events queued by the mouse implementation in one go.
+            flush_events()
 
     def __str__(self):
         return '<{}>'.format(self._spec)
@@ -32,10 +32,7 @@ from six import string_types, binary_type
 from ..actions.action_base import DynStrActionBase
 from ..actions.action_key import Key
 
-if sys.platform.startswith("win"):
-    from ..windows.clipboard import Clipboard
-else:
-    from ..util import Clipboard
+from ..windows import Clipboard
 
 
 # Define some win32 constants so that this module can work on other
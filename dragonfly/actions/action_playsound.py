@@ -66,6 +66,23 @@ files.
 Invalid file paths will result in errors on other platforms.
 
 
+Caching and non-blocking playback
+----------------------------------------------------------------------------
+
+Wave files played by :class:`PlaySound` are read and decoded once and then
+kept in a bounded in-memory cache, keyed by file path and modification
+time.  Executing the same action again will not read the file from disk
+unless it has changed.  Windows system sounds are not cached.
+
+By default, executing a :class:`PlaySound` action blocks until the sound
+has finished playing.  If the *block* argument is *False*, the sound is
+instead queued for playback on a dedicated audio thread and the action
+returns immediately.  This is useful for short feedback sounds played
+after each recognition::
+
+    PlaySound(file="beep.wav", block=False).execute()
+
+
 Class reference
 ----------------------------------------------------------------------------
 
@@ -75,11 +92,17 @@ Class reference
 # This file imports from optional or Win32-only packages depending on the
 # platform.
 
+from collections import OrderedDict
 from ctypes import CFUNCTYPE, c_char_p, c_int, cdll
 
+import io
+import logging
 import os
+import threading
 import wave
 
+from six.moves import queue
+
 if os.name == 'nt':
     import winsound
 
@@ -119,30 +142,176 @@ def _get_pa_instance():
     return pa
 
 
-def _pyaudio_play(name):
-    if not name:
-        return
+class _Sound(object):
+    """ Decoded wave file data. """
+
+    def __init__(self, path):
+        # Read the whole file.  The raw file data is needed for playback
+        # from memory on Windows.
+        with open(path, "rb") as f:
+            self.raw_data = f.read()
 
+        wf = wave.open(io.BytesIO(self.raw_data), "rb")
+        try:
+            self.sample_width = wf.getsampwidth()
+            self.channels = wf.getnchannels()
+            self.rate = wf.getframerate()
+            self.frames = wf.readframes(wf.getnframes())
+        finally:
+            wf.close()
+
+    @property
+    def size(self):
+        return len(self.raw_data) + len(self.frames)
+
+
+class _SoundCache(object):
+    """
+    Bounded least-recently-used cache of decoded wave files, keyed by file
+    path and modification time.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._sounds = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        key = (path, os.path.getmtime(path))
+        with self._lock:
+            sound = self._sounds.pop(key, None)
+            if sound is not None:
+                # Move the sound to the end as the most recently used.
+                self._sounds[key] = sound
+                return sound
+
+        sound = _Sound(path)
+        if sound.size > self.max_bytes:
+            return sound
+
+        with self._lock:
+            # Remove any stale entries for the file before adding the new
+            # one, then evict the least recently used sounds if necessary.
+            for stale_key in [k for k in self._sounds if k[0] == path]:
+                self._size -= self._sounds.pop(stale_key).size
+            self._sounds[key] = sound
+            self._size += sound.size
+            while self._size > self.max_bytes:
+                _, evicted = self._sounds.popitem(last=False)
+                self._size -= evicted.size
+        return sound
+
+    def clear(self):
+        with self._lock:
+            self._sounds.clear()
+            self._size = 0
+
+
+_sound_cache = _SoundCache(max_bytes=16 * 1024 * 1024)
+
+
+def _pyaudio_play(sound, pa=None):
     if pyaudio is None:
         # Raise an error because pyaudio isn't installed.
         raise RuntimeError("pyaudio must be installed to use PlaySound "
                            "on this platform")
 
-    # Play the wave file.
-    pa = _get_pa_instance()
-    chunk = 1024
-    wf = wave.open(name, 'rb')
-    stream = pa.open(format=pa.get_format_from_width(wf.getsampwidth()),
-                     channels=wf.getnchannels(), rate=wf.getframerate(),
+    # Play the decoded wave data, using a new pa instance unless one is
+    # given.
+    terminate = pa is None
+    if terminate:
+        pa = _get_pa_instance()
+    chunk = 1024 * sound.sample_width * sound.channels
+    stream = pa.open(format=pa.get_format_from_width(sound.sample_width),
+                     channels=sound.channels, rate=sound.rate,
                      output=True)
-    data = wf.readframes(chunk)
-    while data:
-        stream.write(data)
-        data = wf.readframes(chunk)
+    frames = sound.frames
+    for i in range(0, len(frames), chunk):
+        stream.write(frames[i:i + chunk])
 
     stream.stop_stream()
     stream.close()
-    pa.terminate()
+    if terminate:
+        pa.terminate()
+
+
+def _play(name, flags, is_file, pa=None):
+    if os.name == 'nt':
+        sound = None
+        if is_file and name:
+            try:
+                sound = _sound_cache.get(name)
+            except (IOError, OSError, wave.Error):
+                # Let Windows handle invalid files.
+                pass
+
+        if sound is not None:
+            # Play the cached file data from memory using the Windows API.
+            winsound.PlaySound(sound.raw_data, winsound.SND_MEMORY)
+        else:
+            # Play the file or sound using the Windows API.
+            winsound.PlaySound(name, flags)
+    elif name:
+        # Play the cached file data with pyaudio.
+        _pyaudio_play(_sound_cache.get(name), pa)
+
+
+class _AudioThread(threading.Thread):
+    """ Daemon thread for playing queued sounds in order. """
+
+    _log = logging.getLogger("action.exec")
+
+    def __init__(self, max_queued=16):
+        threading.Thread.__init__(self, name="PlaySoundThread")
+        self.daemon = True
+        self.queue = queue.Queue(max_queued)
+
+        # PyAudio instance used for every sound played by this thread.
+        self._pa = None
+
+    def enqueue(self, name, flags, is_file):
+        try:
+            self.queue.put_nowait((name, flags, is_file))
+        except queue.Full:
+            self._log.warning("Too many sounds queued for playback, "
+                              "skipping %r", name)
+
+    def run(self):
+        while True:
+            name, flags, is_file = self.queue.get()
+            try:
+                if (self._pa is None and name and os.name != 'nt' and
+                        pyaudio is not None):
+                    self._pa = _get_pa_instance()
+                _play(name, flags, is_file, self._pa)
+            except Exception as e:
+                self._log.exception("Failed to play sound %r: %s", name, e)
+
+                # Use a new PyAudio instance for the next sound, in case
+                # the audio devices have changed.
+                self._terminate_pa()
+
+    def _terminate_pa(self):
+        if self._pa is not None:
+            pa, self._pa = self._pa, None
+            try:
+                pa.terminate()
+            except Exception as e:
+                self._log.debug("Failed to terminate PyAudio: %s", e)
+
+
+_audio_thread = None
+_audio_thread_lock = threading.Lock()
+
+
+def _get_audio_thread():
+    global _audio_thread
+    with _audio_thread_lock:
+        if _audio_thread is None:
+            _audio_thread = _AudioThread()
+            _audio_thread.start()
+        return _audio_thread
 
 
 class PlaySound(ActionBase):
@@ -156,7 +325,7 @@ class PlaySound(ActionBase):
 
     """
 
-    def __init__(self, name='', file=None):
+    def __init__(self, name='', file=None, block=True):
         """
             Constructor arguments:
              - *name* (*str*, default *empty string*) --
@@ -164,6 +333,10 @@ class PlaySound(ActionBase):
                effectively an alias for *file* on other platforms.
              - *file* (*str*, default *None*) --
                path of wave file to play when the action is executed.
+             - *block* (*bool*, default *True*) --
+               whether to wait until the sound has finished playing. If
+               *False*, the sound is queued for playback on a dedicated
+               audio thread instead.
 
             If *name* and *file* are both *None*, then waveform playback
             will be silenced on Windows when the action is executed. Nothing
@@ -172,6 +345,8 @@ class PlaySound(ActionBase):
         """
         ActionBase.__init__(self)
         self._flags = 0
+        self._block = block
+        self._is_file = file is not None or os.name != 'nt'
         if file is not None:
             self._name = file
             if os.name == 'nt':
@@ -188,10 +363,14 @@ class PlaySound(ActionBase):
 
         self._str = str(self._name)
 
+    @classmethod
+    def clear_cache(cls):
+        """ Clear the cache of decoded wave files. """
+        _sound_cache.clear()
+
     def _execute(self, data=None):
-        if os.name == 'nt':
-            # Play the file or sound using the Windows API.
-            winsound.PlaySound(self._name, self._flags)
+        if self._block:
+            _play(self._name, self._flags, self._is_file)
         else:
-            # Play the file with pyaudio.
-            _pyaudio_play(self._name)
+            _get_audio_thread().enqueue(self._name, self._flags,
+                                        self._is_file)
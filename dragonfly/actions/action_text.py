@@ -106,18 +106,47 @@ It can also be done with one :class:`Key` action:
    Key("σ,μ,c-]").execute()
 
 
+Autoformat state caching
+............................................................................
+
+When the *autofmt* parameter is *True*, the :class:`Text` action needs to
+know the spacing and capitalization expected at the current insertion
+point.  The first time text is autoformatted in a window, this is done by
+mimicking a word recognition, selecting and copying the result and
+inspecting its formatting.  The resulting state is then cached per window
+handle and updated from the text that each :class:`Text` action types, so
+that consecutive autoformatted actions don't need to repeat this probe.
+The state is also updated from the engine's dictation formatter: each time
+dictation is formatted, the state after the formatted words is cached for
+the foreground window.
+
+The cached state of a window is ignored once it is older than
+:attr:`Text.autofmt_state_timeout` seconds.  It can also be set or cleared
+explicitly using :meth:`Text.set_autofmt_state` and
+:meth:`Text.clear_autofmt_state`.
+
+.. code:: python
+
+   # Always probe the window before autoformatting text.
+   Text.autofmt_state_timeout = 0
+
+
 Text class reference
 ............................................................................
 
 """
 
 from locale import getpreferredencoding
+import re
 import sys
+import time
 
 from six import binary_type
 
 from ..engines import get_engine
-from ..util.clipboard import Clipboard
+from ..engines.backend_natlink.dictation_format import StateFlags
+from ..windows import Clipboard
+from ..windows.window import Window
 from .action_base import ActionError
 from .action_base_keyboard import BaseKeyboardAction
 from .action_key import Key
@@ -153,17 +182,31 @@ class Text(BaseKeyboardAction):
                      hardware_events,
                      hardware_error_message,
                      unicode_events,
-                     unicode_error_message):
+                     unicode_error_message,
+                     text=None):
             self.hardware_events = hardware_events
             self.hardware_error_message = hardware_error_message
             self.unicode_events = unicode_events
             self.unicode_error_message = unicode_error_message
+            self.text = text
 
     _specials = {
         "\n": typeables["enter"],
         "\t": typeables["tab"],
     }
 
+    #: Number of seconds for which cached autoformat state is considered
+    #: valid.  Autoformatting will probe the foreground window again once
+    #: this has elapsed.
+    autofmt_state_timeout = 30.0
+
+    # Cached autoformat state, keyed by window handle.  Each value is a
+    # (StateFlags, time) tuple.
+    _autofmt_states = {}
+
+    # Handle of the foreground window when autoformat state was last used.
+    _autofmt_focus_handle = None
+
     def __init__(self, spec=None, static=False, pause=None,
                  autofmt=False, use_hardware=False):
         # Use the default pause time if pause in None.
@@ -216,45 +259,34 @@ class Text(BaseKeyboardAction):
                                              "this character: %r (in %r)" %
                                              (character, spec))
         return self.Events(hardware_events, hardware_error_message,
-                           unicode_events, unicode_error_message)
+                           unicode_events, unicode_error_message, spec)
 
     def _execute_events(self, events):
         """
         Send keyboard events.
 
         If instance was initialized with *autofmt* True,
-        then this method will mimic a word recognition
-        and analyze its formatting so as to autoformat
-        the text's spacing and capitalization before
-        sending it as keyboard events.
+        then this method will use the cached formatting
+        state of the foreground window, or mimic a word
+        recognition and analyze its formatting, so as to
+        autoformat the text's spacing and capitalization
+        before sending it as keyboard events.
+
+        The cached formatting state of the foreground window
+        is updated from the text typed.
         """
+        state = None
         if self._autofmt:
-            # Mimic a word, select and copy it to retrieve capitalization.
-            get_engine().mimic("test")
-            Key("cs-left, c-c/5").execute()
-            word = Clipboard.get_system_text()
-
-            # Inspect formatting of the mimicked word.
-            index = word.find("test")
-            if index == -1:
-                index = word.find("Test")
-                capitalize = True
-                if index == -1:
-                    self._log.error("Failed to autoformat.")
-                    return False
-            else:
-                capitalize = False
-
-            # Capitalize given text if necessary.
-            text = self._spec
-            if capitalize:
-                text = text[0].capitalize() + text[1:]
-
-            # Reconstruct autoformatted output and convert it
-            #  to keyboard events.
-            prefix = word[:index]
-            suffix = word[index + 4:]
-            events = self._parse_spec(prefix + text + suffix)
+            handle = Window.get_foreground().handle
+            result = self._autoformat_events(handle)
+            if result is None:
+                return False
+            events, state = result
+        elif Text._autofmt_states:
+            # Only look up the foreground window if there is cached state
+            # to update.
+            handle = Window.get_foreground().handle
+            state = self._get_autofmt_state(handle)
 
         # Send keyboard events.
         if self.require_hardware_events():
@@ -267,7 +299,153 @@ class Text(BaseKeyboardAction):
             raise ActionError(error_message)
         else:
             self._keyboard.send_keyboard_events(keyboard_events)
+
+        # Remember the state after the typed text for the next action.
+        if state is not None:
+            Text._autofmt_states[handle] = (
+                self._state_after_text(events.text, state), time.time()
+            )
         return True
 
+    #-----------------------------------------------------------------------
+    # Methods for autoformatting.
+
+    @classmethod
+    def set_autofmt_state(cls, state, window=None):
+        """
+        Set the cached autoformat state for a window.
+
+        :param state: formatting state at the window's insertion point
+        :type state: StateFlags
+        :param window: window to set the state of (default: the foreground
+           window)
+        :type window: Window
+        """
+        if window is None:
+            window = Window.get_foreground()
+            cls._autofmt_focus_handle = window.handle
+        cls._autofmt_states[window.handle] = (state, time.time())
+
+    @classmethod
+    def clear_autofmt_state(cls, window=None):
+        """
+        Clear cached autoformat state.
+
+        :param window: window to clear the state of (default: all windows)
+        :type window: Window
+        """
+        if window is None:
+            cls._autofmt_states.clear()
+        else:
+            cls._autofmt_states.pop(window.handle, None)
+
+    @classmethod
+    def _get_autofmt_state(cls, handle):
+        # Cached state is only used if it isn't stale and the window has
+        # stayed in the foreground since it was last used, because the
+        # insertion point may have been moved in the meantime.
+        if handle != cls._autofmt_focus_handle:
+            cls._autofmt_focus_handle = handle
+            cls._autofmt_states.pop(handle, None)
+            return None
+        state, timestamp = cls._autofmt_states.get(handle, (None, 0))
+        if time.time() - timestamp > cls.autofmt_state_timeout:
+            cls._autofmt_states.pop(handle, None)
+            return None
+        return state
+
+    @staticmethod
+    def _format_with_state(text, state):
+        """ Apply the spacing and capitalization of *state* to *text*. """
+        if not text:
+            return text
+        # Same precedence as the dictation formatter.
+        if state.cap_mode:
+            text = re.sub(r"(^|\s)(\S)",
+                          lambda match: match.group(1) + match.group(2).upper(),
+                          text)
+        elif state.upper_mode:
+            text = text.upper()
+        elif state.lower_mode:
+            text = text.lower()
+        elif state.cap_next or state.cap_next_force:
+            text = text[0].capitalize() + text[1:]
+        elif state.upper_next or state.lower_next:
+            parts = text.split(" ", 1)
+            parts[0] = (parts[0].upper() if state.upper_next
+                        else parts[0].lower())
+            text = " ".join(parts)
+
+        if state.no_space_before or state.no_space_mode:
+            prefix = ""
+        else:
+            prefix = " "
+        return prefix + text
+
+    @staticmethod
+    def _state_after_text(text, state):
+        """ Return the formatting state after *text* has been typed. """
+        if not text:
+            return state
+        new_state = StateFlags()
+
+        # Carry over formatting modes.
+        for name in ("no_space_mode", "cap_mode", "upper_mode",
+                     "lower_mode"):
+            setattr(new_state, name, getattr(state, name))
+
+        stripped = text.rstrip(" \t")
+        new_state.no_space_before = (text[-1].isspace() or
+                                     text[-1] in "([{")
+        new_state.cap_next = (text.endswith("\n") or
+                              stripped.endswith((".", "!", "?")))
+        new_state.prev_ended_in_period = stripped.endswith(".")
+        return new_state
+
+    def _probe_autofmt_state(self):
+        """
+        Mimic a word, select and copy it to retrieve the formatting state.
+
+        Returns a (state, prefix, suffix) tuple or *None* on failure.
+        """
+        get_engine().mimic("test")
+        Key("cs-left, c-c/5").execute()
+        word = Clipboard.get_system_text()
+
+        # Inspect formatting of the mimicked word.
+        state = StateFlags()
+        index = word.find("test")
+        if index == -1:
+            index = word.find("Test")
+            state.cap_next = True
+            if index == -1:
+                self._log.error("Failed to autoformat.")
+                return None
+        prefix = word[:index]
+        state.no_space_before = not prefix
+        return state, prefix, word[index + 4:]
+
+    def _autoformat_events(self, handle):
+        """
+        Return keyboard events for the autoformatted text and the
+        formatting state before it, using the cached formatting state of
+        the given window if possible.
+        """
+        state = self._get_autofmt_state(handle)
+        text = self._spec
+        if state is None:
+            result = self._probe_autofmt_state()
+            if result is None:
+                return None
+            # Use the exact spacing of the mimicked word.
+            state, prefix, suffix = result
+            formatting = state.clone()
+            formatting.no_space_before = True
+            output = (prefix + self._format_with_state(text, formatting) +
+                      suffix)
+        else:
+            output = self._format_with_state(text, state)
+        return self._parse_spec(output), state
+
     def __str__(self):
         return u"{!r}".format(self._spec)
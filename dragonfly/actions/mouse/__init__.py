@@ -28,7 +28,7 @@ import sys
 
 # Import mouse events common to each platform.
 from ._base import (EventBase, PauseEvent, MoveEvent, MoveRelativeEvent,
-                    MoveScreenEvent, MoveWindowEvent)
+                    MoveScreenEvent, MoveWindowEvent, flush_events)
 
 
 # Import the mouse functions and classes for the current platform.
@@ -40,8 +40,23 @@ if sys.platform.startswith("win") and not DOC_BUILD:
         PLATFORM_BUTTON_FLAGS, PLATFORM_WHEEL_FLAGS
     )
 
-elif ((os.environ.get("XDG_SESSION_TYPE") == "x11" or
-       sys.platform == "darwin") and not DOC_BUILD):
+elif os.environ.get("XDG_SESSION_TYPE") == "x11" and not DOC_BUILD:
+    # Use the XTest extension through a persistent display connection if
+    # possible. Fallback on pynput otherwise.
+    try:
+        from ._x11_xtest import (
+            ButtonEvent, get_cursor_position, set_cursor_position,
+            flush_events, PLATFORM_BUTTON_FLAGS, PLATFORM_WHEEL_FLAGS,
+            XTestMoveRelativeEvent as MoveRelativeEvent,
+            XTestPauseEvent as PauseEvent
+        )
+    except ImportError:
+        from ._pynput import (
+            ButtonEvent, get_cursor_position, set_cursor_position,
+            PLATFORM_BUTTON_FLAGS, PLATFORM_WHEEL_FLAGS
+        )
+
+elif sys.platform == "darwin" and not DOC_BUILD:
     from ._pynput import (
         ButtonEvent, get_cursor_position, set_cursor_position,
         PLATFORM_BUTTON_FLAGS, PLATFORM_WHEEL_FLAGS
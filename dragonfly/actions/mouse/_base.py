@@ -39,6 +39,12 @@ def set_cursor_position(x, y):
     raise NotImplementedError(message)
 
 
+def flush_events():
+    # Mouse events are sent immediately by default, so there is nothing to
+    # do here.
+    pass
+
+
 class MoveEventDelegate(object):
 
     @classmethod
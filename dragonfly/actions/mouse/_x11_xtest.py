@@ -0,0 +1,200 @@
+#
+# This file is part of Dragonfly.
+# (c) Copyright 2007, 2008 by Christo Butcher
+# Licensed under the LGPL.
+#
+#   Dragonfly is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU Lesser General Public License as published
+#   by the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   Dragonfly is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public
+#   License along with Dragonfly.  If not, see
+#   <http://www.gnu.org/licenses/>.
+#
+
+"""
+X11 mouse implementation using the XTest extension.
+
+Mouse events are sent over a persistent display connection.  Events are
+queued in the connection's output buffer and sent in one go when
+:func:`flush_events` is called, e.g. at the end of each :class:`Mouse`
+action or before a pause.  Consecutive cursor movements are coalesced into
+a single motion request while no button is held down, and relative
+movements are performed server-side, so no pointer queries are necessary
+between events.  Each movement of a drag is sent on its own.
+"""
+
+import threading
+
+from Xlib import X
+from Xlib.display import Display
+from Xlib.ext import xtest
+
+from ._base import BaseButtonEvent, MoveEvent, MoveRelativeEvent, PauseEvent
+
+
+try:
+    _display = Display()
+except Exception as e:
+    raise ImportError("Failed to open the X display: %s" % e)
+if not _display.has_extension("XTEST"):
+    raise ImportError("The X server does not support the XTest extension")
+_lock = threading.RLock()
+
+# Cursor motion not yet sent to the server: (relative, x, y) or None.
+_pending_motion = None
+
+# Buttons pressed by button events and not yet released.
+_pressed_buttons = set()
+
+
+#---------------------------------------------------------------------------
+# Functions for queueing and sending events.
+
+def _queue_motion(relative, x, y):
+    global _pending_motion
+    with _lock:
+        if _pressed_buttons:
+            # Don't merge the movements of a drag, so that applications
+            # receive each of them.
+            _send_pending_motion()
+            _send_motion(relative, x, y)
+        elif _pending_motion is None or not relative:
+            _pending_motion = (relative, x, y)
+        else:
+            # Add the relative movement to the pending motion.
+            pending_relative, pending_x, pending_y = _pending_motion
+            _pending_motion = (pending_relative, pending_x + x,
+                               pending_y + y)
+
+
+def _send_pending_motion():
+    global _pending_motion
+    with _lock:
+        if _pending_motion is None:
+            return
+        relative, x, y = _pending_motion
+        _pending_motion = None
+        _send_motion(relative, x, y)
+
+
+def _send_motion(relative, x, y):
+    xtest.fake_input(_display, X.MotionNotify, detail=relative,
+                     x=int(round(x)), y=int(round(y)))
+
+
+def flush_events():
+    """ Send all queued mouse events to the X server. """
+    with _lock:
+        _send_pending_motion()
+        _display.flush()
+
+
+#---------------------------------------------------------------------------
+# Functions and event delegate for getting and setting the cursor position.
+
+def get_cursor_position():
+    # Send queued events first so the position is up-to-date.
+    flush_events()
+    pointer = _display.screen().root.query_pointer()
+    return pointer.root_x, pointer.root_y
+
+
+def set_cursor_position(x, y):
+    _queue_motion(False, x, y)
+    return True
+
+
+class MoveEventDelegate(object):
+
+    @classmethod
+    def get_position(cls):
+        return get_cursor_position()
+
+    @classmethod
+    def set_position(cls, x, y):
+        return set_cursor_position(x, y)
+
+
+MoveEvent.delegate = MoveEventDelegate()
+
+
+#---------------------------------------------------------------------------
+# Button and wheel flags.
+
+PLATFORM_BUTTON_FLAGS = {
+    # ((button, event_type), down)
+    # The inner pair is used here and below to be compatible with the
+    # original Windows flags.
+    "left":   (((1, 0), 1),  # down
+               ((1, 0), 0)),  # up
+    "right":  (((3, 0), 1),
+               ((3, 0), 0)),
+    "middle": (((2, 0), 1),
+               ((2, 0), 0)),
+
+    # We call these "four" and "five" because Windows calls them that.
+    # These buttons typically behave as browser back and forward media keys.
+    "four": (((8, 0), 1),
+             ((8, 0), 0)),
+    "five": (((9, 0), 1),
+             ((9, 0), 0)),
+}
+
+PLATFORM_WHEEL_FLAGS = {
+    # ((button, event_type), scroll_count)
+    "wheelup": ((4, 1), 3),
+    "stepup": ((4, 1), 1),
+    "wheeldown": ((5, 1), 3),
+    "stepdown": ((5, 1), 1),
+    "wheelright": ((7, 1), 3),
+    "stepright": ((7, 1), 1),
+    "wheelleft": ((6, 1), 3),
+    "stepleft": ((6, 1), 1),
+}
+
+
+#---------------------------------------------------------------------------
+# Event classes.
+
+class ButtonEvent(BaseButtonEvent):
+
+    def execute(self, window):
+        with _lock:
+            # Send any pending motion first so the buttons are pressed at
+            # the right position.
+            _send_pending_motion()
+            for ((button, event_type), flag) in self._flags:
+                if event_type == 0:  # Button press event
+                    if flag:
+                        event = X.ButtonPress
+                        _pressed_buttons.add(button)
+                    else:
+                        event = X.ButtonRelease
+                        _pressed_buttons.discard(button)
+                    xtest.fake_input(_display, event, button)
+                elif event_type == 1:  # Scroll event
+                    for _ in range(abs(flag)):
+                        xtest.fake_input(_display, X.ButtonPress, button)
+                        xtest.fake_input(_display, X.ButtonRelease, button)
+
+
+class XTestMoveRelativeEvent(MoveRelativeEvent):
+
+    def execute(self, window):
+        # Let the X server compute the new position.
+        _queue_motion(True, self.horizontal, self.vertical)
+
+
+class XTestPauseEvent(PauseEvent):
+
+    def execute(self, window):
+        # Send queued events before pausing.
+        flush_events()
+        PauseEvent.execute(self, window)
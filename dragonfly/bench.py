@@ -0,0 +1,341 @@
+#
+# This file is part of Dragonfly.
+# (c) Copyright 2007, 2008 by Christo Butcher
+# Licensed under the LGPL.
+#
+#   Dragonfly is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU Lesser General Public License as published
+#   by the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   Dragonfly is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public
+#   License along with Dragonfly.  If not, see
+#   <http://www.gnu.org/licenses/>.
+#
+
+"""
+Utterance corpus replay and benchmarking
+============================================================================
+
+This module contains functions for replaying a corpus of recorded
+utterances through a Dragonfly engine and measuring how long each phase
+of recognition takes.  Corpus files can be recorded using the
+:class:`dragonfly.grammar.recobs.CorpusRecorder` recognition observer.
+
+A corpus file contains one JSON object per line with the following keys:
+
+ * ``words`` -- list of words (or a string of space-separated words).
+ * ``executable`` -- *optional* foreground window executable.
+ * ``title`` -- *optional* foreground window title.
+ * ``wav`` -- *optional* path to a wave file with the utterance audio.
+   Relative paths are resolved relative to the corpus file.
+
+Empty lines and lines starting with ``#`` are ignored.
+
+Utterances are replayed as follows:
+
+ * **text** engine: ``TextInputEngine.mimic()`` with the recorded window
+   executable and title.
+ * **kaldi** engine: ``KaldiEngine.recognize_wave_file()`` if the entry has
+   a wave file, otherwise ``mimic()``.
+ * **sphinx** engine: ``SphinxEngine.process_wave_file()`` if the entry has
+   a wave file, otherwise ``mimic()``.
+ * other engines: ``mimic()``.
+
+The following phases are measured for each utterance:
+
+ * ``decode`` -- from the start of replay until the recognition (or
+   failure) is reported to recognition observers.
+ * ``process`` -- from the recognition until rule processing (i.e.
+   ``Rule.process_recognition()``) has completed.
+ * ``total`` -- the whole replay call.
+
+Example usage::
+
+    from dragonfly import get_engine
+    from dragonfly.bench import read_corpus, replay_corpus
+
+    engine = get_engine("text")
+    # ... load grammars ...
+    results = replay_corpus(read_corpus("corpus.jsonl"), engine, repeat=5)
+    print(results.format_report())
+
+"""
+
+import io
+import json
+import logging
+import math
+import os
+from collections import namedtuple, OrderedDict
+from timeit import default_timer
+
+from six import string_types
+
+from dragonfly.engines import get_engine
+from dragonfly.engines.base import MimicFailure
+from dragonfly.grammar.recobs import RecognitionObserver
+
+_log = logging.getLogger("bench")
+
+
+#---------------------------------------------------------------------------
+# Corpus reading.
+
+CorpusEntry = namedtuple("CorpusEntry", "words executable title wav")
+CorpusEntry.__doc__ = """
+    Recorded utterance: words, window executable and title and an
+    optional wave file path.
+"""
+
+
+def read_corpus(path):
+    """
+        Read a corpus file and return a list of :class:`CorpusEntry`
+        objects.
+
+        :param path: corpus file path
+        :type path: str
+        :raises: ValueError if a line is not a valid corpus entry
+        :rtype: list
+    """
+    base_dir = os.path.dirname(os.path.abspath(path))
+    entries = []
+    with io.open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith(u"#"):
+                continue
+            try:
+                data = json.loads(line)
+                words = data["words"]
+            except (ValueError, KeyError, TypeError) as e:
+                raise ValueError("Invalid corpus entry on line %d of %r: %s"
+                                 % (line_number, path, e))
+            if isinstance(words, string_types):
+                words = words.split()
+            wav = data.get("wav")
+            if wav and not os.path.isabs(wav):
+                wav = os.path.join(base_dir, wav)
+            entries.append(CorpusEntry(tuple(words),
+                                       data.get("executable") or u"",
+                                       data.get("title") or u"", wav))
+    return entries
+
+
+#---------------------------------------------------------------------------
+# Statistics.
+
+def percentile(values, p):
+    """
+        Return the *p*-th percentile of *values* using the nearest-rank
+        method, or *None* if *values* is empty.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = int(math.ceil(p / 100.0 * len(ordered)))
+    return ordered[min(max(rank, 1), len(ordered)) - 1]
+
+
+BenchSample = namedtuple("BenchSample", "entry grammar success phases")
+BenchSample.__doc__ = """
+    Measurement of a single replayed utterance.  *phases* is a dictionary
+    of phase names to durations in seconds.
+"""
+
+
+class BenchResults(object):
+    """
+        Collection of :class:`BenchSample` measurements with methods for
+        summarizing them.
+    """
+
+    #: Group name used for statistics over all samples.
+    all_group = "(all)"
+
+    #: Group name used for failed recognitions.
+    failure_group = "(failure)"
+
+    def __init__(self):
+        self.samples = []
+
+    def add(self, sample):
+        """ Add a :class:`BenchSample` to the results. """
+        self.samples.append(sample)
+
+    @property
+    def failures(self):
+        """ Number of utterances which failed to be recognized. """
+        return sum(1 for sample in self.samples if not sample.success)
+
+    def _group_name(self, sample):
+        if not sample.success:
+            return self.failure_group
+        return sample.grammar or u"(unknown)"
+
+    def summary(self, percentiles=(50, 95, 99)):
+        """
+            Summarize the results.
+
+            Returns an ordered dictionary mapping group names to ordered
+            dictionaries of phase names to lists of the requested latency
+            percentiles in seconds.  Groups are :attr:`all_group` followed
+            by each recognized grammar name in sorted order and then
+            :attr:`failure_group`, if there were failures.
+        """
+        groups = OrderedDict([(self.all_group, [])])
+        grammar_groups = {}
+        for sample in self.samples:
+            groups[self.all_group].append(sample)
+            name = self._group_name(sample)
+            grammar_groups.setdefault(name, []).append(sample)
+        for name in sorted(grammar_groups, key=lambda n: (
+                n == self.failure_group, n)):
+            groups[name] = grammar_groups[name]
+
+        result = OrderedDict()
+        for name, samples in groups.items():
+            phases = OrderedDict()
+            for sample in samples:
+                for phase, duration in sample.phases.items():
+                    phases.setdefault(phase, []).append(duration)
+            result[name] = OrderedDict(
+                (phase, [percentile(durations, p) for p in percentiles])
+                for phase, durations in phases.items()
+            )
+        return result
+
+    def format_report(self, percentiles=(50, 95, 99)):
+        """
+            Return a table of latency percentiles in milliseconds per
+            grammar and phase.
+        """
+        headers = ["p%s" % p for p in percentiles]
+        lines = ["%-30s %-10s %6s %s" % ("grammar", "phase", "count",
+                                          " ".join("%10s" % h
+                                                   for h in headers))]
+        counts = {}
+        for sample in self.samples:
+            name = self._group_name(sample)
+            counts[name] = counts.get(name, 0) + 1
+        counts[self.all_group] = len(self.samples)
+
+        for name, phases in self.summary(percentiles).items():
+            for phase, values in phases.items():
+                cells = " ".join("%10.2f" % (value * 1000) for value in values)
+                lines.append("%-30s %-10s %6d %s" % (name[:30], phase,
+                                                     counts[name], cells))
+        return "\n".join(lines)
+
+
+#---------------------------------------------------------------------------
+# Replay.
+
+class _PhaseTimer(RecognitionObserver):
+    """ Recognition observer recording timestamps of observer events. """
+
+    def __init__(self):
+        RecognitionObserver.__init__(self)
+        self.events = {}
+        self.grammar = None
+
+    def reset(self):
+        self.events = {}
+        self.grammar = None
+
+    def on_recognition(self, words, rule):
+        self.events["recognition"] = default_timer()
+        if rule is not None:
+            self.grammar = rule.grammar.name
+
+    def on_failure(self):
+        self.events["failure"] = default_timer()
+
+    def on_post_recognition(self, words):
+        self.events["post_recognition"] = default_timer()
+
+
+def _replay_entry(engine, entry, execute):
+    if engine.name == "text":
+        window = {"executable": entry.executable, "title": entry.title}
+        if execute:
+            engine.mimic(entry.words, **window)
+        else:
+            result = next(engine.mimic_many([(entry.words, window)],
+                                            execute=False))
+            if not result.success:
+                raise MimicFailure("No matching rule found for words %r."
+                                   % (entry.words,))
+            return result.grammar.name
+    elif entry.wav and engine.name == "kaldi":
+        engine.recognize_wave_file(entry.wav)
+    elif entry.wav and engine.name == "sphinx":
+        for _ in engine.process_wave_file(entry.wav):
+            pass
+    else:
+        engine.mimic(entry.words)
+    return None
+
+
+def replay_corpus(entries, engine=None, execute=True, repeat=1):
+    """
+        Replay corpus entries through an engine and measure latency.
+
+        The engine should be connected and have the relevant grammars
+        loaded already.
+
+        :param entries: corpus entries to replay
+        :type entries: iterable of :class:`CorpusEntry`
+        :param engine: engine to use; defaults to the current engine
+        :param execute: whether to process recognized rules.  This only
+            applies to the text engine; if *False*, utterances are only
+            parsed and only the ``total`` phase is measured.
+        :type execute: bool
+        :param repeat: number of times to replay the whole corpus
+        :type repeat: int
+        :rtype: BenchResults
+    """
+    if engine is None:
+        engine = get_engine()
+    entries = list(entries)
+    results = BenchResults()
+    timer = _PhaseTimer()
+    engine.register_recognition_observer(timer)
+    try:
+        for _ in range(repeat):
+            for entry in entries:
+                timer.reset()
+                success = True
+                start = default_timer()
+                try:
+                    grammar = _replay_entry(engine, entry, execute)
+                except MimicFailure:
+                    grammar = None
+                    success = False
+                end = default_timer()
+
+                phases = OrderedDict()
+                events = timer.events
+                decoded = events.get("recognition", events.get("failure"))
+                if decoded is not None:
+                    phases["decode"] = decoded - start
+                if "recognition" in events and "post_recognition" in events:
+                    phases["process"] = (events["post_recognition"]
+                                         - events["recognition"])
+                phases["total"] = end - start
+
+                # Engines which do not raise MimicFailure for wave file
+                # input report failures to observers instead.
+                if "failure" in events:
+                    success = False
+                results.add(BenchSample(entry, grammar or timer.grammar,
+                                        success, phases))
+    finally:
+        engine.unregister_recognition_observer(timer)
+    return results
@@ -23,21 +23,27 @@ Audio input/output classes for Kaldi backend
 """
 
 from __future__ import division, print_function
-import collections, contextlib, datetime, itertools, logging, os, time, threading, wave
+import collections, contextlib, datetime, logging, os, socket, stat, sys, time, threading, wave
 from io import open
 
-from six import PY2, binary_type, text_type, print_
+from six import binary_type, string_types, text_type, print_
 from six.moves import queue, range
-import sounddevice
 import webrtcvad
 
+try:
+    import sounddevice
+except (ImportError, OSError) as e:
+    # Only needed for microphone input; e.g. PortAudio may be missing on a headless server.
+    sounddevice = None
+    _sounddevice_error = e
+
 from ..base import EngineError
 
 _log = logging.getLogger("engine")
 
 
-class MicAudio(object):
-    """Streams raw audio from microphone. Data is received in a separate thread, and stored in a buffer, to be read from."""
+class AudioSource(object):
+    """Base class for sources of raw audio, in the format expected by the decoder, read in blocks from a buffer."""
 
     FORMAT = 'int16'
     SAMPLE_WIDTH = 2
@@ -46,8 +52,54 @@ class MicAudio(object):
     BLOCKS_PER_SECOND = 100
     BLOCK_SIZE_SAMPLES = int(SAMPLE_RATE / float(BLOCKS_PER_SECOND))  # Block size in number of samples
     BLOCK_DURATION_MS = int(1000 * BLOCK_SIZE_SAMPLES // SAMPLE_RATE)  # Block duration in milliseconds
+    BLOCK_SIZE_BYTES = BLOCK_SIZE_SAMPLES * SAMPLE_WIDTH * CHANNELS
+
+    def read(self, nowait=False):
+        """Return a block of audio data. If nowait==False, waits for a block if necessary; else, returns False immediately if no block is available."""
+        raise NotImplementedError()
+
+    def read_loop(self, callback):
+        """Block looping reading, repeatedly passing a block of audio data to callback."""
+        for block in iter(self):
+            callback(block)
+
+    def iter(self, nowait=False):
+        """Generator that yields all audio blocks from the source."""
+        while True:
+            block = self.read(nowait=nowait)
+            if block is None:
+                break
+            yield block
+
+    def __iter__(self):
+        """Generator that yields all audio blocks from the source."""
+        return self.iter()
+
+    def get_wav_length_s(self, data):
+        assert isinstance(data, binary_type)
+        length_bytes = len(data)
+        assert self.FORMAT == 'int16'
+        length_samples = length_bytes / self.SAMPLE_WIDTH
+        return (float(length_samples) / self.SAMPLE_RATE)
+
+    def write_wav(self, filename, data):
+        # _log.debug("write wav %s", filename)
+        wf = wave.open(filename, 'wb')
+        wf.setnchannels(self.CHANNELS)
+        # wf.setsampwidth(self.pa.get_sample_size(FORMAT))
+        assert self.FORMAT == 'int16'
+        wf.setsampwidth(self.SAMPLE_WIDTH)
+        wf.setframerate(self.SAMPLE_RATE)
+        wf.writeframes(data)
+        wf.close()
+
+
+class MicAudio(AudioSource):
+    """Streams raw audio from microphone. Data is received in a separate thread, and stored in a buffer, to be read from."""
 
     def __init__(self, callback=None, buffer_s=0, flush_queue=True, start=True, input_device=None, self_threaded=None, reconnect_callback=None):
+        if sounddevice is None:
+            raise EngineError("Microphone input requires the sounddevice package: %s" % (_sounddevice_error,))
         self.callback = callback if callback is not None else lambda in_data: self.buffer_queue.put(in_data, block=False)
         self.flush_queue = bool(flush_queue)
         self.input_device = input_device
@@ -157,43 +209,10 @@ class MicAudio(object):
         else:
             return None  # We are done
 
-    def read_loop(self, callback):
-        """Block looping reading, repeatedly passing a block of audio data to callback."""
-        for block in iter(self):
-            callback(block)
-
-    def iter(self, nowait=False):
-        """Generator that yields all audio blocks from microphone."""
-        while True:
-            block = self.read(nowait=nowait)
-            if block is None:
-                break
-            yield block
-
-    def __iter__(self):
-        """Generator that yields all audio blocks from microphone."""
-        return self.iter()
-
-    def get_wav_length_s(self, data):
-        assert isinstance(data, binary_type)
-        length_bytes = len(data)
-        assert self.FORMAT == 'int16'
-        length_samples = length_bytes / self.SAMPLE_WIDTH
-        return (float(length_samples) / self.SAMPLE_RATE)
-
-    def write_wav(self, filename, data):
-        # _log.debug("write wav %s", filename)
-        wf = wave.open(filename, 'wb')
-        wf.setnchannels(self.CHANNELS)
-        # wf.setsampwidth(self.pa.get_sample_size(FORMAT))
-        assert self.FORMAT == 'int16'
-        wf.setsampwidth(self.SAMPLE_WIDTH)
-        wf.setframerate(self.SAMPLE_RATE)
-        wf.writeframes(data)
-        wf.close()
-
     @staticmethod
     def print_list():
+        if sounddevice is None:
+            raise EngineError("Listing input devices requires the sounddevice package: %s" % (_sounddevice_error,))
         print_("")
         print_("LISTING ALL INPUT DEVICES SUPPORTED BY PORTAUDIO")
         print_("(any device numbers not shown are for output only)")
@@ -221,11 +240,278 @@ class MicAudio(object):
         print_("")
 
 
-class VADAudio(MicAudio):
-    """Filter & segment audio with voice activity detection."""
+class StreamAudio(AudioSource):
+    """
+    Streams raw audio from a pipe, file or Unix socket, written by a separate process (for example one capturing a microphone
+    on another machine, or replaying recordings for load testing). The data must be raw PCM in the format of the other audio
+    classes: 16 kHz, 16-bit signed little-endian, mono. Data is read in a separate thread, and stored in a buffer, to be read from.
+
+    Data is read directly into one preallocated chunk of several blocks, which is reused for every read. Each block is copied
+    out of it once, as immutable bytes like the blocks of the other audio classes.
+
+    The buffer is bounded. By default, when it is full, reading pauses until the buffer is read from, so a writer streaming
+    faster than the engine recognizes is slowed down by its writes blocking. Reading also pauses while the source is stopped.
+
+    Constructor arguments:
+    - *source*: ``"-"`` for standard input; ``"unix:PATH"`` to listen on a Unix socket at *PATH*, accepting one connection at
+        a time; the path of a file or named pipe (FIFO); or a file-like object opened in binary mode.
+    - *buffer_s* (*float*, default *1*): maximum duration of audio to buffer.
+    - *overflow* (*str*, default *"block"*): what to do when the buffer is full: *"block"* pauses reading, *"drop"* discards
+        the block (counted in `dropped`), as for a live source that should not fall behind.
+    - *reconnect* (*bool*, default *True*): whether to wait for a new writer when the current one closes its end: a new
+        connection to the Unix socket, or a new writer opening the named pipe. Otherwise, and for other sources, the end of
+        the data ends the stream.
+    - *reconnect_callback* (*Callable*, default *None*): called with this object every time a writer connects, after the first.
+    - *chunk_blocks* (*int*, default *10*): number of blocks to read at a time, if available.
+    """
+
+    overflow_policies = ('block', 'drop')
+    unix_socket_prefix = 'unix:'
+    poll_interval_s = 0.1
+
+    def __init__(self, source, buffer_s=1, overflow='block', reconnect=True, reconnect_callback=None, chunk_blocks=10, start=True):
+        if overflow not in self.overflow_policies:
+            raise ValueError("Invalid overflow policy %r; expected one of %r" % (overflow, self.overflow_policies))
+        if reconnect_callback is not None and not callable(reconnect_callback):
+            _log.error("Invalid reconnect_callback not callable: %r", reconnect_callback)
+            reconnect_callback = None
+        self.source = source
+        self.overflow = overflow
+        self.reconnect_callback = reconnect_callback
+        self.chunk_bytes = max(1, int(chunk_blocks)) * self.BLOCK_SIZE_BYTES
+        self.dropped = 0
+
+        self.path = None
+        self.socket_path = None
+        self.file = None
+        if isinstance(source, string_types):
+            if source == '-':
+                self.file = getattr(sys.stdin, 'buffer', sys.stdin)
+            elif source.startswith(self.unix_socket_prefix):
+                if not hasattr(socket, 'AF_UNIX'):
+                    raise EngineError("Unix sockets are not supported on this platform")
+                self.socket_path = source[len(self.unix_socket_prefix):]
+            else:
+                if not os.path.exists(source):
+                    raise EngineError("Audio stream file %r does not exist" % source)
+                if not os.access(source, os.R_OK):
+                    raise EngineError("Audio stream file %r is not readable" % source)
+                self.path = source
+        elif hasattr(source, 'readinto') or hasattr(source, 'read'):
+            self.file = source
+        else:
+            raise TypeError("Invalid audio stream source not string or file-like object: %r" % (source,))
+        self.reconnectable = bool(reconnect) and (self.socket_path is not None
+            or (self.path is not None and os.path.exists(self.path) and stat.S_ISFIFO(os.stat(self.path).st_mode)))
+
+        self.buffer_queue = queue.Queue(maxsize=max(1, int(buffer_s * 1000 // self.BLOCK_DURATION_MS)))
+        self.server = None
+        self.connection = None
+        self.connections = 0
+        self.ended = False
+        self.thread = None
+        self.thread_cancelled = False
+        self.active = threading.Event()
+
+        if self.socket_path is not None:
+            self._listen()
+        if start:
+            self.start()
+
+    def __repr__(self):
+        return "%s(%r)" % (type(self).__name__, self.source)
+
+    def _listen(self):
+        if os.path.exists(self.socket_path) and stat.S_ISSOCK(os.stat(self.socket_path).st_mode):
+            os.remove(self.socket_path)  # Left over from a previous run
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(self.socket_path)
+        self.server.listen(1)
+        self.server.settimeout(self.poll_interval_s)
+        _log.info("%s: listening for audio on Unix socket '%s'", self, self.socket_path)
+
+    def _connect(self):
+        """ Waits for and returns a connection to read from, or None if cancelled. """
+        if self.socket_path is not None:
+            while not self.thread_cancelled:
+                try:
+                    connection, _ = self.server.accept()
+                except socket.timeout:
+                    continue
+                connection.settimeout(None)
+                return connection
+            return None
+        elif self.path is not None:
+            return open(self.path, 'rb', buffering=0)  # Blocks until a writer opens a named pipe
+        else:
+            return self.file
+
+    def _read_into(self, view):
+        connection = self.connection
+        if isinstance(connection, socket.socket):
+            return connection.recv_into(view)
+        readinto = getattr(connection, 'readinto1', None) or getattr(connection, 'readinto', None)
+        if readinto is not None:
+            return readinto(view) or 0
+        data = connection.read(len(view))
+        view[:len(data)] = data
+        return len(data)
+
+    def _close_connection(self):
+        connection, self.connection = self.connection, None
+        if connection is not None and connection is not self.file:
+            try:
+                connection.close()
+            except Exception:
+                _log.exception("%s: error closing audio stream connection", self)
+
+    def _reader_thread(self):
+        try:
+            self._read_stream()
+        finally:
+            self._close_connection()
+            self._put(None, force=True)  # Signal the end of the stream
+
+    def _read_stream(self):
+        block_bytes = self.BLOCK_SIZE_BYTES
+        view = memoryview(bytearray(self.chunk_bytes))
+        leftover = b''
+        while not self.thread_cancelled:
+            if not self.active.wait(self.poll_interval_s):
+                continue  # Stopped
+            if self.connection is None:
+                if self.connections and not self.reconnectable:
+                    break
+                try:
+                    self.connection = self._connect()
+                except Exception as e:
+                    _log.error("%s: error connecting to audio stream: %s", self, e)
+                    break
+                if self.connection is None:
+                    break
+                self.connections += 1
+                _log.info("%s: audio stream connected", self)
+                if self.connections > 1 and self.reconnect_callback is not None:
+                    self.reconnect_callback(self)
+
+            filled = len(leftover)
+            view[:filled] = leftover
+            try:
+                size = self._read_into(view[filled:])
+            except (IOError, OSError, ValueError) as e:
+                if not self.thread_cancelled:
+                    _log.warning("%s: error reading audio stream: %s", self, e)
+                size = 0
+            if not size:
+                # End of data from this writer
+                if leftover:
+                    _log.debug("%s: discarding %d bytes of incomplete block", self, len(leftover))
+                    leftover = b''
+                _log.info("%s: audio stream disconnected", self)
+                self._close_connection()
+                continue
+
+            filled += size
+            end = filled - (filled % block_bytes)
+            for offset in range(0, end, block_bytes):
+                self._put(view[offset:offset + block_bytes].tobytes())
+            leftover = view[end:filled].tobytes()
+
+    def _put(self, block, force=False):
+        if self.overflow == 'drop' and not force:
+            try:
+                self.buffer_queue.put_nowait(block)
+            except queue.Full:
+                self.dropped += 1
+                if self.dropped == 1 or not self.dropped % self.BLOCKS_PER_SECOND:
+                    _log.warning("%s: audio buffer full; dropped %d block(s) so far", self, self.dropped)
+            return
+        while not self.thread_cancelled or force:
+            try:
+                self.buffer_queue.put(block, timeout=self.poll_interval_s)
+                return
+            except queue.Full:
+                if force and self.thread_cancelled:
+                    return
+
+    def start(self):
+        if self.thread is None:
+            self.thread_cancelled = False
+            self.thread = threading.Thread(target=self._reader_thread, name="StreamAudioThread")
+            self.thread.daemon = True
+            self.thread.start()
+        self.active.set()
+
+    def stop(self):
+        self.active.clear()
+
+    def reconnect(self):
+        """ Drops the current connection to the Unix socket, then waits for a new one (if *reconnect* is enabled). """
+        connection = self.connection
+        if isinstance(connection, socket.socket):
+            try:
+                connection.shutdown(socket.SHUT_RDWR)  # Wakes the reader thread
+            except (IOError, OSError):
+                pass
+
+    def destroy(self):
+        self.thread_cancelled = True
+        self.reconnect()
+        if self.thread:
+            self.thread.join(1)
+            self.thread = None
+        self._close_connection()
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+            try:
+                os.remove(self.socket_path)
+            except OSError:
+                pass
+
+    def read(self, nowait=False):
+        """Return a block of audio data. If nowait==False, waits for a block if necessary; else, returns False immediately if no block is available."""
+        if self.ended:
+            return None  # We are done
+        try:
+            block = self.buffer_queue.get_nowait() if nowait else self.buffer_queue.get()
+        except queue.Empty:
+            return False  # Queue is empty for now
+        if block is None:
+            self.ended = True
+        return block
+
+
+class _VoiceWindow(object):
+    """ Running count of voiced blocks among the most recent *size* blocks. """
+
+    __slots__ = ('size', 'flags', 'voiced')
+
+    def __init__(self, size):
+        self.size = size
+        self.flags = collections.deque(maxlen=size)
+        self.voiced = 0
+
+    unvoiced = property(lambda self: len(self.flags) - self.voiced)
+
+    def append(self, is_speech):
+        flags = self.flags
+        if len(flags) == self.size:
+            self.voiced -= flags[0]  # Evicted by the append below
+        is_speech = bool(is_speech)
+        flags.append(is_speech)
+        self.voiced += is_speech
+
+    def clear(self):
+        self.flags.clear()
+        self.voiced = 0
+
+
+class VADMixin(object):
+    """Filter & segment audio from an :class:`AudioSource` with voice activity detection."""
 
     def __init__(self, aggressiveness=3, **kwargs):
-        super(VADAudio, self).__init__(**kwargs)
+        super(VADMixin, self).__init__(**kwargs)
         self.vad = webrtcvad.Vad(aggressiveness)
 
     def vad_collector(self, start_window_ms=150, start_padding_ms=100,
@@ -248,12 +534,12 @@ class VADAudio(MicAudio):
         audio_reconnect_threshold_blocks = 5
         audio_reconnect_threshold_time = 50 * self.BLOCK_DURATION_MS / 1000
 
-        ring_buffer = collections.deque(maxlen=max(
-            (num_start_window_blocks + num_start_padding_blocks),
-            (num_end_window_blocks + num_end_padding_blocks),
-            (num_complex_end_window_blocks + num_end_padding_blocks),
-        ))
-        ring_buffer_recent_slice = lambda num_blocks: itertools.islice(ring_buffer, max(0, (len(ring_buffer) - num_blocks)), None)
+        # Blocks preceding the start of a phrase, for padding.
+        ring_buffer = collections.deque(maxlen=(num_start_window_blocks + num_start_padding_blocks))
+        # Running counts of voiced blocks in each window, updated as blocks are appended and evicted.
+        start_window = _VoiceWindow(num_start_window_blocks)
+        end_window = _VoiceWindow(num_end_window_blocks)
+        complex_end_window = _VoiceWindow(num_complex_end_window_blocks)
 
         triggered = False
         in_complex_phrase = False
@@ -280,33 +566,34 @@ class VADAudio(MicAudio):
 
                 if not triggered:
                     # Between phrases
-                    ring_buffer.append((block, is_speech))
-                    num_voiced = len([1 for (_, speech) in ring_buffer_recent_slice(num_start_window_blocks) if speech])
-                    if num_voiced >= (num_start_window_blocks * ratio):
+                    ring_buffer.append(block)
+                    start_window.append(is_speech)
+                    if start_window.voiced >= (num_start_window_blocks * ratio):
                         # Start of phrase
                         triggered = True
-                        for block, _ in ring_buffer_recent_slice(num_start_padding_blocks + num_start_window_blocks):
+                        for block in ring_buffer:
                             # print('|' if is_speech else '.', end='')
                             # print('|' if in_complex_phrase else '.', end='')
                             in_complex_phrase = yield block
                         # print('#', end='')
                         ring_buffer.clear()
+                        start_window.clear()
 
                 else:
                     # Ongoing phrase
                     in_complex_phrase = yield block
                     # print('|' if is_speech else '.', end='')
                     # print('|' if in_complex_phrase else '.', end='')
-                    ring_buffer.append((block, is_speech))
-                    num_unvoiced = len([1 for (_, speech) in ring_buffer_recent_slice(num_end_window_blocks) if not speech])
-                    num_complex_unvoiced = len([1 for (_, speech) in ring_buffer_recent_slice(num_complex_end_window_blocks) if not speech])
-                    if (not in_complex_phrase and num_unvoiced >= (num_end_window_blocks * ratio)) or \
-                        (in_complex_phrase and num_complex_unvoiced >= (num_complex_end_window_blocks * ratio)):
+                    end_window.append(is_speech)
+                    complex_end_window.append(is_speech)
+                    if (not in_complex_phrase and end_window.unvoiced >= (num_end_window_blocks * ratio)) or \
+                        (in_complex_phrase and complex_end_window.unvoiced >= (num_complex_end_window_blocks * ratio)):
                         # End of phrase
                         triggered = False
                         in_complex_phrase = yield None
                         # print('*')
-                        ring_buffer.clear()
+                        end_window.clear()
+                        complex_end_window.clear()
 
         if triggered:
             # We were in a phrase, so we must terminate it (this may be abrupt!)
@@ -325,6 +612,81 @@ class VADAudio(MicAudio):
             block = audio_iter.send(False)
 
 
+class VADAudio(VADMixin, MicAudio):
+    """Filter & segment audio from microphone with voice activity detection."""
+
+
+class VADStreamAudio(VADMixin, StreamAudio):
+    """Filter & segment audio from a pipe, file or Unix socket with voice activity detection."""
+
+    def __init__(self, source, aggressiveness=3, **kwargs):
+        super(VADStreamAudio, self).__init__(aggressiveness=aggressiveness, source=source, **kwargs)
+
+
+class AudioBuffer(object):
+    """
+    Preallocated, growable buffer of audio data for the current utterance.
+    Each block is copied into the buffer once; the data can then be read
+    without joining blocks, either as a read-only *memoryview* with
+    `view()` (no copy) or as *bytes* with `tobytes()`.
+    Capacity is kept between utterances. Views remain valid after the buffer is cleared or grown:
+    if any views are still referenced then, a new underlying buffer is allocated instead of overwriting their data.
+
+    Constructor arguments:
+    - *initial_bytes* (*int*): initial capacity in bytes.
+    - *max_bytes* (*int*, default *None*): if set, the maximum amount of data to store; further data is discarded until cleared.
+    """
+
+    def __init__(self, initial_bytes=MicAudio.SAMPLE_RATE * MicAudio.SAMPLE_WIDTH * 5, max_bytes=None):
+        self._buffer = bytearray(initial_bytes)
+        self._length = 0
+        self.max_bytes = max_bytes
+        self.truncated = False
+
+    def __len__(self):
+        return self._length
+
+    def _has_views(self):
+        # Resizing a bytearray fails while memoryviews of it exist.
+        try:
+            self._buffer.append(0)
+        except BufferError:
+            return True
+        self._buffer.pop()
+        return False
+
+    def append(self, data):
+        size = len(data)
+        if self.max_bytes is not None and self._length + size > self.max_bytes:
+            if not self.truncated:
+                _log.warning("%s: audio exceeds %d bytes; discarding the rest of the utterance", self, self.max_bytes)
+                self.truncated = True
+            size = max(0, self.max_bytes - self._length)
+            data = memoryview(data)[:size]
+        end = self._length + size
+        if end > len(self._buffer):
+            # Allocate a larger buffer rather than resizing in place, so existing views stay valid.
+            buffer = bytearray(max(end, 2 * len(self._buffer)))
+            buffer[:self._length] = memoryview(self._buffer)[:self._length]
+            self._buffer = buffer
+        self._buffer[self._length:end] = data
+        self._length = end
+
+    def clear(self):
+        if self._length and self._has_views():
+            self._buffer = bytearray(len(self._buffer))
+        self._length = 0
+        self.truncated = False
+
+    def view(self):
+        """ Returns a memoryview of the data, without copying (read-only on Python 3.8+). """
+        view = memoryview(self._buffer)[:self._length]
+        return view.toreadonly() if hasattr(view, 'toreadonly') else view
+
+    def tobytes(self):
+        return bytes(self._buffer[:self._length])
+
+
 class AudioStore(object):
     """
     Stores the current audio data being recognized, which is cleared upon calling `finalize()`.
@@ -339,9 +701,16 @@ class AudioStore(object):
     - *save_audio* (*bool*, default *None*): whether to automatically save the recognition audio data (in addition to just the recognition metadata).
     - *retain_approval_func* (*Callable*, default *None*): if set, will be called with the `AudioStoreEntry` object about to be saved,
         and should return `bool` whether to actually save. Example: `retain_approval_func=lambda entry: bool(entry.grammar_name != 'noisegrammar')`
+    - *max_audio_s* (*float*, default *None*): if set, the maximum length of audio to store for the current utterance, bounding memory use
+        during long dictation; later audio in the utterance is not stored.
+    - *writer_options* (*dict*, default *None*): keyword arguments for the `AudioStoreWriter` used to write saved recognitions.
+
+    The current utterance's audio is stored in an `AudioBuffer`. `current_audio_view` returns it without copying, and
+    `current_audio_data` copies it to *bytes* at most once per utterance.
     """
 
-    def __init__(self, audio_obj, maxlen=None, save_dir=None, save_audio=None, save_metadata=None, retain_approval_func=None):
+    def __init__(self, audio_obj, maxlen=None, save_dir=None, save_audio=None, save_metadata=None, retain_approval_func=None,
+            max_audio_s=None, writer_options=None):
         self.audio_obj = audio_obj
         self.maxlen = maxlen
         self.save_dir = save_dir
@@ -350,14 +719,32 @@ class AudioStore(object):
         if self.save_dir:
             _log.info("retaining recognition audio and/or metadata to '%s'", self.save_dir)
         self.retain_approval_func = retain_approval_func
+        self.writer_options = dict(writer_options or {})
+        self.writer = None
         self.deque = collections.deque(maxlen=maxlen) if maxlen else None
-        self.blocks = []
-
-    current_audio_data = property(lambda self: b''.join(bytes(self.blocks)) if PY2 else b''.join(self.blocks))
-    current_audio_length_ms = property(lambda self: len(self.blocks) * self.audio_obj.BLOCK_DURATION_MS)
+        self.bytes_per_ms = audio_obj.SAMPLE_RATE * audio_obj.SAMPLE_WIDTH // 1000
+        max_bytes = int(max_audio_s * 1000) * self.bytes_per_ms if max_audio_s else None
+        self.buffer = AudioBuffer(max_bytes=max_bytes)
+        self._current_audio_data = None
+
+    @property
+    def current_audio_data(self):
+        """ Audio data of the current utterance as *bytes*. """
+        if self._current_audio_data is None:
+            self._current_audio_data = self.buffer.tobytes()
+        return self._current_audio_data
+
+    current_audio_view = property(lambda self: self.buffer.view(),
+        doc="Read-only memoryview of the audio data of the current utterance, without copying.")
+    current_audio_length_ms = property(lambda self: len(self.buffer) // self.bytes_per_ms)
 
     def add_block(self, block):
-        self.blocks.append(block)
+        self.buffer.append(block)
+        self._current_audio_data = None
+
+    def _clear(self):
+        self.buffer.clear()
+        self._current_audio_data = None
 
     def finalize(self, text, grammar_name, rule_name, likelihood=None, tag='', has_dictation=None):
         """ Finalizes current utterance, creating its AudioStoreEntry and saving it (if enabled). """
@@ -366,20 +753,17 @@ class AudioStore(object):
             if len(self.deque) == self.deque.maxlen:
                 self.save(-1)  # Save oldest, which is about to be evicted
             self.deque.appendleft(entry)
-        self.blocks = []
+        self._clear()
 
     def cancel(self):
-        self.blocks = []
+        self._clear()
 
     def save(self, index):
-        """ Saves AudioStoreEntry for given index (0 is most recent). """
+        """ Saves AudioStoreEntry for given index (0 is most recent). The files are written by a background writer thread. """
         if slice(index).indices(len(self.deque))[1] >= len(self.deque):
             raise EngineError("Invalid index to save in AudioStore")
         if not self.save_dir:
             return
-        if not os.path.isdir(self.save_dir):
-            _log.warning("Recognition data was not retained because '%s' was not a directory" % self.save_dir)
-            return
 
         entry = self.deque[index]
         if (not self.save_audio) and (not self.save_metadata) and (not entry.force_save):
@@ -388,21 +772,37 @@ class AudioStore(object):
             return
         if self.save_audio or entry.force_save:
             filename = os.path.join(self.save_dir, "retain_%s.wav" % datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S_%f"))
-            self.audio_obj.write_wav(filename, entry.audio_data)
+            audio_data = entry.audio_data
         else:
             filename = ''
-
-        with open(os.path.join(self.save_dir, "retain.tsv"), 'a', encoding='utf-8') as tsv_file:
-            tsv_file.write(u'\t'.join([
-                    filename,
-                    text_type(self.audio_obj.get_wav_length_s(entry.audio_data)),
-                    entry.grammar_name,
-                    entry.rule_name,
-                    entry.text,
-                    text_type(entry.likelihood),
-                    text_type(entry.tag),
-                    text_type(entry.has_dictation),
-                ]) + '\n')
+            audio_data = None
+
+        # Format the metadata now, in case the entry is modified later
+        line = u'\t'.join([
+                filename,
+                text_type(self.audio_obj.get_wav_length_s(entry.audio_data)),
+                entry.grammar_name,
+                entry.rule_name,
+                entry.text,
+                text_type(entry.likelihood),
+                text_type(entry.tag),
+                text_type(entry.has_dictation),
+            ]) + u'\n'
+        if self.writer is None:
+            self.writer = AudioStoreWriter(self.audio_obj, self.save_dir, **self.writer_options)
+        self.writer.put(filename, audio_data, line)
+
+    def flush(self, timeout=None):
+        """ Waits until all saved recognitions have been written; returns whether they were. """
+        if self.writer is None:
+            return True
+        return self.writer.flush(timeout)
+
+    def close(self):
+        """ Writes any pending saved recognitions and stops the background writer thread. """
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
 
     def save_all(self, remove=True):
         if self.deque:
@@ -419,6 +819,111 @@ class AudioStore(object):
         return True
     __nonzero__ = __bool__  # PY2 compatibility
 
+class AudioStoreWriter(object):
+    """
+    Writes retained recognition wav files and `retain.tsv` metadata in a background thread, so that disk latency does not
+    delay recognition. Metadata lines are batched and appended every *flush_interval_s* seconds, and on `flush()` and `close()`.
+
+    Constructor arguments:
+    - *maxsize* (*int*, default *100*): maximum number of recognitions waiting to be written.
+    - *overflow* (*str*, default *"drop"*): what to do when the queue is full because the disk cannot keep up: *"drop"* discards
+        the recognition (counted in `dropped`), *"block"* waits for space, delaying recognition.
+    - *flush_interval_s* (*float*, default *1.0*): maximum time that metadata lines are kept before being appended.
+    """
+
+    overflow_policies = ('drop', 'block')
+
+    def __init__(self, audio_obj, save_dir, maxsize=100, overflow='drop', flush_interval_s=1.0):
+        if overflow not in self.overflow_policies:
+            raise ValueError("Invalid overflow policy %r; expected one of %r" % (overflow, self.overflow_policies))
+        self.audio_obj = audio_obj
+        self.save_dir = save_dir
+        self.overflow = overflow
+        self.flush_interval_s = flush_interval_s
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lines = []
+        self._thread = threading.Thread(target=self._run, name="AudioStoreWriterThread")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def put(self, filename, audio_data, line):
+        """ Queues a recognition to be written: wav *audio_data* to *filename* (if any) and the metadata *line*. """
+        job = (filename, audio_data, line)
+        if self.overflow == 'block':
+            self._queue.put(job)
+            return
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            self.dropped += 1
+            _log.warning("%s: retention queue full; dropped recognition %r", self, filename or line.strip())
+
+    def flush(self, timeout=None):
+        """ Waits until all queued recognitions have been written; returns whether they were before *timeout*. """
+        if not self._thread.is_alive():
+            return self._queue.empty()
+        deadline = None if timeout is None else time.time() + timeout
+        event = threading.Event()
+        try:
+            self._queue.put(event, timeout=timeout)
+        except queue.Full:
+            return False
+        return event.wait(None if deadline is None else max(0, deadline - time.time()))
+
+    def close(self, timeout=None):
+        """ Writes all queued recognitions and stops the writer thread; returns whether it stopped before *timeout*. """
+        if self._thread.is_alive():
+            deadline = None if timeout is None else time.time() + timeout
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                return False
+            self._thread.join(None if deadline is None else max(0, deadline - time.time()))
+        return not self._thread.is_alive()
+
+    def _run(self):
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0, deadline - time.time())
+            try:
+                job = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                job = False
+            if job is None or job is False or isinstance(job, threading.Event):
+                self._write_lines()
+                deadline = None
+                if job is None:
+                    break
+                if job:
+                    job.set()
+                continue
+            self._write(*job)
+            if deadline is None:
+                deadline = time.time() + self.flush_interval_s
+
+    def _write(self, filename, audio_data, line):
+        if not os.path.isdir(self.save_dir):
+            _log.warning("Recognition data was not retained because '%s' was not a directory" % self.save_dir)
+            return
+        if filename:
+            try:
+                self.audio_obj.write_wav(filename, audio_data)
+            except Exception:
+                _log.exception("%s: failed to write %r", self, filename)
+        self._lines.append(line)
+
+    def _write_lines(self):
+        if not self._lines:
+            return
+        try:
+            with open(os.path.join(self.save_dir, "retain.tsv"), 'a', encoding='utf-8') as tsv_file:
+                tsv_file.write(u''.join(self._lines))
+        except Exception:
+            _log.exception("%s: failed to write retained metadata", self)
+        self._lines = []
+
+
 class AudioStoreEntry(object):
     __slots__ = ('audio_data', 'grammar_name', 'rule_name', 'text', 'likelihood', 'tag', 'has_dictation', 'force_save')
 
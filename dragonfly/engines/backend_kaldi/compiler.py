@@ -22,14 +22,18 @@
 Compiler classes for Kaldi backend
 """
 
-import collections, types
+import collections, hashlib, io, json, os, types
 
 from .dictation                 import AlternativeDictation, DefaultDictation, UserDictation
+from .paths                     import ElementPathGraph
 from ..base                     import CompilerBase, CompilerError
 from ...grammar                 import elements as elements_
 
+from packaging.version import Version
+import kaldi_active_grammar
 from kaldi_active_grammar import WFST, KaldiRule
 from kaldi_active_grammar import Compiler as KaldiAGCompiler
+from kaldi_active_grammar.utils import touch_file
 
 import six
 from six import text_type
@@ -55,28 +59,100 @@ def trace_compile(func):
         return ret
     return dec
 
+def check_kag_version():
+    """
+    Returns the installed and required (see kag_version.txt) versions of kaldi_active_grammar, and whether they are compatible.
+    """
+    # Compatible release version specification
+    # https://stackoverflow.com/questions/11887762/how-do-i-compare-version-numbers-in-python/21065570
+    with open(os.path.join(os.path.dirname(__file__), 'kag_version.txt')) as file:
+        required_kag_version = Version(file.read().strip())
+    kag_version = Version(kaldi_active_grammar.__version__)
+    compatible = (kag_version >= required_kag_version) and (kag_version.release[0:2] == required_kag_version.release[0:2])
+    return kag_version, required_kag_version, compatible
+
+def _set_kaldi_rule_compiled(kaldi_rule, fst_filename):
+    """
+    Marks a kaldi rule as compiled to an existing FST file, without building or compiling its FST. This is the only place
+    depending on KaldiRule internals: it sets the state KaldiRule.compile() sets when its FST file is current (``filename``
+    and ``compiled``), as of the kaldi_active_grammar version required in kag_version.txt. The rule FST cache is disabled
+    for other versions (see :func:`check_kag_version`).
+    """
+    kaldi_rule.filename = fst_filename
+    kaldi_rule.compiled = True
+    touch_file(kaldi_rule.filepath)
+
 InternalGrammar = collections.namedtuple('InternalGrammar', 'name')
 InternalRule = collections.namedtuple('InternalRule', 'name gstring')
 
 MockLiteral = collections.namedtuple('MockLiteral', 'words')
 
 
+class RuleFstCache(object):
+    """
+    Maps signatures of exported rules (see :meth:`KaldiCompiler.get_rule_signature`) to the filenames of their compiled FSTs in
+    ``tmp_dir``, persisted across runs. The FST files themselves are validated by the kaldi_active_grammar FST file cache.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.dirty = False
+        try:
+            with io.open(filename, 'r', encoding='utf-8') as f:
+                self.cache = json.load(f)
+        except (IOError, OSError, ValueError):
+            self.cache = dict()
+        # Drop entries whose FST files have been removed
+        fst_dir = os.path.dirname(filename)
+        for signature, fst_filename in list(self.cache.items()):
+            if not os.path.isfile(os.path.join(fst_dir, fst_filename)):
+                del self.cache[signature]
+                self.dirty = True
+
+    def get(self, signature):
+        return self.cache.get(signature)
+
+    def put(self, signature, fst_filename):
+        if self.cache.get(signature) != fst_filename:
+            self.cache[signature] = fst_filename
+            self.dirty = True
+
+    def invalidate(self):
+        self.cache = dict()
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        with io.open(self.filename, 'w', encoding='utf-8') as f:
+            f.write(text_type(json.dumps(self.cache, ensure_ascii=False)))
+        self.dirty = False
+
+
 #---------------------------------------------------------------------------
 
 class KaldiCompiler(CompilerBase, KaldiAGCompiler):
 
-    def __init__(self, model_dir, tmp_dir, auto_add_to_user_lexicon=None, lazy_compilation=None, **kwargs):
+    def __init__(self, model_dir, tmp_dir, auto_add_to_user_lexicon=None, lazy_compilation=None, path_parse_trees=None, **kwargs):
         CompilerBase.__init__(self)
         KaldiAGCompiler.__init__(self, model_dir=model_dir, tmp_dir=tmp_dir, **kwargs)
 
         self.auto_add_to_user_lexicon = bool(auto_add_to_user_lexicon)
         self.lazy_compilation = bool(lazy_compilation)
+        self.path_parse_trees = bool(path_parse_trees)
 
         self.kaldi_rule_by_rule_dict = collections.OrderedDict()  # maps Rule -> KaldiRule
         self._grammar_rule_states_dict = dict()  # FIXME: disabled!
         self.kaldi_rules_by_listreflist_dict = collections.defaultdict(set)
-        self.added_word = False
+        self.added_words = []  # Words added to the user lexicon, but not yet to the lexicon files
+        self._added_words_rules_count = 0  # Number of rules that added words since the lexicon files were last updated
+        self._lexicon_pending_kaldi_rules = []  # (KaldiRule, signature) waiting for the lexicon files to be updated to compile
+        self._unbuilt_kaldi_rules = set()  # KaldiRules compiled from the rule FST cache, whose FSTs haven't been built
         self.internal_grammar = InternalGrammar('!kaldi_engine_internal')
+        self.rule_fst_cache = RuleFstCache(os.path.join(self.tmp_dir, 'rule_fst_cache.json'))
+        self.rule_fst_cache_enabled = check_kag_version()[2]
+        if not self.rule_fst_cache_enabled:
+            self._log.warning("%s: Disabling rule FST cache for incompatible kaldi_active_grammar version" % self)
 
     impossible_word = property(lambda self: self._longest_word.lower())  # FIXME
     unknown_word = '<unk>'
@@ -117,7 +193,7 @@ class KaldiCompiler(CompilerBase, KaldiAGCompiler):
         if self.auto_add_to_user_lexicon:
             try:
                 pronunciations = self.model.add_word(word, lazy_compilation=True)
-                self.added_word = True
+                self.added_words.append(word)
             except Exception as e:
                 self._log.exception("%s: exception automatically adding word %r" % (self, word))
             else:
@@ -154,17 +230,142 @@ class KaldiCompiler(CompilerBase, KaldiAGCompiler):
                 except Exception:
                     raise self.make_compiler_error_for_kaldi_rule(kaldi_rule)
 
+        if not self.lazy_compilation:
+            # Otherwise, the lexicon is updated once for all grammars loaded before the next recognition
+            self.update_lexicon()
         self.kaldi_rule_by_rule_dict.update(kaldi_rule_by_rule_dict)
+        self.rule_fst_cache.save()
         return kaldi_rule_by_rule_dict
 
     def _compile_rule_root(self, rule, grammar, kaldi_rule):
-        self._compile_rule(rule, grammar, kaldi_rule, kaldi_rule.fst)
-        if self.added_word:
+        signature = self.get_rule_signature(rule, grammar, kaldi_rule) if self.rule_fst_cache_enabled else None
+        fst_filename = self.rule_fst_cache.get(signature) if signature else None
+        if fst_filename and self.fst_cache.fst_is_current(os.path.join(self.tmp_dir, fst_filename)):
+            # Unchanged rule: use its compiled FST, and only build the rule's FST if it is needed later (see build_rule_fst())
+            self._log.debug("%s: Skipped compiling rule %s thanks to rule FST cache" % (self, rule.name))
+            _set_kaldi_rule_compiled(kaldi_rule, fst_filename)
+            kaldi_rule.element_path_graph = None
+            self._unbuilt_kaldi_rules.add(kaldi_rule)
+            return
+
+        num_added_words = len(self.added_words)
+        self._build_rule_fst(rule, grammar, kaldi_rule)
+        if len(self.added_words) > num_added_words:
+            self._added_words_rules_count += 1
+            signature = None  # The signature includes whether the added words were in the lexicon, so it is stale
+        if self.added_words and not self.lazy_compilation:
+            # Kaldi compilation needs the added words in the lexicon files, which are updated once for all rules (see update_lexicon())
+            self._lexicon_pending_kaldi_rules.append((kaldi_rule, signature))
+            return
+        kaldi_rule.compile(lazy=self.lazy_compilation)
+        if signature:
+            self.rule_fst_cache.put(signature, kaldi_rule.filename)
+
+    def update_lexicon(self):
+        """
+        Updates the lexicon files with all words added since the last update, at once, then compiles the kaldi rules that were
+        waiting for them. With lazy compilation, this is done before the next recognition, covering all grammars loaded until then.
+        """
+        if self.added_words:
             self.model.generate_lexicon_files()
             self.model.load_words()
             self.decoder.load_lexicon()
-            self.added_word = False
-        kaldi_rule.compile(lazy=self.lazy_compilation)
+            self._log.info("%s: Updated lexicon once for %d added word(s) in %d rule(s), avoiding %d update(s)"
+                % (self, len(self.added_words), self._added_words_rules_count, max(self._added_words_rules_count - 1, 0)))
+            self.added_words = []
+            self._added_words_rules_count = 0
+
+        pending_kaldi_rules, self._lexicon_pending_kaldi_rules = self._lexicon_pending_kaldi_rules, []
+        for kaldi_rule, signature in pending_kaldi_rules:
+            if kaldi_rule.destroyed:
+                continue
+            try:
+                kaldi_rule.compile(lazy=self.lazy_compilation)
+            except Exception:
+                raise self.make_compiler_error_for_kaldi_rule(kaldi_rule)
+            if signature:
+                self.rule_fst_cache.put(signature, kaldi_rule.filename)
+
+    def _build_rule_fst(self, rule, grammar, kaldi_rule):
+        if self.path_parse_trees and self.parsing_framework == 'token':
+            # Record the elements along the FST, for building parse trees from the path of recognitions
+            element_path_graph = ElementPathGraph(kaldi_rule.fst)
+            start_state, final_state = self._compile_rule(rule, grammar, kaldi_rule, element_path_graph)
+            kaldi_rule.element_path_graph = element_path_graph.finish(start_state, final_state)
+        else:
+            self._compile_rule(rule, grammar, kaldi_rule, kaldi_rule.fst)
+            kaldi_rule.element_path_graph = None
+        self._unbuilt_kaldi_rules.discard(kaldi_rule)
+
+    def build_rule_fst(self, kaldi_rule):
+        """ Builds the FST (and element path graph) of a kaldi rule whose compiled FST was taken from the rule FST cache. """
+        if kaldi_rule in self._unbuilt_kaldi_rules:
+            self._log.debug("%s: Building FST of rule %s loaded from rule FST cache" % (self, kaldi_rule.parent_rule.name))
+            self._build_rule_fst(kaldi_rule.parent_rule, kaldi_rule.parent_grammar, kaldi_rule)
+
+    def get_rule_signature(self, rule, grammar, kaldi_rule):
+        """
+        Returns a hash of everything the FST compiled for the given exported rule depends on: its element structure, weights
+        and referenced lists' contents, and whether each of its words is in the lexicon. Identical rules in different grammars
+        have the same signature. Lists are registered like when compiling the rule.
+        """
+        cache = self.fst_cache.cache
+        parts = [cache.get('version'), cache.get('dependencies_hash'), self.impossible_word,
+            self.get_weight(grammar) * self.get_weight(rule)]
+        self._add_element_signature(rule.element, grammar, kaldi_rule, parts)
+        data = u'\x1f'.join(map(text_type, parts))
+        return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+    def _add_element_signature(self, element, grammar, kaldi_rule, parts):
+        # Mirrors compile_element() and the element compilers, adding the values they use to parts
+        cls = type(element)
+        element_type = self._signature_element_types.get(cls)
+        if element_type is None:
+            for element_type, compiler in self.element_compilers:
+                if isinstance(element, element_type):
+                    break
+            else:
+                raise NotImplementedError("Compiler %s not implemented for element type %s." % (self, element))
+            self._signature_element_types[cls] = element_type
+        parts.append(element_type.__name__)
+        parts.append(self.get_weight(element))
+
+        if element_type is elements_.Literal:
+            parts.append(len(element.words))
+            self._add_words_signature(element.words, parts)
+        elif element_type is elements_.RuleRef:
+            parts.append(self.get_weight(element.rule))
+            self._add_element_signature(element.rule.element, grammar, kaldi_rule, parts)
+        elif element_type is elements_.ListRef:
+            if element.list not in grammar.lists:
+                grammar.add_list(element.list)
+            self.kaldi_rules_by_listreflist_dict[id(element.list)].add(kaldi_rule)
+            items = element.list.get_list_items()
+            parts.append(len(items))
+            for item in items:
+                words = item.split()
+                parts.append(len(words))
+                self._add_words_signature(words, parts)
+        elif element_type is elements_.Dictation:
+            parts.append(isinstance(element, (AlternativeDictation, DefaultDictation)) and element.cloud)
+        elif isinstance(element, elements_.Repetition):
+            # The other children are built from the first one, min and max
+            parts.extend((element.optimize, element.min, element.max))
+            self._add_element_signature(element.children[0], grammar, kaldi_rule, parts)
+        elif element_type in (elements_.Sequence, elements_.Alternative, elements_.Optional):
+            parts.append(len(element.children))
+            for child in element.children:
+                self._add_element_signature(child, grammar, kaldi_rule, parts)
+
+    def _add_words_signature(self, words, parts):
+        # Out of lexicon words are compiled as the impossible word (see _compile_literal())
+        lexicon_words = self.lexicon_words
+        for word in words:
+            word = text_type(word)
+            parts.append(word)
+            parts.append(word.lower() in lexicon_words)
+
+    _signature_element_types = {}  # Caches the element_compilers type matching each element class
 
     def _compile_rule(self, rule, grammar, kaldi_rule, fst, export=True):
         """ :param export: whether rule is exported (a root rule) """
@@ -174,7 +375,15 @@ class KaldiCompiler(CompilerBase, KaldiAGCompiler):
         #     return self._grammar_rule_states_dict[(grammar.name, rule.name)]
         # else:
         self._log.debug("%s: Compiling rule %s%s." % (self, rule.name, ' [EXPORTED]' if export else ''))
+        if isinstance(fst, ElementPathGraph):
+            fst.enter(rule)
+            try:
+                return self._compile_rule_states(rule, grammar, kaldi_rule, fst, export)
+            finally:
+                fst.exit()
+        return self._compile_rule_states(rule, grammar, kaldi_rule, fst, export)
 
+    def _compile_rule_states(self, rule, grammar, kaldi_rule, fst, export):
         if export:
             # Root rule, so must handle grammar's weight, in addition to this rule's weight
             weight = self.get_weight(grammar) * self.get_weight(rule)
@@ -201,6 +410,7 @@ class KaldiCompiler(CompilerBase, KaldiAGCompiler):
             # Unload kaldi_rule: destroy() handles KaldiAGCompiler stuff; we must handle ours
             kaldi_rule.destroy()
             del self.kaldi_rule_by_rule_dict[rule]
+            self._unbuilt_kaldi_rules.discard(kaldi_rule)
             for kaldi_rules_set in self.kaldi_rules_by_listreflist_dict.values():
                 kaldi_rules_set.discard(kaldi_rule)
             # NOTE: the kaldi_rule_by_rule_dict we returned from compile_grammar() is not updated, but it should be dropped upon unload anyway!
@@ -211,18 +421,35 @@ class KaldiCompiler(CompilerBase, KaldiAGCompiler):
         for kaldi_rule in lst_kaldi_rules:
             with kaldi_rule.reload():
                 self._compile_rule_root(kaldi_rule.parent_rule, grammar, kaldi_rule)
+        if not self.lazy_compilation:
+            self.update_lexicon()
+        self.rule_fst_cache.save()
+
+    def prepare_for_recognition(self):
+        self.update_lexicon()
+        KaldiAGCompiler.prepare_for_recognition(self)
+
+    def parse_output_for_rule(self, kaldi_rule, output):
+        self.build_rule_fst(kaldi_rule)
+        return KaldiAGCompiler.parse_output_for_rule(self, kaldi_rule, output)
 
     #-----------------------------------------------------------------------
     # Methods for compiling elements.
 
     _eps_like_nonterms = frozenset()  # Dictation is non-empty now ('#nonterm:dictation', '#nonterm:dictation_cloud')
 
-    def compile_element(self, element, *args, **kwargs):
+    def compile_element(self, element, src_state, dst_state, grammar, kaldi_rule, fst):
         """Compile element in FST (from src_state to dst_state) and return result."""
         # Look for a compiler method to handle the given element.
         for element_type, compiler in self.element_compilers:
             if isinstance(element, element_type):
-                return compiler(self, element, *args, **kwargs)
+                if isinstance(fst, ElementPathGraph):
+                    fst.enter(element)
+                    try:
+                        return compiler(self, element, src_state, dst_state, grammar, kaldi_rule, fst)
+                    finally:
+                        fst.exit()
+                return compiler(self, element, src_state, dst_state, grammar, kaldi_rule, fst)
         # Didn't find a compiler method for this element type.
         raise NotImplementedError("Compiler %s not implemented for element type %s." % (self, element))
 
@@ -251,6 +478,8 @@ class KaldiCompiler(CompilerBase, KaldiAGCompiler):
                 self.compile_element(children[0], s1, s2, grammar, kaldi_rule, fst)
                 if not fst.has_eps_path(s1, s2, self._eps_like_nonterms):
                     fst.add_arc(s2, s1, fst.eps_disambig, fst.eps)  # Back arc, uses eps_disambig ('#0')
+                    if isinstance(fst, ElementPathGraph):
+                        fst.mark_loop_arc(s2)
                     fst.add_arc(s2, dst_state, None)
                     return
 
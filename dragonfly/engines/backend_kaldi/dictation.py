@@ -29,7 +29,7 @@ from six import text_type
 
 from ...grammar.elements_basic import Dictation as BaseDictation
 from ...grammar.elements_basic import ElementBase, RuleRef, Alternative, ListRef, DictListRef, Repetition
-from ...grammar.list import List, DictList
+from ...grammar.list import DictList, SetList
 from ...grammar.rule_compound import CompoundRule
 
 
@@ -60,7 +60,7 @@ class UserDictation(RuleRef):
         else:
             return words
 
-user_dictation_list = List('__kaldi_user_dictation_list', [])
+user_dictation_list = SetList('__kaldi_user_dictation_list')
 user_dictation_dictlist = DictList('__kaldi_user_dictation_dictlist', {})
 
 class _UserDictationSequenceRule(CompoundRule):
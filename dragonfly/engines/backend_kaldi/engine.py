@@ -24,7 +24,6 @@ Kaldi engine classes
 
 import collections, functools, logging, os, sys, time
 
-from packaging.version import Version
 from six import PY2, integer_types, string_types, print_, reraise
 from six.moves import zip
 import kaldi_active_grammar
@@ -37,20 +36,21 @@ from ..base                     import (EngineBase,
                                         DelegateTimerManagerInterface,
                                         DictationContainerBase,
                                         GrammarWrapperBase)
-from .audio                     import MicAudio, VADAudio, AudioStore, WavAudio
+from ..base.timing              import timed_phase
+from .audio                     import MicAudio, VADAudio, VADStreamAudio, AudioStore, AudioStoreWriter, WavAudio
 from .dictation                 import user_dictation_list, user_dictation_dictlist
 from .recobs                    import KaldiRecObsManager
 from .testing                   import debug_timer
-from dragonfly.grammar.state    import State
+from dragonfly.grammar.state    import Node, State
 from dragonfly.windows          import Window
 
 # Import the Kaldi compiler class. Suppress metaclass TypeErrors raised
 # during documentation builds caused by mocking KAG.
 try:
-    from .compiler                  import KaldiCompiler
+    from .compiler                  import KaldiCompiler, check_kag_version
 except TypeError:
     if os.environ.get("SPHINX_BUILD_RUNNING"):
-        KaldiCompiler = None
+        KaldiCompiler = check_kag_version = None
     else:
         reraise(*sys.exc_info())
 
@@ -74,23 +74,24 @@ class KaldiEngine(EngineBase, DelegateTimerManagerInterface):
         expected_error_rate_threshold=None,
         alternative_dictation=None, cloud_dictation_lang='en-US',
         decoder_init_config=None,
+        audio_input_stream=None,
+        retain_queue_size=100, retain_overflow='drop', audio_buffer_max_s=None,
+        path_parse_trees=True,
         ):
         EngineBase.__init__(self)
         DelegateTimerManagerInterface.__init__(self)
 
         try:
-            import kaldi_active_grammar, sounddevice, webrtcvad
-        except ImportError as e:
+            import kaldi_active_grammar, webrtcvad
+            if audio_input_stream is None and audio_input_device is not False:
+                import sounddevice
+        except (ImportError, OSError) as e:
             self._log.error("%s: Failed to import Kaldi engine "
                             "dependencies: %s", self, e)
             raise EngineError("Failed to import Kaldi engine dependencies.")
 
-        # Compatible release version specification
-        # https://stackoverflow.com/questions/11887762/how-do-i-compare-version-numbers-in-python/21065570
-        with open(os.path.join(os.path.dirname(__file__), 'kag_version.txt')) as file:
-            required_kag_version = Version(file.read().strip())
-        kag_version = Version(kaldi_active_grammar.__version__)
-        if not ((kag_version >= required_kag_version) and (kag_version.release[0:2] == required_kag_version.release[0:2])):
+        kag_version, required_kag_version, compatible = check_kag_version()
+        if not compatible:
             self._log.error("%s: Incompatible kaldi_active_grammar version %s! Expected ~= %s!" % (self, kag_version, required_kag_version))
             self._log.error("See https://dragonfly2.readthedocs.io/en/latest/kaldi_engine.html#updating-to-a-new-version")
             if not os.environ.get('DRAGONFLY_DEVELOP'):
@@ -111,6 +112,9 @@ class KaldiEngine(EngineBase, DelegateTimerManagerInterface):
             audio_input_device = int(input_device_index)
         if audio_input_device not in (None, False) and not isinstance(audio_input_device, (int, string_types)):
             raise TypeError("Invalid audio_input_device not int or string: %r" % (audio_input_device,))
+        if audio_input_stream is not None and not isinstance(audio_input_stream, string_types) \
+                and not (hasattr(audio_input_stream, 'readinto') or hasattr(audio_input_stream, 'read')):
+            raise TypeError("Invalid audio_input_stream not string or file-like object: %r" % (audio_input_stream,))
         if audio_reconnect_callback is not None and not callable(audio_reconnect_callback):
             raise TypeError("Invalid audio_reconnect_callback not callable: %r" % (audio_reconnect_callback,))
         if retain_dir is not None and not isinstance(retain_dir, string_types):
@@ -119,11 +123,14 @@ class KaldiEngine(EngineBase, DelegateTimerManagerInterface):
             raise ValueError("retain_audio=True requires retain_dir to be set")
         if retain_approval_func is not None and not callable(retain_approval_func):
             raise TypeError("Invalid retain_approval_func not callable: %r" % (retain_approval_func,))
+        if retain_overflow not in AudioStoreWriter.overflow_policies:
+            raise ValueError("Invalid retain_overflow not one of %r: %r" % (AudioStoreWriter.overflow_policies, retain_overflow))
 
         self._options = dict(
             model_dir = model_dir,
             tmp_dir = tmp_dir,
             audio_input_device = audio_input_device,
+            audio_input_stream = audio_input_stream,
             audio_self_threaded = bool(audio_self_threaded),
             audio_auto_reconnect = bool(audio_auto_reconnect),
             audio_reconnect_callback = audio_reconnect_callback,
@@ -131,12 +138,16 @@ class KaldiEngine(EngineBase, DelegateTimerManagerInterface):
             retain_audio = bool(retain_audio) if retain_audio is not None else bool(retain_dir),
             retain_metadata = bool(retain_metadata) if retain_metadata is not None else bool(retain_dir),
             retain_approval_func = retain_approval_func,
+            retain_queue_size = int(retain_queue_size),
+            retain_overflow = retain_overflow,
+            audio_buffer_max_s = float(audio_buffer_max_s) if audio_buffer_max_s is not None else None,
             vad_aggressiveness = int(vad_aggressiveness),
             vad_padding_start_ms = int(vad_padding_start_ms),
             vad_padding_end_ms = int(vad_padding_end_ms),
             vad_complex_padding_end_ms = int(vad_complex_padding_end_ms),
             auto_add_to_user_lexicon = bool(auto_add_to_user_lexicon),
             lazy_compilation = bool(lazy_compilation),
+            path_parse_trees = bool(path_parse_trees),
             invalidate_cache = bool(invalidate_cache),
             expected_error_rate_threshold = float(expected_error_rate_threshold) if expected_error_rate_threshold is not None else None,
             alternative_dictation = alternative_dictation,
@@ -158,6 +169,12 @@ class KaldiEngine(EngineBase, DelegateTimerManagerInterface):
 
         self._loadunload_queue = collections.deque()
         self._any_exclusive_grammars = False
+        self._kaldi_rules_activity = []
+        self._active_kaldi_rules = set()
+        self._phrase_active_kaldi_rules = frozenset()
+        self._phrase_decode_generation = None
+        self._kaldi_rules_activity_shared = False
+        self._kaldi_rules_activity_dirty = True
         self._saving_adaptation_state = False
         self._ignore_current_phrase = False
         self._in_phrase = False
@@ -176,11 +193,13 @@ class KaldiEngine(EngineBase, DelegateTimerManagerInterface):
         self._compiler = KaldiCompiler(self._options['model_dir'], tmp_dir=self._options['tmp_dir'],
             auto_add_to_user_lexicon=self._options['auto_add_to_user_lexicon'],
             lazy_compilation=self._options['lazy_compilation'],
+            path_parse_trees=self._options['path_parse_trees'],
             alternative_dictation=self._options['alternative_dictation'],
             cloud_dictation_lang=self._options['cloud_dictation_lang'],
             )
         if self._options['invalidate_cache']:
             self._compiler.fst_cache.invalidate()
+            self._compiler.rule_fst_cache.invalidate()
 
         top_fst = self._compiler.compile_top_fst()
         dictation_fst_file = self._compiler.dictation_fst_filepath
@@ -189,7 +208,16 @@ class KaldiEngine(EngineBase, DelegateTimerManagerInterface):
             config=self._options['decoder_init_config'],)
         self._compiler.decoder = self._decoder
 
-        if self._options['audio_input_device'] is not False:
+        if self._options['audio_input_stream'] is not None:
+            # The stream reconnects by itself when its writer disconnects
+            self._audio = VADStreamAudio(self._options['audio_input_stream'],
+                aggressiveness=self._options['vad_aggressiveness'],
+                start=False,
+                reconnect=self._options['audio_auto_reconnect'],
+                reconnect_callback=self._options['audio_reconnect_callback'],
+                )
+            audio_auto_reconnect = False
+        elif self._options['audio_input_device'] is not False:
             self._audio = VADAudio(
                 aggressiveness=self._options['vad_aggressiveness'],
                 start=False,
@@ -197,25 +225,30 @@ class KaldiEngine(EngineBase, DelegateTimerManagerInterface):
                 self_threaded=self._options['audio_self_threaded'],
                 reconnect_callback=self._options['audio_reconnect_callback'],
                 )
+            audio_auto_reconnect = self._options['audio_auto_reconnect']
+        if self._audio:
             self._audio_iter = self._audio.vad_collector(nowait=True,
-                audio_auto_reconnect=self._options['audio_auto_reconnect'],
+                audio_auto_reconnect=audio_auto_reconnect,
                 start_window_ms=self._options['vad_padding_start_ms'],
                 end_window_ms=self._options['vad_padding_end_ms'],
                 complex_end_window_ms=self._options['vad_complex_padding_end_ms'],
                 )
             self.audio_store = AudioStore(self._audio, maxlen=(1 if self._options['retain_dir'] else 0),
                 save_dir=self._options['retain_dir'], save_audio=self._options['retain_audio'], save_metadata=self._options['retain_metadata'],
-                retain_approval_func=self._options['retain_approval_func'])
+                retain_approval_func=self._options['retain_approval_func'], max_audio_s=self._options['audio_buffer_max_s'],
+                writer_options=dict(maxsize=self._options['retain_queue_size'], overflow=self._options['retain_overflow']))
 
     def disconnect(self):
         """ Disconnect from back-end SR engine. Exits from ``do_recognition()``. """
         if self._doing_recognition:
             self._deferred_disconnect = True
         else:
+            self._process_disconnect_callbacks()
             if self._audio:
                 self._audio.destroy()
             if self.audio_store:
                 self.audio_store.save_all()
+                self.audio_store.close()
             self._reset_state()
             self._grammar_wrappers = {}  # From EngineBase
 
@@ -231,6 +264,8 @@ class KaldiEngine(EngineBase, DelegateTimerManagerInterface):
             self.connect()
 
         self._log.info("Loading grammar %s" % grammar.name)
+        # Mark as dirty first: compilation allocates ids for new kaldi rules, even if it fails part way
+        self._kaldi_rules_activity_dirty = True
         kaldi_rule_by_rule_dict = self._compiler.compile_grammar(grammar, self)
         wrapper = GrammarWrapper(grammar, kaldi_rule_by_rule_dict, self,
                                  self._recognition_observer_manager)
@@ -252,6 +287,7 @@ class KaldiEngine(EngineBase, DelegateTimerManagerInterface):
         def unload():
             rules = list(wrapper.kaldi_rule_by_rule_dict.keys())
             self._compiler.unload_grammar(grammar, rules, self)
+            self._kaldi_rules_activity_dirty = True  # Destroying kaldi rules renumbers the ids of later ones
         if self._in_phrase:
             self._loadunload_queue.append(unload)
         else:
@@ -260,32 +296,51 @@ class KaldiEngine(EngineBase, DelegateTimerManagerInterface):
     def activate_grammar(self, grammar):
         """ Activate the given *grammar*. """
         self._log.debug("Activating grammar %s." % grammar.name)
-        self._get_grammar_wrapper(grammar).active = True
+        wrapper = self._get_grammar_wrapper(grammar)
+        wrapper.active = True
+        self._update_grammar_wrapper_activity(wrapper)
+        self.bump_decode_generation()
 
     def deactivate_grammar(self, grammar):
         """ Deactivate the given *grammar*. """
         self._log.debug("Deactivating grammar %s." % grammar.name)
-        self._get_grammar_wrapper(grammar).active = False
+        wrapper = self._get_grammar_wrapper(grammar)
+        wrapper.active = False
+        self._update_grammar_wrapper_activity(wrapper)
+        self.bump_decode_generation()
 
     def activate_rule(self, rule, grammar):
         """ Activate the given *rule*. """
         self._log.debug("Activating rule %s in grammar %s." % (rule.name, grammar.name))
-        self._compiler.kaldi_rule_by_rule_dict[rule].active = True
+        kaldi_rule = self._compiler.kaldi_rule_by_rule_dict[rule]
+        kaldi_rule.active = True
+        wrapper = self._grammar_wrappers.get(id(grammar))
+        if wrapper is not None:
+            self._set_kaldi_rule_activity(kaldi_rule, self._is_grammar_wrapper_effective(wrapper))
 
     def deactivate_rule(self, rule, grammar):
         """ Deactivate the given *rule*. """
         self._log.debug("Deactivating rule %s in grammar %s." % (rule.name, grammar.name))
-        self._compiler.kaldi_rule_by_rule_dict[rule].active = False
+        kaldi_rule = self._compiler.kaldi_rule_by_rule_dict[rule]
+        kaldi_rule.active = False
+        self._set_kaldi_rule_activity(kaldi_rule, False)
 
     def update_list(self, lst, grammar):
         self._compiler.update_list(lst, grammar)
 
     def set_exclusiveness(self, grammar, exclusive):
         self._log.debug("Setting exclusiveness of grammar %s to %s." % (grammar.name, exclusive))
-        self._get_grammar_wrapper(grammar).exclusive = exclusive
+        wrapper = self._get_grammar_wrapper(grammar)
+        wrapper.exclusive = exclusive
         if exclusive:
-            self._get_grammar_wrapper(grammar).active = True
-        self._any_exclusive_grammars = any(gw.exclusive for gw in self._grammar_wrappers.values())
+            wrapper.active = True
+        any_exclusive_grammars = any(gw.exclusive for gw in self._grammar_wrappers.values())
+        if any_exclusive_grammars != self._any_exclusive_grammars:
+            # Every grammar's activity changes
+            self._any_exclusive_grammars = any_exclusive_grammars
+            self._kaldi_rules_activity_dirty = True
+        else:
+            self._update_grammar_wrapper_activity(wrapper)
 
     #-----------------------------------------------------------------------
     # Miscellaneous methods.
@@ -328,10 +383,14 @@ class KaldiEngine(EngineBase, DelegateTimerManagerInterface):
             self._log.warning("prepare_for_recognition ignored while in phrase; will be run after")
             return
         try:
+            grammars_changed = bool(self._loadunload_queue)
             while self._loadunload_queue:
                 operation = self._loadunload_queue.popleft()
                 operation()
             self._compiler.prepare_for_recognition()
+            if grammars_changed:
+                # Grammars loaded or unloaded here change the active kaldi rules, so invalidate cached decode results.
+                self.bump_decode_generation()
         except KaldiError as e:
             if len(e.args) >= 2 and isinstance(e.args[1], KaldiRule):
                 kaldi_rule = e.args[1]
@@ -376,69 +435,23 @@ class KaldiEngine(EngineBase, DelegateTimerManagerInterface):
                     # No audio block available
                     time.sleep(0.001)
 
-                elif block is not None:
-                    if not self._in_phrase:
-                        # Start of phrase
-                        self._recognition_observer_manager.notify_begin()
-                        with debug_timer(self._log.debug, "computing activity"):
-                            kaldi_rules_activity = self._compute_kaldi_rules_activity()
-                        self._in_phrase = True
-                        self._ignore_current_phrase = False
-
-                    else:
-                        # Ongoing phrase
-                        kaldi_rules_activity = None
-                    self._decoder.decode(block, False, kaldi_rules_activity)
-                    if self.audio_store:
-                        self.audio_store.add_block(block)
-                    output, info = self._decoder.get_output()
-                    self._log.log(5, "Partial phrase: %r [in_complex=%s]", output, in_complex)
-                    kaldi_rule, words, words_are_dictation_mask, in_dictation = self._compiler.parse_partial_output(output)
-                    in_complex = bool(in_dictation or (kaldi_rule and kaldi_rule.is_complex))
-
                 else:
-                    # End of phrase
-                    self._decoder.decode(b'', True)
-                    output, info = self._decoder.get_output()
-                    if not self._ignore_current_phrase:
-                        expected_error_rate = info.get('expected_error_rate', nan)
-                        confidence = info.get('confidence', nan)
-                        # output = self._compiler.untranslate_output(output)
-                        recognition = self._parse_recognition(output)
-                        is_acceptable_recognition = recognition.kaldi_rule and (recognition.has_dictation or not (
-                            self._options['expected_error_rate_threshold'] and (expected_error_rate > self._options['expected_error_rate_threshold'])
-                        ))
-                        if is_acceptable_recognition:
-                            recognition.process(expected_error_rate=expected_error_rate, confidence=confidence)
-                        else:
-                            recognition.fail(expected_error_rate=expected_error_rate, confidence=confidence)
-
-                        kaldi_rule, parsed_output = recognition.kaldi_rule, recognition.parsed_output
-                        self._log.log(15, "End of phrase: eer=%.2f conf=%.2f%s, rule %s, %r",
-                            expected_error_rate, confidence, (" [BAD]" if not is_acceptable_recognition else ""), kaldi_rule, parsed_output)
-                        if self._saving_adaptation_state and is_acceptable_recognition:  # Don't save adaptation state for bad recognitions
-                            self._decoder.save_adaptation_state()
-                        if self.audio_store:
-                            if kaldi_rule and is_acceptable_recognition:  # Don't store audio/metadata for bad recognitions
-                                self.audio_store.finalize(parsed_output,
-                                    kaldi_rule.parent_grammar.name, kaldi_rule.parent_rule.name,
-                                    likelihood=expected_error_rate, has_dictation=kaldi_rule.has_dictation)
-                            else:
-                                self.audio_store.cancel()
-
-                    self._in_phrase = False
-                    self._ignore_current_phrase = False
-                    in_complex = False
-                    timed_out = False
-                    if single:
-                        break
-                    self.prepare_for_recognition()  # Do any of this leftover, now that phrase is done
+                    in_complex = self._process_audio_block(block, in_complex)
+                    if block is None:
+                        # End of phrase
+                        timed_out = False
+                        if single:
+                            break
+                        self.prepare_for_recognition()  # Do any of this leftover, now that phrase is done
 
                 self.call_timer_callback()
 
         except StopIteration:
             if audio_iter == self._audio_iter:
-                self._log.warning("audio iterator stopped unexpectedly")
+                if getattr(self._audio, 'ended', False):
+                    self._log.info("audio stream ended")
+                else:
+                    self._log.warning("audio iterator stopped unexpectedly")
 
         finally:
             self._doing_recognition = False
@@ -452,6 +465,153 @@ class KaldiEngine(EngineBase, DelegateTimerManagerInterface):
 
         return not timed_out
 
+    def _process_audio_block(self, block, in_complex):
+        """
+            Decodes a *block* of audio from an audio iterator, or finishes
+            the current phrase if *block* is ``None``. Returns whether the
+            engine is in a complex rule or dictation, for the VAD.
+        """
+        if block is not None:
+            if not self._in_phrase:
+                # Start of phrase
+                self._recognition_observer_manager.notify_begin()
+                with debug_timer(self._log.debug, "computing activity"):
+                    kaldi_rules_activity = self._compute_kaldi_rules_activity()
+                self._in_phrase = True
+                self._ignore_current_phrase = False
+
+            else:
+                # Ongoing phrase
+                kaldi_rules_activity = None
+            with timed_phase("kaldi_decode"):
+                self._decoder.decode(block, False, kaldi_rules_activity)
+            if self.audio_store:
+                self.audio_store.add_block(block)
+            with timed_phase("kaldi_get_output"):
+                output, info = self._decoder.get_output()
+            self._log.log(5, "Partial phrase: %r [in_complex=%s]", output, in_complex)
+            kaldi_rule, words, words_are_dictation_mask, in_dictation = self._compiler.parse_partial_output(output)
+            in_complex = bool(in_dictation or (kaldi_rule and kaldi_rule.is_complex))
+
+        else:
+            # End of phrase
+            with timed_phase("kaldi_decode"):
+                self._decoder.decode(b'', True)
+            with timed_phase("kaldi_get_output"):
+                output, info = self._decoder.get_output()
+            if not self._ignore_current_phrase:
+                expected_error_rate = info.get('expected_error_rate', nan)
+                confidence = info.get('confidence', nan)
+                # output = self._compiler.untranslate_output(output)
+                recognition = self._parse_recognition(output)
+                is_acceptable_recognition = self._is_acceptable_recognition(recognition, expected_error_rate)
+                if is_acceptable_recognition:
+                    recognition.process(expected_error_rate=expected_error_rate, confidence=confidence)
+                else:
+                    recognition.fail(expected_error_rate=expected_error_rate, confidence=confidence)
+
+                kaldi_rule, parsed_output = recognition.kaldi_rule, recognition.parsed_output
+                self._log.log(15, "End of phrase: eer=%.2f conf=%.2f%s, rule %s, %r",
+                    expected_error_rate, confidence, (" [BAD]" if not is_acceptable_recognition else ""), kaldi_rule, parsed_output)
+                if self._saving_adaptation_state and is_acceptable_recognition:  # Don't save adaptation state for bad recognitions
+                    self._decoder.save_adaptation_state()
+                if self.audio_store:
+                    if kaldi_rule and is_acceptable_recognition:  # Don't store audio/metadata for bad recognitions
+                        self.audio_store.finalize(parsed_output,
+                            kaldi_rule.parent_grammar.name, kaldi_rule.parent_rule.name,
+                            likelihood=expected_error_rate, has_dictation=kaldi_rule.has_dictation)
+                    else:
+                        self.audio_store.cancel()
+
+            self._in_phrase = False
+            self._ignore_current_phrase = False
+            in_complex = False
+
+        return in_complex
+
+    def _is_acceptable_recognition(self, recognition, expected_error_rate):
+        threshold = self._options['expected_error_rate_threshold']
+        return bool(recognition.kaldi_rule and (recognition.has_dictation or not (threshold and (expected_error_rate > threshold))))
+
+    def do_recognition_async(self, audio_iter, loop=None):
+        """
+            Performs recognition on audio from an asynchronous iterator as a
+            task on an asyncio event loop, instead of blocking in
+            ``do_recognition()``. Requires Python 3.5+.
+
+            *audio_iter* must be an asynchronous iterator yielding blocks of
+            audio in the engine's format, with ``None`` marking the end of
+            each utterance, like the blocks yielded by
+            ``WavAudio.read_file()``. Blocks are decoded and recognitions
+            are processed on the event loop, so actions and recognition
+            observers are called on it too.
+
+            Returns an asyncio future which completes when the iterator is
+            exhausted or ``disconnect()`` is called. Cancelling the future
+            stops recognition after the pending block.
+        """
+        import asyncio
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        if not self._decoder:
+            raise EngineError("Cannot recognize before connect()")
+        if self._doing_recognition:
+            raise EngineError("Recognition is already in progress")
+        self._doing_recognition = True
+        self._in_phrase = False
+        self._ignore_current_phrase = False
+        self.prepare_for_recognition()
+        result = loop.create_future()
+
+        def finish(exception=None):
+            self._doing_recognition = False
+            if self._deferred_disconnect:
+                self.disconnect()
+            if result.done():
+                return
+            if exception is not None:
+                result.set_exception(exception)
+            else:
+                result.set_result(None)
+
+        def request_block():
+            if self._deferred_disconnect or result.done():
+                finish()
+                return
+            try:
+                future = asyncio.ensure_future(audio_iter.__anext__(), loop=loop)
+            except Exception as e:
+                finish(e)
+                return
+            future.add_done_callback(process_block)
+
+        def process_block(future):
+            if result.done() or future.cancelled():
+                finish()
+                return
+            try:
+                block = future.result()
+            except StopAsyncIteration:
+                finish()
+                return
+            except Exception as e:
+                finish(e)
+                return
+            try:
+                self._process_audio_block(block, False)
+                if block is None:
+                    self.prepare_for_recognition()  # Do any of this leftover, now that phrase is done
+                self.call_timer_callback()
+            except Exception as e:
+                self._log.exception("Error processing audio block: %s", e)
+                finish(e)
+                return
+            request_block()
+
+        self._log.info("Listening...")
+        request_block()
+        return result
+
     in_phrase = property(lambda self: self._in_phrase,
         doc="Whether or not the engine is currently in the middle of hearing a phrase from the user.")
 
@@ -470,6 +630,41 @@ class KaldiEngine(EngineBase, DelegateTimerManagerInterface):
         """
         self.do_recognition(audio_iter=WavAudio.read_file_with_vad(filename, realtime=realtime), **kwargs)
 
+    def transcribe_wave_file(self, filename):
+        """
+            Decodes given wave file as a single utterance (without VAD) and returns its :class:`Recognition`, with
+            ``expected_error_rate``, ``confidence`` and ``acceptable`` set. Unlike :meth:`recognize_wave_file`, recognition
+            observers are not notified and the recognized rule is not processed, so no actions are executed. This is used for
+            offline batch transcription; see :mod:`dragonfly.engines.backend_kaldi.transcribe`.
+        """
+        if not self._decoder:
+            raise EngineError("Cannot recognize before connect()")
+        if self._doing_recognition:
+            raise EngineError("Cannot transcribe while doing recognition")
+        self.prepare_for_recognition()
+        kaldi_rules_activity = self._compute_kaldi_rules_activity()
+        try:
+            for block in WavAudio.read_file(filename):
+                if block is None:
+                    break
+                with timed_phase("kaldi_decode"):
+                    self._decoder.decode(block, False, kaldi_rules_activity)
+                kaldi_rules_activity = None
+                if self.audio_store:
+                    self.audio_store.add_block(block)
+            with timed_phase("kaldi_decode"):
+                self._decoder.decode(b'', True, kaldi_rules_activity)
+            with timed_phase("kaldi_get_output"):
+                output, info = self._decoder.get_output()
+            recognition = self._parse_recognition(output)
+        finally:
+            if self.audio_store:
+                self.audio_store.cancel()
+        recognition.expected_error_rate = info.get('expected_error_rate', nan)
+        recognition.confidence = info.get('confidence', nan)
+        recognition.acceptable = self._is_acceptable_recognition(recognition, recognition.expected_error_rate)
+        return recognition
+
     def ignore_current_phrase(self):
         """
             Marks the current phrase's recognition to be ignored when it completes, or does nothing if there is none.
@@ -501,12 +696,10 @@ class KaldiEngine(EngineBase, DelegateTimerManagerInterface):
         """ Make UserDictation elements able to recognize each item of given
             list of strings *word_list*. Note: all characters will be converted
             to lowercase, and recognized as such. """
-        word_list = [str(word).lower() for word in word_list]
-        word_list = [word for word in word_list
-            if word not in user_dictation_list]
         # if any((word != word.lower()) for word in word_list):
         #     raise ValueError("Cannot recognize words with uppercase")
-        user_dictation_list.extend(word_list)
+        # Words already present are skipped, and the list is only updated if any were added.
+        user_dictation_list.update(str(word).lower() for word in word_list)
 
     def add_word_dict_to_user_dictation(self, word_dict):
         """ Make UserDictation elements able to recognize each item of given
@@ -517,10 +710,25 @@ class KaldiEngine(EngineBase, DelegateTimerManagerInterface):
             as text verbatim. """
         word_dict = {str(key).lower(): str(value) for key, value in word_dict.items()}
         word_dict = {key: value for key, value in word_dict.items()
-            if key not in user_dictation_dictlist.keys()}
+            if key not in user_dictation_dictlist}
         # if any((word != word.lower()) for word in word_dict.keys()):
         #     raise ValueError("Cannot recognize words with uppercase")
-        user_dictation_dictlist.update(word_dict)
+        if word_dict:
+            user_dictation_dictlist.update(word_dict)
+
+    def remove_words_from_user_dictation(self, words):
+        """ Make UserDictation elements no longer recognize each of given
+            strings *words*, which were added by
+            :meth:`add_word_list_to_user_dictation` or
+            :meth:`add_word_dict_to_user_dictation` (as keys). Each list
+            is updated at most once. """
+        words = [str(word).lower() for word in words]
+        user_dictation_list.difference_update(words)
+        keys = [word for word in words if word in user_dictation_dictlist]
+        if keys:
+            with user_dictation_dictlist:
+                for key in keys:
+                    del user_dictation_dictlist[key]
 
     #-----------------------------------------------------------------------
     # Internal processing methods.
@@ -536,6 +744,49 @@ class KaldiEngine(EngineBase, DelegateTimerManagerInterface):
                 processed_grammar_wrappers.add(grammar_wrapper)
             todo_grammar_wrappers = set(self._grammar_wrappers.values()) - processed_grammar_wrappers
 
+    #-----------------------------------------------------------------------
+    # Kaldi rule activity. The activity list (indexed by kaldi rule id) and set of active kaldi rules are kept up to date by the
+    # rule/grammar activation methods, and are only rebuilt after grammars are loaded/unloaded or exclusiveness changes globally.
+    # At phrase start, they are shared with the decoder and parser without copying; the next change copies them first.
+
+    def _is_grammar_wrapper_effective(self, grammar_wrapper):
+        return grammar_wrapper.active and (not self._any_exclusive_grammars or grammar_wrapper.exclusive)
+
+    def _set_kaldi_rule_activity(self, kaldi_rule, active):
+        if self._kaldi_rules_activity_dirty:
+            return
+        if not (0 <= kaldi_rule.id < len(self._kaldi_rules_activity)):
+            self._kaldi_rules_activity_dirty = True
+            return
+        if self._kaldi_rules_activity[kaldi_rule.id] == active:
+            return
+        if self._kaldi_rules_activity_shared:
+            self._kaldi_rules_activity = list(self._kaldi_rules_activity)
+            self._active_kaldi_rules = set(self._active_kaldi_rules)
+            self._kaldi_rules_activity_shared = False
+        self._kaldi_rules_activity[kaldi_rule.id] = active
+        if active:
+            self._active_kaldi_rules.add(kaldi_rule)
+        else:
+            self._active_kaldi_rules.discard(kaldi_rule)
+
+    def _update_grammar_wrapper_activity(self, grammar_wrapper):
+        effective = self._is_grammar_wrapper_effective(grammar_wrapper)
+        for kaldi_rule in grammar_wrapper.kaldi_rule_by_rule_dict.values():
+            self._set_kaldi_rule_activity(kaldi_rule, effective and kaldi_rule.active)
+
+    def _rebuild_kaldi_rules_activity(self):
+        self._active_kaldi_rules = set()
+        self._kaldi_rules_activity = [False] * self._compiler.num_kaldi_rules
+        self._kaldi_rules_activity_shared = False
+        for grammar_wrapper in self._grammar_wrappers.values():
+            if self._is_grammar_wrapper_effective(grammar_wrapper):
+                for kaldi_rule in grammar_wrapper.kaldi_rule_by_rule_dict.values():
+                    if kaldi_rule.active:
+                        self._active_kaldi_rules.add(kaldi_rule)
+                        self._kaldi_rules_activity[kaldi_rule.id] = True
+        self._kaldi_rules_activity_dirty = False
+
     def _compute_kaldi_rules_activity(self, phrase_start=True):
         if phrase_start:
             fg_window = Window.get_foreground()
@@ -547,32 +798,44 @@ class KaldiEngine(EngineBase, DelegateTimerManagerInterface):
             for grammar_wrapper in self._iter_all_grammar_wrappers_dynamically():
                 grammar_wrapper.phrase_start_callback(**window_info)
         self.prepare_for_recognition()
-        self._active_kaldi_rules = set()
-        self._kaldi_rules_activity = [False] * self._compiler.num_kaldi_rules
-        for grammar_wrapper in self._iter_all_grammar_wrappers_dynamically():
-            if grammar_wrapper.active and (not self._any_exclusive_grammars or grammar_wrapper.exclusive):
-                for kaldi_rule in grammar_wrapper.kaldi_rule_by_rule_dict.values():
-                    if kaldi_rule.active:
-                        self._active_kaldi_rules.add(kaldi_rule)
-                        self._kaldi_rules_activity[kaldi_rule.id] = True
-        self._log.debug("active kaldi_rules: %s", [kr.name for kr in self._active_kaldi_rules])
+        if self._kaldi_rules_activity_dirty or len(self._kaldi_rules_activity) != self._compiler.num_kaldi_rules:
+            # Also rebuild if kaldi rules were allocated or destroyed without marking the activity as dirty
+            self._rebuild_kaldi_rules_activity()
+        self._kaldi_rules_activity_shared = True
+        self._phrase_active_kaldi_rules = self._active_kaldi_rules
+        self._phrase_decode_generation = self._decode_generation  # Identifies the activity the phrase is parsed with
+        if self._log.isEnabledFor(logging.DEBUG):
+            self._log.debug("active kaldi_rules: %s", [kr.name for kr in self._active_kaldi_rules])
         return self._kaldi_rules_activity
 
     def _parse_recognition(self, output, mimic=False):
         if mimic or self._compiler.parsing_framework == 'text':
             with debug_timer(self._log.debug, "kaldi_rule parse time"):
                 detect_ambiguity = False
-                results = []
-                for kaldi_rule in sorted(self._active_kaldi_rules, key=lambda kr: 100 if kr.has_dictation else 0):
-                    self._log.debug("attempting to parse %r with %s", output, kaldi_rule)
-                    words = self._compiler.parse_output_for_rule(kaldi_rule, output)
-                    if words is None:
-                        continue
-                    # self._log.debug("success %d", kaldi_rule_id)
-                    # Pass (kaldi_rule, words) to below.
-                    results.append((kaldi_rule, words))
-                    if not detect_ambiguity:
-                        break
+                cache = self._decode_cache
+                results = None
+                # Cached results are only valid for the same active kaldi rules, so use the generation of the activity captured
+                # at phrase start (see _compute_kaldi_rules_activity()), even if it has changed since
+                generation = self._phrase_decode_generation
+                if generation is None:
+                    cache = None
+                if cache is not None:
+                    results = cache.get(output, generation)
+                if results is None:
+                    results = []
+                    for kaldi_rule in sorted(self._phrase_active_kaldi_rules, key=lambda kr: 100 if kr.has_dictation else 0):
+                        self._log.debug("attempting to parse %r with %s", output, kaldi_rule)
+                        words = self._compiler.parse_output_for_rule(kaldi_rule, output)
+                        if words is None:
+                            continue
+                        # self._log.debug("success %d", kaldi_rule_id)
+                        # Pass (kaldi_rule, words) to below.
+                        results.append((kaldi_rule, words))
+                        if not detect_ambiguity:
+                            break
+                    if cache is not None:
+                        cache.put(output, generation, results)
+                results = list(results)
 
                 if not results:
                     if not mimic:
@@ -611,7 +874,7 @@ class KaldiEngine(EngineBase, DelegateTimerManagerInterface):
             # Empty recognition, so bail before calling into dragonfly parsing/processing
             return Recognition.construct_empty(self)
 
-        return Recognition(self, kaldi_rule=kaldi_rule, words=words, words_are_dictation_mask=words_are_dictation_mask)
+        return Recognition(self, kaldi_rule=kaldi_rule, words=words, words_are_dictation_mask=words_are_dictation_mask, output=output)
 
 
 #===========================================================================
@@ -621,10 +884,11 @@ class Recognition(object):
     Kaldi recognition results class.
     """
 
-    def __init__(self, engine, kaldi_rule, words, words_are_dictation_mask=None):
+    def __init__(self, engine, kaldi_rule, words, words_are_dictation_mask=None, output=None):
         assert isinstance(engine, KaldiEngine)
         self.engine = engine
         self.kaldi_rule = kaldi_rule
+        self.output = output  # Raw decoder output, including nonterminals
         self.words = tuple(words)
         if words_are_dictation_mask is None:
             assert not words
@@ -703,11 +967,17 @@ class GrammarWrapper(GrammarWrapperBase):
                     # Return early if the method didn't return True or equiv.
                     return
 
-            state = State(words_rules, rule_names, self.engine)
-            state.initialize_decoding()
-            for result in rule.decode(state):
-                if state.finished():
-                    root = state.build_parse_tree()
+            with timed_phase("process_words", rule):
+                # Build the parse tree from the recognition's path through the kaldi rule's FST if possible, else decode
+                root = self._build_parse_tree_from_path(recognition, words_rules)
+                if root is None:
+                    state = State(words_rules, rule_names, self.engine)
+                    state.initialize_decoding()
+                    for result in rule.decode(state):
+                        if state.finished():
+                            root = state.build_parse_tree()
+                            break
+                if root is not None:
                     notify_args = (words, rule, root, recognition)
                     self.recobs_manager.notify_recognition(*notify_args)
                     with debug_timer(self.engine._log.debug, "rule execution time"):
@@ -721,6 +991,23 @@ class GrammarWrapper(GrammarWrapperBase):
         # If this point is reached, then the recognition was not processed successfully
         self.engine._log.error("Grammar %s: failed to decode rule %s recognition %r." % (self.grammar._name, rule.name, words))
 
+    def _build_parse_tree_from_path(self, recognition, words_rules):
+        compiler = self.engine._compiler
+        if recognition.output is None or not compiler.path_parse_trees:
+            return None
+        with timed_phase("build_parse_tree"):
+            # Rules loaded from the rule FST cache are only built when first needed
+            compiler.build_rule_fst(recognition.kaldi_rule)
+            element_path_graph = getattr(recognition.kaldi_rule, 'element_path_graph', None)
+            if element_path_graph is None:
+                return None
+            frames = element_path_graph.parse_frames(recognition.output, recognition.words)
+            if frames is None:
+                self.engine._log.debug("Grammar %s: decoding rule %s recognition %r, which could not be parsed from its path"
+                    % (self.grammar._name, recognition.kaldi_rule.parent_rule.name, recognition.words))
+                return None
+            return Node.from_frames(frames, words_rules, self.engine)
+
     # FIXME
     # def recognition_other_callback(self, StreamNumber, StreamPosition):
     #         func = getattr(self.grammar, "process_recognition_other", None)
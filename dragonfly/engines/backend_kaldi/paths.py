@@ -0,0 +1,297 @@
+#
+# This file is part of Dragonfly.
+# (c) Copyright 2019 by David Zurow
+# Licensed under the LGPL.
+#
+#   Dragonfly is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU Lesser General Public License as published
+#   by the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   Dragonfly is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public
+#   License along with Dragonfly.  If not, see
+#   <http://www.gnu.org/licenses/>.
+#
+
+"""
+Parse trees built from the path of a recognition through a kaldi rule's FST, instead of by decoding the rule's elements again
+"""
+
+import collections
+
+from ...grammar import elements_basic
+from ...grammar.rule_base import Rule
+
+
+def _decode_func(cls):
+    return getattr(cls.decode, '__func__', cls.decode)
+
+# Elements are only mapped if they decode like these classes, so that the parse tree is the same as the one built by decoding.
+_mappable_decode_funcs = frozenset(_decode_func(cls) for cls in (
+    elements_basic.Sequence, elements_basic.Optional, elements_basic.Alternative, elements_basic.Literal,
+    elements_basic.RuleRef, elements_basic.ListRef, elements_basic.Empty, elements_basic.Dictation,
+    elements_basic.Impossible, Rule))
+_mappable_by_type = {}  # Caches whether each class is mappable
+
+
+class _Entry(object):
+    """ Compilation of an element (or rule) within a kaldi rule, corresponding to a parse tree node. """
+    __slots__ = ('actor', 'parent', 'loop', '_chain')
+
+    def __init__(self, actor, parent):
+        self.actor = actor
+        self.parent = parent
+        self.loop = False  # Whether this is an optimized Repetition, compiled as a loop over its child
+        self._chain = None
+
+    @property
+    def chain(self):
+        """ Entries from the root down to this one. Computed on first use, since most entries never occur in a recognition. """
+        if self._chain is None:
+            self._chain = (self.parent.chain if self.parent else ()) + (self,)
+        return self._chain
+
+
+_Arc = collections.namedtuple('_Arc', 'dst_state ilabel olabel entry loop')
+
+
+class _Instance(object):
+    """ Occurrence of an entry on a path. """
+    __slots__ = ('entry', 'begin', 'end', 'children')
+
+    def __init__(self, entry, begin, end):
+        self.entry = entry
+        self.begin = begin
+        self.end = end
+        self.children = []
+
+
+class _MappingFailure(Exception):
+    pass
+
+
+class ElementPathGraph(object):
+    """
+    Wraps a kaldi rule's FST during compilation, forwarding all calls to it, and records each arc together with the element
+    being compiled when it was added. After compilation, :meth:`parse_frames` finds the path through the FST taken by a
+    recognition's output and returns the parse tree frames of the elements along it.
+    """
+
+    silent_labels = frozenset((u'<eps>', u'#0', u'!SIL'))
+    dictation_end = u'#nonterm:end'
+
+    def __init__(self, fst):
+        self.fst = fst
+        self.start_state = None
+        self.final_state = None
+        self.mappable = True
+        self._arcs = collections.defaultdict(list)  # src_state -> [_Arc, ...]
+        self._entry = None
+        self._repetition_depth = 0
+
+    def __getattr__(self, name):
+        # Forward everything else to the wrapped FST during compilation
+        fst = self.__dict__.get('fst')
+        if fst is None:
+            raise AttributeError(name)
+        return getattr(fst, name)
+
+    #-----------------------------------------------------------------------
+    # Methods used during compilation.
+
+    def add_arc(self, src_state, dst_state, label, olabel=None, weight=None):
+        self.fst.add_arc(src_state, dst_state, label, olabel=olabel, weight=weight)
+        if label is None: label = self.fst.eps
+        if olabel is None: olabel = label
+        self._arcs[src_state].append(_Arc(dst_state, label, olabel, self._entry, False))
+
+    def mark_loop_arc(self, src_state):
+        """ Marks the last arc added from *src_state* as the back arc of the optimized Repetition being compiled. """
+        arc = self._arcs[src_state][-1]
+        self._arcs[src_state][-1] = arc._replace(loop=True)
+        self._entry.loop = True
+
+    def enter(self, actor):
+        """ Starts compiling *actor* (an element or rule); arcs added until the matching :meth:`exit` belong to it. """
+        cls = type(actor)
+        mappable = _mappable_by_type.get(cls)
+        if mappable is None:
+            mappable = _mappable_by_type[cls] = _decode_func(cls) in _mappable_decode_funcs
+        if not mappable:
+            self.mappable = False
+        if isinstance(actor, elements_basic.Repetition):
+            if self._repetition_depth:
+                # The path may split words between nested repetitions differently than decoding does
+                self.mappable = False
+            self._repetition_depth += 1
+        self._entry = _Entry(actor, self._entry)
+
+    def exit(self):
+        if isinstance(self._entry.actor, elements_basic.Repetition):
+            self._repetition_depth -= 1
+        self._entry = self._entry.parent
+
+    def finish(self, start_state, final_state):
+        """ Finishes compilation, releasing the wrapped FST. Returns self. """
+        self.start_state = start_state
+        self.final_state = final_state
+        self.fst = None
+        self._arcs = dict(self._arcs)
+        return self
+
+    #-----------------------------------------------------------------------
+    # Methods used for recognitions.
+
+    def _find_path(self, tokens):
+        """ Returns a list of (arc, begin_token_index, end_token_index) for a path matching all *tokens*, or None. Uses DFS. """
+        arcs_table = self._arcs
+        silent_labels = self.silent_labels
+        num_tokens = len(tokens)
+        no_arcs = ()
+        stack = [(self.start_state, 0, iter(arcs_table.get(self.start_state, no_arcs)))]
+        path = []
+        visited = set([(self.start_state, 0)])  # States that cannot lead to a match when reached again
+        while stack:
+            state, index, arcs = stack[-1]
+            if index == num_tokens and state == self.final_state:
+                return path
+            token = tokens[index] if index < num_tokens else None
+            for arc in arcs:
+                olabel = arc.olabel
+                if olabel.startswith(u'#nonterm:'):
+                    if olabel != token:
+                        continue
+                    if olabel == self.dictation_end:
+                        next_index = index + 1
+                    else:
+                        # Dictation: skip to its end marker, which is matched by the next arc
+                        try:
+                            next_index = tokens.index(self.dictation_end, index + 1)
+                        except ValueError:
+                            continue
+                elif arc.ilabel in silent_labels:
+                    next_index = index
+                elif arc.ilabel == token:
+                    next_index = index + 1
+                else:
+                    continue
+                key = (arc.dst_state, next_index)
+                if key in visited:
+                    continue
+                visited.add(key)
+                path.append((arc, index, next_index))
+                stack.append((arc.dst_state, next_index, iter(arcs_table.get(arc.dst_state, no_arcs))))
+                break
+            else:
+                stack.pop()
+                if path:
+                    path.pop()
+        return None
+
+    def parse_frames(self, output, words):
+        """
+        Returns the ``(actor, begin, end, depth)`` frames of the parse tree for kaldi *output* (with nonterminals, starting with
+        the rule nonterminal) recognized as *words*, in the same form as built by decoding, or None if they cannot be determined.
+        """
+        if not self.mappable:
+            return None
+        tokens = output.split()[1:]
+        word_indexes = [0]
+        for token in tokens:
+            word_indexes.append(word_indexes[-1] + (0 if token.startswith(u'#nonterm:') else 1))
+        if word_indexes[-1] != len(words) or [token for token in tokens if not token.startswith(u'#nonterm:')] != list(words):
+            # The words were changed after decoding, e.g. by alternative dictation
+            return None
+
+        path = self._find_path(tokens)
+        if path is None:
+            return None
+
+        # Collect the occurrences of entries along the path. Entries within an optimized Repetition occur once per iteration.
+        instances = {}
+        root = None
+        loop_iterations = collections.defaultdict(int)
+        for arc, begin, end in path:
+            begin, end = word_indexes[begin], word_indexes[end]
+            if arc.loop:
+                loop_iterations[arc.entry] += 1
+            parent = None
+            context = ()
+            for entry in arc.entry.chain:
+                key = (entry, context)
+                instance = instances.get(key)
+                if instance is None:
+                    instance = instances[key] = _Instance(entry, begin, end)
+                    if parent is None:
+                        root = instance
+                    else:
+                        parent.children.append(instance)
+                else:
+                    instance.end = end
+                if entry.loop:
+                    context += (loop_iterations[entry],)
+                parent = instance
+
+        frames = []
+        try:
+            self._add_frames(root, 1, frames, words)
+        except _MappingFailure:
+            return None
+        return frames
+
+    def _add_frames(self, instance, depth, frames, words):
+        actor = instance.entry.actor
+        if isinstance(actor, elements_basic.ListRef):
+            # Decoding matches the words exactly, whereas the FST is compiled from lowercased list items
+            if u" ".join(words[instance.begin:instance.end]) not in actor.list:
+                raise _MappingFailure()
+        frames.append((actor, instance.begin, instance.end, depth))
+        if instance.entry.loop:
+            self._add_repetition_frames(instance, depth + 1, frames, words)
+        else:
+            for child in instance.children:
+                self._add_frames(child, depth + 1, frames, words)
+
+    def _add_repetition_frames(self, instance, depth, frames, words):
+        # Decoding uses the Repetition's children: its child repeated min times, followed by a chain of nested
+        # Optional(Sequence([child, Optional(...)])) elements, ending with Optional(child).
+        repetition = instance.entry.actor
+        iterations = instance.children
+        minimum = repetition.min
+        optional_length = repetition.max - minimum - 1
+        if len(iterations) < minimum:
+            raise _MappingFailure()
+        for iteration in iterations[:minimum]:
+            self._add_frames(iteration, depth, frames, words)
+        remaining = iterations[minimum:]
+        if optional_length <= 0:
+            if remaining:
+                raise _MappingFailure()
+            return
+
+        optional = repetition.children[-1]
+        position = iterations[minimum - 1].end if minimum else instance.begin
+        for level in range(1, optional_length + 1):
+            if not remaining:
+                frames.append((optional, position, position, depth))
+                return
+            if level == optional_length:
+                if len(remaining) != 1:
+                    raise _MappingFailure()
+                frames.append((optional, remaining[0].begin, remaining[0].end, depth))
+                self._add_frames(remaining[0], depth + 1, frames, words)
+                return
+            sequence = optional.children[0]
+            begin, end = remaining[0].begin, remaining[-1].end
+            frames.append((optional, begin, end, depth))
+            frames.append((sequence, begin, end, depth + 1))
+            self._add_frames(remaining[0], depth + 2, frames, words)
+            position = remaining[0].end
+            remaining = remaining[1:]
+            optional = sequence.children[1]
+            depth += 2
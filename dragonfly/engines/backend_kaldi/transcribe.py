@@ -0,0 +1,325 @@
+#
+# This file is part of Dragonfly.
+# (c) Copyright 2019 by David Zurow
+# Licensed under the LGPL.
+#
+#   Dragonfly is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU Lesser General Public License as published
+#   by the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   Dragonfly is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public
+#   License along with Dragonfly.  If not, see
+#   <http://www.gnu.org/licenses/>.
+#
+
+"""
+Offline batch transcription for the Kaldi engine
+============================================================================
+
+This module transcribes many wave files with the Kaldi engine, for example
+the ``retain_*.wav`` files listed in a ``retain.tsv`` file, to evaluate
+grammar or model changes against previously recognized utterances.
+
+Files are sharded over a pool of worker processes. Each worker creates its
+own Kaldi engine with the given engine options, loads the given command
+modules and transcribes files with
+:meth:`~dragonfly.engines.backend_kaldi.engine.KaldiEngine.transcribe_wave_file`,
+so no actions are executed. Results are yielded in input order as soon as
+they are available.
+
+File lists contain one wave file path per line. Lines may have further
+tab-separated columns in the format of ``retain.tsv``, in which case the
+fifth column is the reference text used for measuring accuracy. Lines
+without a wave file path and lines starting with ``#`` are ignored.
+Relative paths are resolved relative to the list file.
+
+Example usage::
+
+    from dragonfly.engines.backend_kaldi.transcribe import (
+        read_file_list, transcribe_files, TranscriptionStats)
+
+    items = read_file_list("retain/retain.tsv")
+    stats = TranscriptionStats()
+    for result in transcribe_files(items, ["_commands.py"],
+                                   engine_options={"model_dir": "model"}):
+        stats.add(result)
+    print(stats.format_report())
+
+The same is available from the command line using
+``python -m dragonfly transcribe``.
+
+"""
+
+from __future__ import division
+
+import io
+import logging
+import math
+import multiprocessing
+import os
+from collections import namedtuple
+
+_log = logging.getLogger("engine.kaldi")
+
+
+#---------------------------------------------------------------------------
+# File lists.
+
+TranscriptionItem = namedtuple("TranscriptionItem", "wav text")
+TranscriptionItem.__doc__ = """
+    Wave file to transcribe, with optional reference *text* (*None* if
+    unknown).
+"""
+
+
+def read_file_list(path):
+    """
+        Read a file list or ``retain.tsv`` file and return a list of
+        :class:`TranscriptionItem` objects.
+
+        :param path: file list path
+        :type path: str
+        :rtype: list
+    """
+    base_dir = os.path.dirname(os.path.abspath(path))
+    items = []
+    with io.open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip(u"\r\n")
+            if not line.strip() or line.startswith(u"#"):
+                continue
+            fields = line.split(u"\t")
+            wav = fields[0].strip()
+            if not wav:
+                # Metadata retained without audio.
+                continue
+            if not os.path.isabs(wav):
+                wav = os.path.join(base_dir, wav)
+            text = fields[4] if len(fields) > 4 else None
+            items.append(TranscriptionItem(wav, text))
+    return items
+
+
+#---------------------------------------------------------------------------
+# Accuracy.
+
+def word_errors(reference, hypothesis):
+    """
+        Return the number of word substitutions, deletions and insertions
+        needed to change the *reference* word sequence into the
+        *hypothesis* word sequence (Levenshtein distance).
+    """
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_word in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1]
+
+
+class TranscriptionStats(object):
+    """
+        Accuracy of transcription results against their reference text.
+        Results without reference text or with errors are only counted.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.scored = 0
+        self.correct = 0
+        self.word_errors = 0
+        self.reference_words = 0
+
+    def add(self, result):
+        """ Add a result dictionary yielded by :func:`transcribe_files`. """
+        self.count += 1
+        if "error" in result:
+            self.errors += 1
+            return
+        if result.get("word_errors") is None:
+            return
+        self.scored += 1
+        self.correct += not result["word_errors"]
+        self.word_errors += result["word_errors"]
+        self.reference_words += len(result["text"].split())
+
+    @property
+    def sentence_accuracy(self):
+        """ Fraction of scored results matching their reference exactly. """
+        return self.correct / self.scored if self.scored else None
+
+    @property
+    def word_error_rate(self):
+        """ Word errors per reference word over all scored results. """
+        if not self.reference_words:
+            return None
+        return self.word_errors / self.reference_words
+
+    def format_report(self):
+        """ Return a short summary of the statistics. """
+        lines = ["%d file(s) transcribed, %d error(s), %d scored"
+                 % (self.count, self.errors, self.scored)]
+        if self.scored:
+            lines.append("sentence accuracy: %.2f%% (%d/%d)"
+                         % (self.sentence_accuracy * 100, self.correct,
+                            self.scored))
+        if self.reference_words:
+            lines.append("word error rate: %.2f%% (%d/%d)"
+                         % (self.word_error_rate * 100, self.word_errors,
+                            self.reference_words))
+        return "\n".join(lines)
+
+
+#---------------------------------------------------------------------------
+# Transcription.
+
+# Engine of the current worker process, or the error message if it could
+# not be initialized.
+_worker_engine = None
+_worker_error = None
+
+
+def _init_worker(module_files, engine_options):
+    global _worker_engine, _worker_error
+    # Catch errors here because the pool would otherwise replace the
+    # failed worker process indefinitely.  They are reported for each item
+    # instead.
+    try:
+        _worker_engine = _create_engine(module_files, engine_options)
+    except Exception as e:
+        _log.exception("Failed to initialize the Kaldi engine for "
+                       "transcription")
+        _worker_engine = None
+        _worker_error = "%s: %s" % (type(e).__name__, e)
+
+
+def _create_engine(module_files, engine_options):
+    # Import locally so that this module can be used without the Kaldi
+    # engine's dependencies, e.g. for reading results.
+    from dragonfly.engines import get_engine, get_current_engine
+    from dragonfly.loader import CommandModule
+
+    current_engine = get_current_engine()
+    if current_engine and current_engine.name == "kaldi":
+        # Use the Kaldi engine that already exists in this process.  Engine
+        # options cannot be applied to it.
+        if engine_options:
+            _log.warning("Ignoring engine options for the existing Kaldi "
+                         "engine: %r", engine_options)
+        engine = current_engine
+    else:
+        options = dict(engine_options or {})
+        options.setdefault("audio_input_device", False)
+        engine = get_engine("kaldi", **options)
+    engine.connect()
+    for filename in module_files:
+        module_ = CommandModule(filename)
+        module_.load()
+        if not module_.loaded:
+            _log.error("Failed to load command module %r for "
+                       "transcription", filename)
+    return engine
+
+
+def _number(value):
+    # JSON has no NaN.
+    if value is None or math.isnan(value):
+        return None
+    return value
+
+
+def _transcribe_item(item):
+    result = {"wav": item.wav}
+    if _worker_engine is None:
+        result["error"] = ("Kaldi engine initialization failed: %s"
+                           % _worker_error)
+        return result
+    try:
+        recognition = _worker_engine.transcribe_wave_file(item.wav)
+    except Exception as e:
+        _log.exception("Failed to transcribe %r", item.wav)
+        result["error"] = "%s: %s" % (type(e).__name__, e)
+        return result
+
+    kaldi_rule = recognition.kaldi_rule
+    result.update(
+        words=list(recognition.words),
+        grammar=kaldi_rule.parent_grammar.name if kaldi_rule else None,
+        rule=kaldi_rule.parent_rule.name if kaldi_rule else None,
+        acceptable=recognition.acceptable,
+        expected_error_rate=_number(recognition.expected_error_rate),
+        confidence=_number(recognition.confidence),
+    )
+    if item.text is not None:
+        result["text"] = item.text
+        result["word_errors"] = word_errors(item.text.split(),
+                                            recognition.words)
+    return result
+
+
+def transcribe_files(items, module_files=(), engine_options=None,
+                     processes=None, chunksize=4):
+    """
+        Transcribe wave files using a pool of worker processes.
+
+        This is a generator yielding one dictionary per item, in input
+        order, with the following keys:
+
+         * ``wav`` -- wave file path.
+         * ``words`` -- list of recognized words.
+         * ``grammar`` and ``rule`` -- names of the recognized grammar and
+           rule, or *None* if nothing was recognized.
+         * ``acceptable`` -- whether the engine would have processed the
+           recognition, see the *expected_error_rate_threshold* engine
+           option.
+         * ``expected_error_rate`` and ``confidence`` -- recognition
+           measures, or *None* if unavailable.
+         * ``text`` and ``word_errors`` -- reference text and number of
+           word errors, if the item has reference text.
+         * ``error`` -- error message if the file could not be
+           transcribed or the engine could not be initialized, in which
+           case only ``wav`` is also set.
+
+        :param items: files to transcribe
+        :type items: iterable of :class:`TranscriptionItem`
+        :param module_files: command module files to load in each worker
+        :type module_files: list
+        :param engine_options: Kaldi engine options for each worker; the
+            *audio_input_device* option defaults to *False*
+        :type engine_options: dict
+        :param processes: number of worker processes; defaults to the
+            number of CPUs. If 1, files are transcribed in this process,
+            using the current engine if it is a Kaldi engine, in which
+            case *engine_options* are ignored.
+        :type processes: int
+        :param chunksize: number of items sent to a worker at a time
+        :type chunksize: int
+    """
+    module_files = list(module_files)
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if processes == 1:
+        _init_worker(module_files, engine_options)
+        for item in items:
+            yield _transcribe_item(item)
+        return
+
+    pool = multiprocessing.Pool(processes, _init_worker,
+                                (module_files, engine_options))
+    try:
+        for result in pool.imap(_transcribe_item, items, chunksize):
+            yield result
+        pool.close()
+    finally:
+        # Stop the workers early if the generator was not exhausted.
+        pool.terminate()
+        pool.join()
@@ -42,6 +42,7 @@ from six import text_type, binary_type, string_types, PY2
 
 from ..base        import (EngineBase, EngineError, MimicFailure,
                            GrammarWrapperBase)
+from ..base.timing import timed_phase
 from .compiler     import NatlinkCompiler
 from .dictation    import NatlinkDictationContainer
 from .recobs       import NatlinkRecObsManager
@@ -168,6 +169,8 @@ class NatlinkEngine(EngineBase):
 
     def disconnect(self):
         """ Disconnect from natlink. """
+        self._process_disconnect_callbacks()
+
         # Unload all grammars from the engine so that Dragon doesn't keep
         # recognizing them.
         for grammar in self.grammars:
@@ -481,25 +484,26 @@ class GrammarWrapper(GrammarWrapperBase):
                 )
                 s = state_.State(words_rules2, self.grammar._rule_names,
                                  self.engine)
-            s.initialize_decoding()
-            for result in r.decode(s):
-                if s.finished():
-                    self._retain_audio(words, results, r.name)
-                    root = s.build_parse_tree()
-
-                    # Notify observers using the manager *before*
-                    # processing.
-                    notify_args = (words, r, root, results)
-                    self.recobs_manager.notify_recognition(*notify_args)
-
-                    r.process_recognition(root)
-
-                    # Notify observers using the manager *after*
-                    # processing.
-                    self.recobs_manager.notify_post_recognition(
-                        *notify_args
-                    )
-                    return True
+            with timed_phase("process_words", r):
+                s.initialize_decoding()
+                for result in r.decode(s):
+                    if s.finished():
+                        self._retain_audio(words, results, r.name)
+                        root = s.build_parse_tree()
+
+                        # Notify observers using the manager *before*
+                        # processing.
+                        notify_args = (words, r, root, results)
+                        self.recobs_manager.notify_recognition(*notify_args)
+
+                        r.process_recognition(root)
+
+                        # Notify observers using the manager *after*
+                        # processing.
+                        self.recobs_manager.notify_post_recognition(
+                            *notify_args
+                        )
+                        return True
 
         return False
 
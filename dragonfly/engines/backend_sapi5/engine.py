@@ -47,6 +47,7 @@ from ..base                    import (EngineBase, EngineError,
                                        DelegateTimerManagerInterface,
                                        DictationContainerBase,
                                        GrammarWrapperBase)
+from ..base.timing             import timed_phase
 from .compiler                 import Sapi5Compiler
 from .recobs                   import Sapi5RecObsManager
 from ...grammar.state          import State
@@ -131,6 +132,7 @@ class Sapi5SharedEngine(EngineBase, DelegateTimerManagerInterface):
 
     def disconnect(self):
         """ Disconnect from back-end SR engine. """
+        self._process_disconnect_callbacks()
         self._recognizer  = None
         self._speaker     = None
         self._compiler    = None
@@ -630,19 +632,22 @@ class GrammarWrapper(GrammarWrapperBase):
                 if not (r.active and r.exported):
                     continue
 
-                s.initialize_decoding()
-                for result in r.decode(s):
-                    if s.finished():
-                        # Notify recognition observers, then process the
-                        # rule.
-                        root = s.build_parse_tree()
-                        notify_args = (words, r, root, newResult)
-                        self.recobs_manager.notify_recognition(*notify_args)
-                        r.process_recognition(root)
-                        self.recobs_manager.notify_post_recognition(
-                            *notify_args
-                        )
-                        return
+                with timed_phase("process_words", r):
+                    s.initialize_decoding()
+                    for result in r.decode(s):
+                        if s.finished():
+                            # Notify recognition observers, then process the
+                            # rule.
+                            root = s.build_parse_tree()
+                            notify_args = (words, r, root, newResult)
+                            self.recobs_manager.notify_recognition(
+                                *notify_args
+                            )
+                            r.process_recognition(root)
+                            self.recobs_manager.notify_post_recognition(
+                                *notify_args
+                            )
+                            return
 
         except Exception as e:
             Sapi5Engine._log.error("Grammar %s: exception: %s"
@@ -25,7 +25,7 @@ recognition engine.
 
 import jsgf
 import jsgf.ext
-from dragonfly import List, DictList
+from dragonfly import List, DictList, SetList
 import dragonfly.grammar.elements as elements_
 
 from ..base import CompilerBase, CompilerError
@@ -111,7 +111,7 @@ class JSGFCompiler(CompilerBase):
     # instead.
 
     def compile_list(self, lst, *args, **kwargs):
-        if isinstance(lst, List):
+        if isinstance(lst, (List, SetList)):
             literal_list = [elements_.Literal(item) for item in lst]
         elif isinstance(lst, DictList):
             keys = list(lst.keys())
@@ -274,6 +274,8 @@ class SphinxEngine(EngineBase, DelegateTimerManagerInterface):
         This method effectively unloads all loaded grammars and key
         phrases.
         """
+        self._process_disconnect_callbacks()
+
         # Free resources if the decoder isn't currently being used to
         # recognise, otherwise stop the recognising loop, which will free
         # the resources safely.
@@ -32,6 +32,10 @@ class SphinxRecObsManager(RecObsManagerBase):
     This class's methods are called by the engine directly, rather than
     through a grammar.
     """
+
+    callback_names = (RecObsManagerBase.callback_names +
+                      ("on_next_rule_part",))
+
     def __init__(self, engine):
         RecObsManagerBase.__init__(self, engine)
 
@@ -49,11 +53,5 @@ class SphinxRecObsManager(RecObsManagerBase):
         This is for rules involving Dictation elements that must be spoken
         in sequence.
         """
-        for observer in self._observers:
-            try:
-                if hasattr(observer, "on_next_rule_part"):
-                    observer.on_next_rule_part(words)
-            except Exception as e:
-                self._log.exception("Exception during on_next_rule_part()"
-                                    " method of recognition observer %s: %s"
-                                    % (observer, e))
+        self._process_observer_callbacks("on_next_rule_part", ["words"],
+                                         words=words)
@@ -18,19 +18,27 @@
 #   <http://www.gnu.org/licenses/>.
 #
 
+from collections import namedtuple
 import locale
 import logging
 import sys
+import threading
 import time
 
 from six import string_types, binary_type
 
 import dragonfly.grammar.state as state_
 from dragonfly import Window
+from dragonfly.windows.base_window import BaseWindow
 
 from .recobs import TextRecobsManager
 from ..base import (EngineBase, MimicFailure, ThreadedTimerManager,
                     DictationContainerBase, GrammarWrapperBase)
+from ..base.timing import timed_phase
+
+
+# Sentinel for decode results missing from the decode cache.
+_missing = object()
 
 
 def _map_word(word):
@@ -43,25 +51,79 @@ def _map_word(word):
         return word, 0
 
 
+class MimicResult(namedtuple("MimicResult", "words grammar rule node")):
+    """
+    Result of mimicking one utterance using
+    :meth:`TextInputEngine.mimic_many`.
+
+    The *grammar*, *rule* and *node* attributes are ``None`` if no rule
+    matched the utterance's *words*.
+    """
+
+    __slots__ = ()
+
+    @property
+    def success(self):
+        """ Whether a rule matched the utterance. """
+        return self.rule is not None
+
+    @property
+    def value(self):
+        """ Value of the matched rule's parse tree, if any. """
+        if self.node is None:
+            return None
+        return self.node.value()
+
+
 class TextInputEngine(EngineBase):
-    """Text-input Engine class. """
+    """
+    Text-input Engine class.
+
+    :param isolated: whether to create an isolated engine instance. Isolated
+        engines are not registered as the default engine and are never
+        returned by :func:`dragonfly.engines.get_engine`. Grammars and
+        recognition observers must be given the engine explicitly.
+    :type isolated: bool
+
+    Each engine instance has its own grammar wrappers, lists and
+    recognition observers, so that separate instances can be used as
+    independent sessions, e.g. one per user of a command evaluation
+    service.
+
+    **Thread safety:** :meth:`mimic` and :meth:`mimic_many` may be called
+    from multiple threads.  Recognitions are serialized per engine
+    instance, while recognitions on different engine instances may run
+    concurrently.  Loading and unloading grammars or modifying lists
+    while another thread is mimicking on the same engine is not
+    supported.
+    """
 
     _name = "text"
     DictationContainer = DictationContainerBase
 
     # -----------------------------------------------------------------------
 
-    def __init__(self):
-        EngineBase.__init__(self)
+    def __init__(self, isolated=False):
+        EngineBase.__init__(self, register=not isolated)
+        self._isolated = isolated
+        self._mimic_lock = threading.RLock()
+        self._rule_ordering = None
         self._language = "en"
         self._connected = False
         self._recognition_observer_manager = TextRecobsManager(self)
         self._timer_manager = ThreadedTimerManager(0.02, self)
 
+    @property
+    def isolated(self):
+        """ Whether this is an isolated engine instance. """
+        return self._isolated
+
     def connect(self):
         self._connected = True
 
     def disconnect(self):
+        self._process_disconnect_callbacks()
+
         # Clear grammar wrappers on disconnect()
         self._grammar_wrappers.clear()
         self._connected = False
@@ -83,6 +145,22 @@ class TextInputEngine(EngineBase):
     # -----------------------------------------------------------------------
     # Methods for working with grammars.
 
+    @property
+    def rule_ordering(self):
+        """
+        Adaptive rule ordering used when decoding recognitions, or *None*
+        if grammars and rules are tried in their original order.
+
+        Set this to a
+        :class:`~dragonfly.engines.base.ordering.RuleOrdering` object to
+        try frequently matched rules first.
+        """
+        return self._rule_ordering
+
+    @rule_ordering.setter
+    def rule_ordering(self, ordering):
+        self._rule_ordering = ordering
+
     def _build_grammar_wrapper(self, grammar):
         return GrammarWrapper(grammar, self,
                               self._recognition_observer_manager)
@@ -184,6 +262,8 @@ class TextInputEngine(EngineBase):
            Any dictation words should be all uppercase, e.g. "HELLO WORLD".
            Dictation words not in uppercase will result in the engine
            **not** decoding and recognizing the command!
+
+        This method is thread safe; see :class:`TextInputEngine`.
         """
         # Handle string input.
         if isinstance(words, string_types):
@@ -198,6 +278,12 @@ class TextInputEngine(EngineBase):
         if not words:
             raise MimicFailure("Invalid mimic input %r" % words)
 
+        # Recognitions are serialized per engine instance.  The lock is
+        # re-entrant so that actions may mimic other words.
+        with self._mimic_lock:
+            self._mimic(words, kwargs)
+
+    def _mimic(self, words, kwargs):
         # Notify observers that a recognition has begun.
         self._recognition_observer_manager.notify_begin()
 
@@ -220,6 +306,10 @@ class TextInputEngine(EngineBase):
 
         # Take another copy of _grammar_wrappers to use for processing.
         grammar_wrappers = self._grammar_wrappers.copy().values()
+        if self._rule_ordering is not None:
+            grammar_wrappers = self._rule_ordering.order_grammars(
+                grammar_wrappers, self._decode_generation
+            )
 
         # Count exclusive grammars.
         exclusive_count = 0
@@ -227,19 +317,17 @@ class TextInputEngine(EngineBase):
             if wrapper.exclusive:
                 exclusive_count += 1
 
-        # Call process_words() for each grammar wrapper, stopping early if
-        # processing occurred.
-        processing_occurred = False
-        for wrapper in grammar_wrappers:
-            # Skip non-exclusive grammars if there are one or more exclusive
-            # grammars.
-            if exclusive_count > 0 and not wrapper.exclusive:
-                continue
+        # Skip non-exclusive grammars if there are one or more exclusive
+        # grammars.
+        if exclusive_count > 0:
+            grammar_wrappers = [wrapper for wrapper in grammar_wrappers
+                                if wrapper.exclusive]
 
-            # Process the grammar.
-            processing_occurred = wrapper.process_words(words_rules)
-            if processing_occurred:
-                break
+        # Process the words using each grammar wrapper, stopping early if
+        # processing occurred.
+        processing_occurred = self._process_words_rules(
+            grammar_wrappers, words_rules, True
+        )
 
         # If no processing occurred, then the mimic failed.
         if not processing_occurred:
@@ -247,6 +335,197 @@ class TextInputEngine(EngineBase):
             raise MimicFailure("No matching rule found for words %r."
                                % (words,))
 
+    def mimic_async(self, words, loop=None, **kwargs):
+        """
+        Mimic a recognition of the given *words* on an asyncio event loop.
+
+        This method schedules a :meth:`mimic` call on *loop* and returns an
+        asyncio future for its completion, so that it can be awaited.  The
+        future's exception is set to :class:`MimicFailure` if the words
+        were not recognized.  Rule processing, actions and recognition
+        observers are run on the event loop without extra threads.
+
+        This method may be called from other threads.  Requires Python
+        3.4+.
+
+        :param words: words to mimic
+        :type words: str|iter
+        :param loop: asyncio event loop to use (default: the current event
+            loop)
+        :Keyword Arguments: passed to :meth:`mimic`.
+        """
+        import asyncio
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        future = asyncio.Future(loop=loop)
+
+        def run():
+            if future.cancelled():
+                return
+            try:
+                self.mimic(words, **kwargs)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(None)
+
+        loop.call_soon_threadsafe(run)
+        return future
+
+    @staticmethod
+    def _get_window_args(window, foreground_args):
+        if isinstance(window, BaseWindow):
+            return {
+                "executable": window.executable,
+                "title": window.title,
+                "handle": window.handle,
+            }
+        process_args = dict(foreground_args)
+        process_args.update(window)
+        return process_args
+
+    def mimic_many(self, utterances, window=None, execute=True):
+        """
+        Mimic recognitions of many utterances.
+
+        This is a generator method which yields a :class:`MimicResult`
+        for each utterance, in order.  Failed recognitions do not raise
+        :class:`MimicFailure`; a result without a matched rule is yielded
+        instead.
+
+        Per-utterance setup is done only when necessary: the foreground
+        window is retrieved once and each grammar's context is processed
+        only when the window context changes.  If *execute* is *True*,
+        contexts are processed for each utterance, as with
+        :meth:`mimic`, because actions may change them.  Grammars loaded
+        or unloaded during processing are only considered after the
+        window context changes.
+
+        :param utterances: iterable of utterances. Each utterance is a
+            string or a sequence of words, or a *(words, window)* tuple to
+            use a specific window context for that utterance.
+        :type utterances: iter
+        :param window: window context to use for utterances without one.
+            This may be a :class:`Window` object or a dictionary with
+            *executable*, *title* and/or *handle* keys. The foreground
+            window's attributes are used for any missing values.
+        :type window: Window|dict
+        :param execute: whether to process recognitions normally, i.e.
+            call grammar and rule recognition processing methods, execute
+            actions and notify recognition observers. If *False*, matched
+            utterances are not processed. Note that grammar contexts are
+            still processed using :meth:`Grammar.process_begin`, calling
+            any grammar and rule ``process_begin()``, ``enter_context()``
+            and ``exit_context()`` callbacks, because they determine which
+            rules are active.
+        :type execute: bool
+        :rtype: generator
+        """
+        w = Window.get_foreground()
+        foreground_args = {
+            "executable": w.executable,
+            "title": w.title,
+            "handle": w.handle,
+        }
+        if window is None:
+            default_args = foreground_args
+        else:
+            default_args = self._get_window_args(window, foreground_args)
+
+        previous_args = None
+        candidates = []
+        for utterance in utterances:
+            # Get the words and window context of this utterance.
+            if (isinstance(utterance, tuple) and len(utterance) == 2 and
+                    isinstance(utterance[1], (dict, BaseWindow))):
+                words, utterance_window = utterance
+                process_args = self._get_window_args(utterance_window,
+                                                     foreground_args)
+            else:
+                words = utterance
+                process_args = default_args
+            if isinstance(words, string_types):
+                words = words.split()
+            words = tuple(words)
+
+            # Recognitions are serialized per engine instance.  Results
+            # are yielded without holding the lock.
+            with self._mimic_lock:
+                if execute:
+                    # Notify observers that a recognition has begun.
+                    self._recognition_observer_manager.notify_begin()
+
+                # Process grammar contexts and determine which grammars to
+                # use if necessary.
+                if execute or process_args != previous_args:
+                    previous_args = process_args
+                    grammar_wrappers = list(self._grammar_wrappers.values())
+                    for wrapper in grammar_wrappers:
+                        wrapper.process_begin(**process_args)
+                    exclusive = [wrapper for wrapper in grammar_wrappers
+                                 if wrapper.exclusive]
+                    candidates = exclusive or grammar_wrappers
+
+                # Process the words using each candidate grammar wrapper,
+                # stopping early if processing occurred.
+                result = None
+                if words:
+                    words_rules = self.generate_words_rules(words)
+                    ordered = candidates
+                    if self._rule_ordering is not None:
+                        ordered = self._rule_ordering.order_grammars(
+                            candidates, self._decode_generation
+                        )
+                    result = self._process_words_rules(ordered, words_rules,
+                                                       execute)
+
+                if not result and execute:
+                    self._recognition_observer_manager.notify_failure(None)
+
+            if result:
+                rule, node = result
+                yield MimicResult(words, rule.grammar, rule, node)
+            else:
+                yield MimicResult(words, None, None, None)
+
+    def _process_words_rules(self, grammar_wrappers, words_rules, execute):
+        """
+        Process a sequence of (word, rule_id) 2-tuples using each grammar
+        wrapper in turn, stopping early if processing occurred.  Returns
+        a (rule, root node) tuple if a rule matched or *None* otherwise.
+
+        Results are looked up in and added to the decode cache, if there
+        is one.
+        """
+        cache = self._decode_cache
+        if cache is not None:
+            generation = self._decode_generation
+            entry = cache.get(words_rules, generation, _missing)
+            if entry is None:
+                return None
+            elif entry is not _missing:
+                wrapper, rule, frames = entry
+                return wrapper.process_frames(words_rules, rule, frames,
+                                              execute)
+
+        # Results are not cached if a grammar's process_recognition()
+        # method was called, because it may have stopped processing.
+        cacheable = cache is not None
+        for wrapper in grammar_wrappers:
+            if getattr(wrapper.grammar, "process_recognition", None):
+                cacheable = False
+            result = wrapper.process_words_rules(words_rules, execute)
+            if result:
+                rule, root = result
+                if cacheable and root is not None:
+                    cache.put(words_rules, generation,
+                              (wrapper, rule, root.frames()))
+                return result
+
+        if cacheable:
+            cache.put(words_rules, generation, None)
+        return None
+
     def speak(self, text):
         self._log.warning("text-to-speech is not implemented for this "
                           "engine.")
@@ -312,47 +591,102 @@ class GrammarWrapper(GrammarWrapperBase):
 
         # If the words argument was not "other" or "reject", then it is a
         # sequence of (word, rule_id) 2-tuples.
-        words_rules = tuple(words)
-        words = tuple(word for word, _ in words)
+        result = self.process_words_rules(tuple(words))
+        if result is None:
+            return
+        return bool(result)
+
+    def process_words_rules(self, words_rules, execute=True):
+        """
+        Attempt to decode a sequence of (word, rule_id) 2-tuples using this
+        grammar's rules.
+
+        If *execute* is *True*, the grammar and matching rule's processing
+        methods are called and recognition observers are notified.
+        Otherwise, the words are only decoded.
+
+        Returns a (rule, root node) tuple if a rule matched, *False* if
+        decoding failed or *None* if processing was stopped early.
+        """
+        # Return early if the grammar is disabled or if there are no active
+        # rules.
+        if not (self.grammar.enabled and self.grammar.active_rules):
+            return None
+
+        words = tuple(word for word, _ in words_rules)
+        results_obj = None
 
         # Call the grammar's general process_recognition method, if present.
         func = getattr(self.grammar, "process_recognition", None)
-        if func:
+        if execute and func:
             if not self._process_grammar_callback(func, words=words,
                                                   results=results_obj):
                 # Return early if the method didn't return True or equiv.
-                return
+                return None
 
         # Iterate through this grammar's rules, attempting to decode each.
         # If successful, call that rule's method for processing the
         # recognition and return.
         s = state_.State(words_rules, self.grammar.rule_names, self.engine)
-        for r in self.grammar.rules:
+        rules = self.grammar.rules
+        ordering = self.engine.rule_ordering
+        if ordering is not None:
+            rules = ordering.order_rules(self.grammar, rules,
+                                         self.engine.decode_generation)
+        for r in rules:
             if not (r.active and r.exported):
                 continue
-            s.initialize_decoding()
-            for _ in r.decode(s):
-                if s.finished():
-                    try:
-                        root = s.build_parse_tree()
-
-                        # Notify observers using the manager *before*
-                        # processing.
-                        notify_args = (words, r, root, results_obj)
-                        self.recobs_manager.notify_recognition(
-                            *notify_args
-                        )
-
-                        r.process_recognition(root)
-
-                        self.recobs_manager.notify_post_recognition(
-                            *notify_args
+            with timed_phase("process_words", r):
+                s.initialize_decoding()
+                for _ in r.decode(s):
+                    if s.finished():
+                        return self._process_parse_tree(
+                            words, r, s.build_parse_tree, execute
                         )
-                    except Exception as e:
-                        self._log.exception("Failed to process rule "
-                                            "'%s': %s" % (r.name, e))
-                    return True
 
         self._log.debug("Grammar %s: failed to decode recognition %r."
                         % (self.grammar.name, words))
         return False
+
+    def process_frames(self, words_rules, rule, frames, execute=True):
+        """
+        Process a sequence of (word, rule_id) 2-tuples previously decoded
+        to *rule* without decoding them again.  The parse tree is rebuilt
+        from *frames*, as returned by :meth:`Node.frames`.
+
+        Returns a (rule, root node) tuple.
+        """
+        words = tuple(word for word, _ in words_rules)
+        engine = self.engine
+
+        def build_parse_tree():
+            return state_.Node.from_frames(frames, words_rules, engine)
+
+        with timed_phase("process_words", rule):
+            return self._process_parse_tree(words, rule, build_parse_tree,
+                                            execute)
+
+    def _process_parse_tree(self, words, rule, build_parse_tree, execute):
+        # Build the parse tree of a decoded rule and, if *execute* is True,
+        # process the recognition.
+        ordering = self.engine.rule_ordering
+        if ordering is not None:
+            ordering.record_match(self.grammar, rule)
+        results_obj = None
+        root = None
+        try:
+            root = build_parse_tree()
+            if not execute:
+                return rule, root
+
+            # Notify observers using the manager *before* processing.
+            notify_args = (words, rule, root, results_obj)
+            self.recobs_manager.notify_recognition(*notify_args)
+
+            rule.process_recognition(root)
+
+            self.recobs_manager.notify_post_recognition(*notify_args)
+        except Exception as e:
+            self._log.exception("Failed to process rule '%s': %s"
+                                % (rule.name, e))
+        return rule, root
@@ -20,10 +20,19 @@
 
 
 from .engine           import EngineBase, EngineError, MimicFailure
+from .cache            import DecodeCache
 from .compiler         import CompilerBase, CompilerError
 from .dictation        import DictationContainerBase
 from .grammar_wrapper  import GrammarWrapperBase
-from .recobs           import RecObsManagerBase
+from .ordering         import RuleOrdering
+from .recobs           import (RecObsManagerBase, ObserverDeliveryBase,
+                               ThreadedObserverDelivery,
+                               AsyncioObserverDelivery)
 from .timer            import (TimerManagerBase, ThreadedTimerManager,
+                               AsyncioTimerManager,
                                DelegateTimerManager,
                                DelegateTimerManagerInterface)
+from .timing           import (TimingRecord, TimingSinkBase, RingTimingSink,
+                               LoggingTimingSink, JsonTimingSink,
+                               add_timing_sink, remove_timing_sink,
+                               timing_enabled)
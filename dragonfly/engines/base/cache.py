@@ -0,0 +1,113 @@
+#
+# This file is part of Dragonfly.
+# (c) Copyright 2007, 2008 by Christo Butcher
+# Licensed under the LGPL.
+#
+#   Dragonfly is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU Lesser General Public License as published
+#   by the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   Dragonfly is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public
+#   License along with Dragonfly.  If not, see
+#   <http://www.gnu.org/licenses/>.
+#
+
+"""
+Decode result cache
+============================================================================
+
+Users repeat the same commands often.  Engines which decode recognized
+words by trying each active rule in turn can use a :class:`DecodeCache`
+to remember which rule matched each utterance, together with the data
+needed to rebuild the parse tree, so that repeated utterances are not
+decoded again.
+
+Cached results are only valid while the engine's loaded grammars, active
+rules, lists and grammar exclusiveness stay the same.  These are tracked
+by the engine's :attr:`~EngineBase.decode_generation` number, which
+changes whenever any of them change.  The cache is cleared when it is
+used with a different generation number.
+
+The cache is currently used by the text-input engine and by the Kaldi
+engine's ``"text"`` parsing framework.
+
+Example usage::
+
+    from dragonfly.engines.base import DecodeCache
+    engine = get_engine("text")
+    engine.decode_cache = DecodeCache(maxsize=500)
+
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class DecodeCache(object):
+    """
+        Least recently used cache of decode results.
+
+        :param maxsize: maximum number of results to keep
+        :type maxsize: int
+    """
+
+    def __init__(self, maxsize=1000):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1, not %r"
+                             % (maxsize,))
+        self._maxsize = maxsize
+        self._entries = OrderedDict()
+        self._generation = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    maxsize = property(lambda self: self._maxsize,
+                       doc="Maximum number of results to keep.")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _check_generation(self, generation):
+        if generation != self._generation:
+            self._entries.clear()
+            self._generation = generation
+
+    def get(self, key, generation, default=None):
+        """
+            Return the result cached for *key* under *generation*, or
+            *default* if there is none.
+        """
+        with self._lock:
+            self._check_generation(generation)
+            try:
+                value = self._entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries[key] = value
+            self.hits += 1
+            return value
+
+    def put(self, key, generation, value):
+        """ Cache the result *value* for *key* under *generation*. """
+        with self._lock:
+            self._check_generation(generation)
+            self._entries.pop(key, None)
+            self._entries[key] = value
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """ Remove all cached results and reset the statistics. """
+        with self._lock:
+            self._entries.clear()
+            self._generation = None
+            self.hits = 0
+            self.misses = 0
@@ -24,6 +24,7 @@ EngineBase class
 
 """
 
+import itertools
 import logging
 from .timer import Timer
 
@@ -53,6 +54,13 @@ class EngineContext(object):
         self._engine.disconnect()
 
 
+#---------------------------------------------------------------------------
+
+# Decode generation numbers are drawn from a counter shared by all engines.
+#  Drawing a number is atomic, so concurrent changes are never lost.
+_decode_generations = itertools.count(1)
+
+
 #---------------------------------------------------------------------------
 
 class EngineBase(object):
@@ -61,15 +69,20 @@ class EngineBase(object):
     _log = logging.getLogger("engine")
     _name = "base"
     _timer_manager = None
+    _decode_generation = 0
+    _decode_cache = None
 
     #-----------------------------------------------------------------------
 
-    def __init__(self):
-        # Register initialization of this engine.
-        dragonfly.engines.register_engine_init(self)
+    def __init__(self, register=True):
+        # Register initialization of this engine, unless it is an isolated
+        #  engine instance.
+        if register:
+            dragonfly.engines.register_engine_init(self)
 
         self._grammar_wrappers = {}
         self._recognition_observer_manager = None
+        self._disconnect_callbacks = []
 
 #    def __del__(self):
 #        try:
@@ -111,6 +124,28 @@ class EngineBase(object):
         """ Context manager for a connection to the back-end SR engine. """
         return EngineContext(self)
 
+    def register_disconnect_callback(self, callback):
+        """
+        Register a function to be called without arguments when the
+        engine disconnects from the back-end SR engine.
+        """
+        if callback not in self._disconnect_callbacks:
+            self._disconnect_callbacks.append(callback)
+
+    def unregister_disconnect_callback(self, callback):
+        """ Unregister a function registered for engine disconnection. """
+        if callback in self._disconnect_callbacks:
+            self._disconnect_callbacks.remove(callback)
+
+    def _process_disconnect_callbacks(self):
+        # Engine implementations should call this in disconnect().
+        for callback in list(self._disconnect_callbacks):
+            try:
+                callback()
+            except Exception as e:
+                self._log.exception("Exception from disconnect callback"
+                                    " %r: %s", callback, e)
+
     #-----------------------------------------------------------------------
     # Methods for administrating timers.
 
@@ -119,6 +154,53 @@ class EngineBase(object):
             repeat interval. """
         return Timer(callback, interval, self._timer_manager, repeating)
 
+    def set_timer_manager(self, manager):
+        """
+            Set the timer manager used by this engine, e.g. an
+            :class:`AsyncioTimerManager` instance.
+
+            Active timers are moved to the new manager and restarted.
+        """
+        old_manager = self._timer_manager
+        self._timer_manager = manager
+        if old_manager is None or old_manager is manager:
+            return
+        for timer in tuple(old_manager.timers):
+            timer.stop()
+            timer.manager = manager
+            timer.start()
+
+    #-----------------------------------------------------------------------
+    # Methods for caching decode results.
+
+    @property
+    def decode_generation(self):
+        """
+            Number identifying the current state of this engine's loaded
+            grammars, active rules, lists and grammar exclusiveness.  It
+            changes whenever any of these change.
+        """
+        return self._decode_generation
+
+    def bump_decode_generation(self):
+        """
+            Change the decode generation number, invalidating cached
+            decode results.  This is called by grammars automatically.
+        """
+        self._decode_generation = next(_decode_generations)
+
+    def _get_decode_cache(self):
+        return self._decode_cache
+
+    def _set_decode_cache(self, cache):
+        self._decode_cache = cache
+
+    decode_cache = property(_get_decode_cache, _set_decode_cache,
+                            doc="Optional :class:`DecodeCache` used by"
+                                " the engine for decode results, or"
+                                " *None*.  This is currently used by the"
+                                " text-input and Kaldi engines.")
+
     #-----------------------------------------------------------------------
     # Methods for administrating grammar wrappers.
 
@@ -31,6 +31,16 @@ except ImportError:
     from inspect import getargspec
 
 
+def _get_argument_names(func):
+    # Return the argument names accepted by a callback function, or None
+    # if it takes arbitrary keyword arguments.
+    argspec = getargspec(func)
+    arg_names, kwargs_names = argspec[0], argspec[2]
+    if kwargs_names:
+        return None
+    return frozenset(arg_names)
+
+
 class GrammarWrapperBase(object):
 
     def __init__(self, grammar, engine, recobs_manager):
@@ -38,14 +48,27 @@ class GrammarWrapperBase(object):
         self.engine = engine
         self.recobs_manager = recobs_manager
 
+        # Cache of the argument names accepted by grammar callback
+        # functions, so that each function is only inspected once.
+        self._callback_arg_names = {}
+
     def _process_grammar_callback(self, func, **kwargs):
         if not func:
             return
 
         # Only send keyword arguments that the given function accepts.
-        argspec = getargspec(func)
-        arg_names, kwargs_names = argspec[0], argspec[2]
-        if not kwargs_names:
+        # Cache argument names using the underlying function of bound
+        # methods because a new method object is created on each access.
+        key = getattr(func, "__func__", func)
+        try:
+            arg_names = self._callback_arg_names[key]
+        except KeyError:
+            arg_names = _get_argument_names(func)
+            self._callback_arg_names[key] = arg_names
+        except TypeError:
+            # Unhashable callable objects are inspected each time.
+            arg_names = _get_argument_names(func)
+        if arg_names is not None:
             kwargs = { k: v for (k, v) in kwargs.items() if k in arg_names }
 
         return func(**kwargs)
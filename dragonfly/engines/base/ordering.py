@@ -0,0 +1,229 @@
+#
+# This file is part of Dragonfly.
+# (c) Copyright 2007, 2008 by Christo Butcher
+# Licensed under the LGPL.
+#
+#   Dragonfly is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU Lesser General Public License as published
+#   by the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   Dragonfly is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public
+#   License along with Dragonfly.  If not, see
+#   <http://www.gnu.org/licenses/>.
+#
+
+"""
+Adaptive rule ordering
+============================================================================
+
+Engines which decode recognized words by trying each grammar and rule in
+turn, such as the text-input engine, stop at the first rule which
+matches.  With adaptive rule ordering enabled, frequently matched rules
+are tried first so that common commands are decoded after fewer misses.
+
+Reordering must not change which rule matches an utterance.  Rules are
+therefore only moved if this is known to be safe:
+
+ * Rules with a higher :attr:`Rule.priority` are always tried before
+   rules with a lower priority.  Rules with equal priority keep their
+   original order, except as follows.
+ * Rules declared unambiguous using :attr:`Rule.unambiguous`, i.e. rules
+   whose utterances are never matched by any other rule, are tried in
+   order of recent match frequency before the other rules of the same
+   priority.
+ * Grammars are ordered in the same way using the highest priority of
+   their exported rules.  A grammar is only moved according to its match
+   frequency if all of its exported rules are declared unambiguous.
+
+Match counts decay exponentially so that the ordering follows recent
+usage.
+
+Example usage::
+
+    from dragonfly.engines.base import RuleOrdering
+    engine = get_engine("text")
+    engine.rule_ordering = RuleOrdering(decay=0.99)
+    # ... load grammars with unambiguous rules and mimic commands ...
+    for (grammar, rule), count in engine.rule_ordering.statistics():
+        print(grammar, rule, count)
+
+"""
+
+import threading
+import weakref
+
+
+class RuleOrdering(object):
+    """
+        Decayed match counts per grammar and rule, used for ordering rules
+        during decoding.
+
+        Counts are kept per grammar and rule object, so rules with the
+        same name in different grammars are counted separately.  The
+        priority and exported rules of each grammar are only inspected
+        again when the engine's decode generation changes; see
+        :attr:`~dragonfly.engines.base.EngineBase.decode_generation`.
+        Changes to :attr:`Rule.priority` or :attr:`Rule.unambiguous`
+        therefore take effect once grammars or rules are next loaded,
+        activated or otherwise changed.
+
+        :param decay: factor applied to all counts each time a match is
+            recorded.  Must be greater than 0 and at most 1; 1 disables
+            decay.
+        :type decay: float
+    """
+
+    # Counts are stored scaled by a growing increment instead of being
+    # multiplied by the decay factor on each match.  They are rescaled
+    # when the increment becomes too large.
+    _rescale_threshold = 1e100
+
+    def __init__(self, decay=0.98):
+        if not 0 < decay <= 1:
+            raise ValueError("decay must be greater than 0 and at most 1, "
+                             "not %r" % (decay,))
+        self._decay = decay
+        self._increment = 1.0
+
+        # Scores are keyed by rule and grammar objects.  Weak references
+        # are used so that counts don't keep unloaded grammars alive.
+        self._rule_scores = weakref.WeakKeyDictionary()
+        self._grammar_scores = weakref.WeakKeyDictionary()
+        self._rule_grammar_names = weakref.WeakKeyDictionary()
+
+        # Orderings computed for the current decode generation.
+        self._generation = None
+        self._grammar_keys = weakref.WeakKeyDictionary()
+        self._rule_orders = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    decay = property(lambda self: self._decay,
+                     doc="Factor applied to counts on each match.")
+
+    def record_match(self, grammar, rule):
+        """ Record that *rule* of *grammar* matched an utterance. """
+        with self._lock:
+            increment = self._increment
+            rule_scores = self._rule_scores
+            grammar_scores = self._grammar_scores
+            rule_scores[rule] = rule_scores.get(rule, 0.0) + increment
+            grammar_scores[grammar] = (grammar_scores.get(grammar, 0.0)
+                                       + increment)
+            self._rule_grammar_names[rule] = grammar.name
+            self._increment = increment / self._decay
+            if self._increment > self._rescale_threshold:
+                self._rescale()
+
+            # Only the scores of unambiguous rules affect the order.
+            if rule.unambiguous:
+                self._rule_orders.pop(grammar, None)
+
+    def _rescale(self):
+        factor = 1.0 / self._increment
+        for scores in (self._rule_scores, self._grammar_scores):
+            for key in list(scores.keys()):
+                scores[key] *= factor
+        self._increment = 1.0
+
+    def reset(self):
+        """ Clear all match counts. """
+        with self._lock:
+            self._rule_scores.clear()
+            self._grammar_scores.clear()
+            self._rule_grammar_names.clear()
+            self._rule_orders.clear()
+            self._increment = 1.0
+
+    def statistics(self):
+        """
+            Return a list of ``((grammar_name, rule_name), count)`` tuples
+            sorted by decreasing decayed match count.
+        """
+        with self._lock:
+            scale = 1.0 / (self._decay * self._increment)
+            items = [((self._rule_grammar_names.get(rule), rule.name),
+                      score * scale)
+                     for rule, score in list(self._rule_scores.items())]
+        items.sort(key=lambda item: (-item[1], item[0]))
+        return items
+
+    def rule_count(self, grammar, rule):
+        """ Return the decayed match count of *rule* of *grammar*. """
+        score = self._rule_scores.get(rule, 0.0)
+        return score / (self._decay * self._increment)
+
+    #-----------------------------------------------------------------------
+    # Ordering methods.
+
+    @staticmethod
+    def _order(items):
+        # Items are (priority, movable, score, value) tuples in their
+        # original order.  Sorting is stable, so items which are not moved
+        # keep their relative order.
+        def key(item):
+            priority, movable, score, _ = item
+            if movable and score:
+                return -priority, 0, -score
+            return -priority, 1, 0
+        return [item[3] for item in sorted(items, key=key)]
+
+    def _set_generation(self, generation):
+        # Drop orderings computed for a previous decode generation.
+        if generation is None or generation != self._generation:
+            self._generation = generation
+            self._grammar_keys.clear()
+            self._rule_orders.clear()
+
+    def order_rules(self, grammar, rules, generation=None):
+        """
+            Return *rules* of *grammar* in the order to try them.
+
+            If the engine's decode *generation* is given, the order is
+            reused until that changes or an unambiguous rule of *grammar*
+            matches.
+        """
+        with self._lock:
+            self._set_generation(generation)
+            ordered = self._rule_orders.get(grammar)
+            if ordered is None:
+                scores = self._rule_scores
+                ordered = self._order([
+                    (rule.priority, rule.unambiguous,
+                     scores.get(rule, 0.0), rule)
+                    for rule in rules
+                ])
+                if generation is not None:
+                    self._rule_orders[grammar] = ordered
+            return ordered
+
+    def order_grammars(self, wrappers, generation=None):
+        """
+            Return grammar *wrappers* in the order to try them.
+
+            If the engine's decode *generation* is given, the priority and
+            movability of each grammar are reused until that changes.
+        """
+        with self._lock:
+            self._set_generation(generation)
+            scores = self._grammar_scores
+            grammar_keys = self._grammar_keys
+            items = []
+            for wrapper in wrappers:
+                grammar = wrapper.grammar
+                key = grammar_keys.get(grammar)
+                if key is None:
+                    rules = [rule for rule in grammar.rules if rule.exported]
+                    priority = max([rule.priority for rule in rules] or [0])
+                    movable = (bool(rules) and
+                               all(rule.unambiguous for rule in rules))
+                    key = (priority, movable)
+                    if generation is not None:
+                        grammar_keys[grammar] = key
+                items.append(key + (scores.get(grammar, 0.0), wrapper))
+            return self._order(items)
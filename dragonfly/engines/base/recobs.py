@@ -25,12 +25,170 @@ Recognition observer base class
 """
 
 import logging
+import threading
+import time
+from collections import deque
+
+from .grammar_wrapper import _get_argument_names
+from .timing import (begin_record, finish_record, set_record_result,
+                     timed_phase)
+
+#---------------------------------------------------------------------------
+
+
+class ObserverDeliveryBase(object):
+    """
+    Base class for delivering recognition observer events asynchronously.
+
+    Events are appended to a bounded queue by the engine thread and
+    delivered later in the order they were queued, so each observer
+    receives its events in order.  What happens when the queue is full is
+    decided by the *overflow* policy:
+
+     * ``"drop_oldest"`` -- discard the oldest queued event (the default).
+     * ``"drop_newest"`` -- discard the new event.
+     * ``"block"`` -- wait until there is space in the queue.  This should
+       not be used if events are delivered on the engine thread.
+
+    The number of discarded events is available through the
+    :attr:`dropped` attribute.
+
+    Sub-classes decide where events are delivered by implementing
+    :meth:`_schedule`, which should arrange for :meth:`_deliver_pending`
+    to be called.
+    """
+
+    _log = logging.getLogger("engine.recobs")
+
+    overflow_policies = ("drop_oldest", "drop_newest", "block")
+
+    def __init__(self, maxsize=100, overflow="drop_oldest"):
+        if overflow not in self.overflow_policies:
+            raise ValueError("Invalid overflow policy %r, expected one of "
+                             "%r" % (overflow, self.overflow_policies))
+        if maxsize < 1:
+            raise ValueError("maxsize must be a positive integer")
+        self._maxsize = maxsize
+        self._overflow = overflow
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._active = False
+        self.dropped = 0
+
+    def put(self, observer, cb_name, func, kwargs):
+        """ Queue an observer callback to be called with *kwargs*. """
+        with self._condition:
+            if len(self._queue) >= self._maxsize:
+                if self._overflow == "drop_newest":
+                    self.dropped += 1
+                    return
+                elif self._overflow == "drop_oldest":
+                    self._queue.popleft()
+                    self.dropped += 1
+                else:
+                    while len(self._queue) >= self._maxsize:
+                        self._condition.wait()
+            self._queue.append((observer, cb_name, func, kwargs))
+            schedule = not self._active
+            self._active = True
+            self._condition.notify_all()
+
+        # Arrange for queued events to be delivered if necessary.
+        if schedule:
+            self._schedule()
+
+    def _schedule(self):
+        raise NotImplementedError(str(self))
+
+    def _deliver_pending(self):
+        # Deliver queued events until the queue is empty.
+        while True:
+            with self._condition:
+                if not self._queue:
+                    self._active = False
+                    self._condition.notify_all()
+                    return
+                observer, cb_name, func, kwargs = self._queue.popleft()
+                self._condition.notify_all()
+            try:
+                func(**kwargs)
+            except Exception as e:
+                self._log.exception("Exception during %s()"
+                                    " method of recognition observer %s: %s"
+                                    % (cb_name, observer, e))
+
+    def flush(self, timeout=None):
+        """
+        Wait until all queued events have been delivered.
+
+        :param timeout: maximum number of seconds to wait, or *None* to
+            wait indefinitely
+        :returns: whether all events were delivered
+        :rtype: bool
+        """
+        with self._condition:
+            if timeout is None:
+                while self._active:
+                    self._condition.wait()
+            else:
+                # Condition.wait() returns None in Python 2, so keep track
+                # of the deadline here.
+                deadline = time.time() + timeout
+                while self._active:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+            return not self._active
+
+
+class ThreadedObserverDelivery(ObserverDeliveryBase):
+    """
+    Observer event delivery on a daemon worker thread.
+
+    The thread is started when the first event is queued.  Observers
+    registered with the same instance share its queue and thread.
+    """
+
+    def __init__(self, maxsize=100, overflow="drop_oldest"):
+        ObserverDeliveryBase.__init__(self, maxsize, overflow)
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def _schedule(self):
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="RecObsDeliveryThread"
+                )
+                self._thread.daemon = True
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queue:
+                    self._condition.wait()
+            self._deliver_pending()
+
+
+class AsyncioObserverDelivery(ObserverDeliveryBase):
+    """
+    Observer event delivery on an asyncio event loop.
+
+    Events are delivered in callbacks scheduled on *loop* using
+    ``loop.call_soon_threadsafe()``, so the engine may run in another
+    thread.  The ``"block"`` overflow policy should only be used if it
+    does.
+    """
+
+    def __init__(self, loop, maxsize=100, overflow="drop_oldest"):
+        ObserverDeliveryBase.__init__(self, maxsize, overflow)
+        self._loop = loop
+
+    def _schedule(self):
+        self._loop.call_soon_threadsafe(self._deliver_pending)
 
-try:
-    from inspect import getfullargspec as getargspec
-except ImportError:
-    # Fallback on the deprecated function.
-    from inspect import getargspec
 
 #---------------------------------------------------------------------------
 
@@ -39,12 +197,24 @@ class RecObsManagerBase(object):
 
     _log = logging.getLogger("engine.recobs")
 
+    #: Names of the observer callback methods dispatched by this manager.
+    callback_names = ("on_begin", "on_recognition", "on_failure", "on_end",
+                      "on_post_recognition")
+
     def __init__(self, engine):
         self._engine = engine
         self._enabled = True
         self._observers = []
         self._observer_ids = set()
 
+        # Dispatch lists of (observer, callback, argument names) tuples for
+        # each callback name. Callbacks and the keyword arguments they
+        # accept are resolved once when observers are registered. Lists
+        # are replaced rather than modified so that observers may be
+        # registered or unregistered during notifications.
+        self._dispatch = dict((name, []) for name in self.callback_names)
+        self._default_delivery = None
+
     def enable(self):
         if not self._enabled:
             self._enabled = True
@@ -63,32 +233,60 @@ class RecObsManagerBase(object):
         self._observers.append(observer)
         self._observer_ids.add(id(observer))
 
+        # Resolve the observer's callbacks and add them to the dispatch
+        # lists.
+        delivery = self._get_delivery(observer)
+        for cb_name in self.callback_names:
+            func = getattr(observer, cb_name, None)
+            if not func:
+                continue
+            entry = (observer, func, _get_argument_names(func),
+                     delivery)
+            self._dispatch[cb_name] = self._dispatch[cb_name] + [entry]
+
+    def _get_delivery(self, observer):
+        # Return the delivery object to use for an asynchronous observer,
+        # or None for synchronous observers.
+        asynchronous = getattr(observer, "asynchronous", False)
+        if isinstance(asynchronous, ObserverDeliveryBase):
+            return asynchronous
+        elif not asynchronous:
+            return None
+        if self._default_delivery is None:
+            self._default_delivery = ThreadedObserverDelivery()
+        return self._default_delivery
+
     def unregister(self, observer):
-        try:
-            self._observers.remove(observer)
-            self._observer_ids.remove(id(observer))
-        except ValueError:
-            pass
-        else:
-            if not self._observers:
-                self._deactivate()
+        if id(observer) not in self._observer_ids:
+            return
+
+        # Compare observers by identity; some observers are lists.
+        self._observers = [o for o in self._observers if o is not observer]
+        self._observer_ids.remove(id(observer))
+        for cb_name, entries in self._dispatch.items():
+            self._dispatch[cb_name] = [entry for entry in entries
+                                       if entry[0] is not observer]
+        if not self._observers:
+            self._deactivate()
 
     def _process_observer_callbacks(self, cb_name, required_names,
                                     **kwargs):
-        for observer in self._observers:
-            func = getattr(observer, cb_name, None)
-            if not func:
-                continue
+        with timed_phase("observers", cb_name):
+            self._call_observers(cb_name, required_names, kwargs)
 
+    def _call_observers(self, cb_name, required_names, kwargs):
+        for observer, func, arg_names, delivery in self._dispatch[cb_name]:
             # If the callback function takes keyword arguments, only send
             # those that it accepts. Always pass required names.
             func_kwargs = kwargs
-            if func_kwargs:
-                argspec = getargspec(func)
-                arg_names, kwargs_names = argspec[0], argspec[2]
-                if not kwargs_names:
-                    func_kwargs = {k: v for (k, v) in func_kwargs.items()
-                                   if k in arg_names or k in required_names}
+            if func_kwargs and arg_names is not None:
+                func_kwargs = {k: v for (k, v) in func_kwargs.items()
+                               if k in arg_names or k in required_names}
+
+            # Queue the callback for asynchronous observers.
+            if delivery is not None:
+                delivery.put(observer, cb_name, func, func_kwargs)
+                continue
 
             # Call the callback function, catching and logging exceptions.
             try:
@@ -99,9 +297,11 @@ class RecObsManagerBase(object):
                                     % (cb_name, observer, e))
 
     def notify_begin(self):
+        begin_record()
         self._process_observer_callbacks("on_begin", [])
 
     def notify_recognition(self, words, rule, node, results):
+        set_record_result(words, rule)
         self._process_observer_callbacks("on_recognition", ["words"],
                                          words=words, rule=rule, node=node,
                                          results=results)
@@ -110,6 +310,7 @@ class RecObsManagerBase(object):
     def notify_failure(self, results):
         self._process_observer_callbacks("on_failure", [], results=results)
         self.notify_end(results)
+        finish_record(False)
 
     def notify_end(self, results):
         self._process_observer_callbacks("on_end", [], results=results)
@@ -118,6 +319,7 @@ class RecObsManagerBase(object):
         self._process_observer_callbacks("on_post_recognition", ["words"],
                                          words=words, rule=rule, node=node,
                                          results=results)
+        finish_record(True)
 
     def _activate(self):
         raise NotImplementedError(str(self))
@@ -24,10 +24,18 @@ Multiplexing interface to a timer
 
 """
 
+import heapq
+import itertools
 import time
 import logging
 
-from threading import Thread, current_thread, RLock
+from threading import Thread, current_thread, Condition, RLock
+
+#---------------------------------------------------------------------------
+
+# Timers are scheduled using a monotonic clock where available so that they
+# are not affected by changes to the system time.
+_clock = getattr(time, "monotonic", time.time)
 
 #---------------------------------------------------------------------------
 
@@ -47,6 +55,9 @@ class Timer(object):
 
     Instances of this class are normally initialised from
     :meth:`engine.create_timer`.
+
+    The *next_time* attribute holds the time of the next call according
+    to a monotonic clock, or *None* if the timer is not active.
     """
 
     _log = logging.getLogger("engine.timer")
@@ -68,9 +79,9 @@ class Timer(object):
         """
         if self.active:
             return
-        self.manager.add_timer(self)
         self.active = True
-        self.next_time = time.time() + self.interval
+        self.next_time = _clock() + self.interval
+        self.manager.add_timer(self)
 
     def stop(self):
         """ Stop calling the timer's function on an interval. """
@@ -86,7 +97,7 @@ class Timer(object):
 
         This method is normally called by the timer manager.
         """
-        self.next_time = time.time() + self.interval
+        self.next_time = _clock() + self.interval
         try:
             self.function()
         except Exception as e:
@@ -96,7 +107,12 @@ class Timer(object):
 
 
 class TimerManagerBase(object):
-    """ Base timer manager class. """
+    """
+    Base timer manager class.
+
+    Active timers are kept in a min-heap ordered by their next call time,
+    so :meth:`main_callback` only looks at timers that are due.
+    """
 
     _log = logging.getLogger("engine.timer")
 
@@ -108,26 +124,60 @@ class TimerManagerBase(object):
         self._enabled = True
         self._active = False
 
+        # Heap of [next_time, sequence number, timer] entries. Entries are
+        # invalidated by replacing the timer's _heap_entry attribute and
+        # are discarded when they reach the top of the heap.
+        self._heap = []
+        self._counter = itertools.count()
+
     def add_timer(self, timer):
         """ Add a timer and activate the main callback if required. """
         with self._lock:
             self.timers.append(timer)
+            self._push(timer)
         if len(self.timers) == 1 and self._enabled:
             self._activate_main_callback(self.main_callback,
                                          self.interval)
             self._active = True
+        self._timers_changed()
 
     def remove_timer(self, timer):
         """ Remove a timer and deactivate the main callback if required. """
         try:
             with self._lock:
                 self.timers.remove(timer)
+                timer._heap_entry = None
         except Exception as e:
             self._log.exception("Failed to remove timer: %s" % e)
             return
         if len(self.timers) == 0 and self._enabled:
             self._deactivate_main_callback()
             self._active = False
+        self._timers_changed()
+
+    def _push(self, timer):
+        entry = [timer.next_time, next(self._counter), timer]
+        timer._heap_entry = entry
+        heapq.heappush(self._heap, entry)
+
+    def _is_valid(self, entry):
+        return getattr(entry[2], "_heap_entry", None) is entry
+
+    def next_deadline(self):
+        """
+        Get the time at which the next timer is due according to the
+        monotonic clock used for timers, or *None* if there are no timers.
+        """
+        with self._lock:
+            heap = self._heap
+            while heap and not self._is_valid(heap[0]):
+                heapq.heappop(heap)
+            return heap[0][0] if heap else None
+
+    def _timers_changed(self):
+        """
+        Virtual method called after timers are added or removed.
+        """
 
     def enable(self):
         """
@@ -156,14 +206,32 @@ class TimerManagerBase(object):
             self._deactivate_main_callback()
             self._active = False
 
-        now = time.time()
-        for c in tuple(self.timers):
-            if c.next_time < now:
-                try:
-                    c.call()
-                except Exception as e:
-                    self._log.exception("Exception occurred during"
-                                        " timer callback: %s" % (e,))
+        # Take due timers off the heap. Timer functions are called without
+        # holding the lock.
+        now = _clock()
+        due = []
+        with self._lock:
+            heap = self._heap
+            while heap and heap[0][0] <= now:
+                entry = heapq.heappop(heap)
+                if self._is_valid(entry):
+                    entry[2]._heap_entry = None
+                    due.append(entry[2])
+
+        for c in due:
+            try:
+                c.call()
+            except Exception as e:
+                self._log.exception("Exception occurred during"
+                                    " timer callback: %s" % (e,))
+
+            # Reschedule the timer if it is still active and was not
+            # restarted during the call.
+            with self._lock:
+                if (c.active and c.next_time is not None and
+                        getattr(c, "_heap_entry", None) is None and
+                        c in self.timers):
+                    self._push(c)
 
     def _activate_main_callback(self, callback, msec):
         """
@@ -189,6 +257,10 @@ class ThreadedTimerManager(TimerManagerBase):
     This class is used by the "text" engine. It is only suitable for engine
     backends with no recognition loop to execute timer functions on.
 
+    The thread sleeps until the earliest timer is due instead of waking up
+    every *interval* seconds. It is woken early when timers are added or
+    removed.
+
     .. warning::
 
        The timer interface is **not** thread-safe. Use the :meth:`enable`
@@ -200,6 +272,25 @@ class ThreadedTimerManager(TimerManagerBase):
         TimerManagerBase.__init__(self, interval, engine)
         self._running = False
         self._thread = None
+        self._condition = Condition(self._lock)
+
+    def _timers_changed(self):
+        with self._condition:
+            self._condition.notify_all()
+
+    def _wait_for_deadline(self):
+        # Wait until the next timer is due, a timer is added or removed or
+        # the thread is stopped.
+        with self._condition:
+            if not self._running:
+                return
+            deadline = self.next_deadline()
+            if deadline is None:
+                self._condition.wait()
+            else:
+                timeout = deadline - _clock()
+                if timeout > 0:
+                    self._condition.wait(timeout)
 
     def _activate_main_callback(self, callback, sec):
         """"""
@@ -209,12 +300,13 @@ class ThreadedTimerManager(TimerManagerBase):
 
         def run():
             while self._running:
-                time.sleep(sec)
-                callback()
+                self._wait_for_deadline()
+                if self._running:
+                    callback()
 
         self._running = True
         self._thread = Thread(target=run)
-        self._thread.setDaemon(True)
+        self._thread.daemon = True
         self._thread.start()
 
     def _deactivate_main_callback(self):
@@ -223,7 +315,9 @@ class ThreadedTimerManager(TimerManagerBase):
         # after 5 seconds.
         should_join = (self._thread and self._thread.is_alive() and
                        self._thread is not current_thread())
-        self._running = False
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
         if should_join:
             timeout = 5
             self._thread.join(timeout=timeout)
@@ -232,6 +326,72 @@ class ThreadedTimerManager(TimerManagerBase):
                                    "after %d seconds" % timeout)
 
 
+class AsyncioTimerManager(TimerManagerBase):
+    """
+    Timer manager class calling timer functions on an asyncio event loop.
+
+    The manager's main callback is scheduled for the earliest timer
+    deadline using ``loop.call_at()``, so no extra thread is needed.
+    Timers may be added or removed from other threads.
+
+    Use :meth:`EngineBase.set_timer_manager` to make an engine use this
+    class, e.g.::
+
+        engine.set_timer_manager(AsyncioTimerManager(0.02, engine, loop))
+
+    Constructor arguments:
+
+     - *interval* (*float*) -- unused, for compatibility with other timer
+       manager classes.
+     - *engine* -- engine instance.
+     - *loop* -- asyncio event loop to use (default: the current event
+       loop).
+    """
+
+    def __init__(self, interval, engine, loop=None):
+        TimerManagerBase.__init__(self, interval, engine)
+        if loop is None:
+            import asyncio
+            loop = asyncio.get_event_loop()
+        self.loop = loop
+        self._handle = None
+
+    def _reschedule(self):
+        # Schedule the main callback for the earliest deadline. This is
+        # always called on the event loop.
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if not self._active:
+            return
+        deadline = self.next_deadline()
+        if deadline is None:
+            return
+
+        # Convert the deadline to the event loop's clock.
+        when = self.loop.time() + max(0, deadline - _clock())
+        self._handle = self.loop.call_at(when, self._run_main_callback)
+
+    def _run_main_callback(self):
+        self._handle = None
+        self.main_callback()
+        self._reschedule()
+
+    def _timers_changed(self):
+        self.loop.call_soon_threadsafe(self._reschedule)
+
+    def _activate_main_callback(self, callback, sec):
+        """"""
+        # The main callback is scheduled by _timers_changed(), which is
+        # called after this method.
+
+    def _deactivate_main_callback(self):
+        """"""
+        # _reschedule() cancels any scheduled call if the manager is not
+        # active.
+        self.loop.call_soon_threadsafe(self._reschedule)
+
+
 class DelegateTimerManagerInterface(object):
     """
     DelegateTimerManager interface.
@@ -0,0 +1,379 @@
+#
+# This file is part of Dragonfly.
+# (c) Copyright 2007, 2008 by Christo Butcher
+# Licensed under the LGPL.
+#
+#   Dragonfly is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU Lesser General Public License as published
+#   by the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   Dragonfly is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public
+#   License along with Dragonfly.  If not, see
+#   <http://www.gnu.org/licenses/>.
+#
+
+"""
+Recognition timing instrumentation
+============================================================================
+
+This module provides optional instrumentation for measuring how long each
+phase of a recognition takes.  It is disabled by default and has
+negligible overhead until a timing sink is added using
+:func:`add_timing_sink`.
+
+While enabled, each recognition produces a :class:`TimingRecord`.  A
+record is started when speech start is reported to recognition observers
+and finished after post-recognition observers have been notified, or
+after a recognition failure.  Finished records are written to each
+registered sink.
+
+The following phases are timed:
+
+ * ``process_begin`` -- grammar context evaluation in
+   ``Grammar.process_begin()``; the detail is the grammar name.
+ * ``process_words`` -- one attempt to decode recognized words against a
+   grammar rule; the detail is ``"<grammar>.<rule>"``.
+ * ``build_parse_tree`` -- building the parse tree of a decoded rule.
+ * ``observers`` -- notifying recognition observers; the detail is the
+   callback name, e.g. ``"on_recognition"``.
+ * ``action`` -- execution of an action; the detail is the action's class
+   name.  Actions executed by other actions are timed separately.
+ * ``kaldi_decode`` and ``kaldi_get_output`` -- the Kaldi decoder's
+   ``decode()`` and ``get_output()`` calls.
+
+Phases may be nested, e.g. ``action`` phases happen within the
+``process_words`` phase of the rule that was recognized.  Each phase
+includes its start offset from the beginning of the record so that
+nesting can be reconstructed.
+
+The current record is kept per thread, so recognitions on separate engine
+instances running on different threads produce separate records.
+
+Example usage::
+
+    from dragonfly.engines.base.timing import (add_timing_sink,
+                                               RingTimingSink)
+    sink = RingTimingSink(maxlen=50)
+    add_timing_sink(sink)
+    # ... speak some commands ...
+    for record in sink.records:
+        print(record.total, record.phase_totals())
+
+"""
+
+import io
+import json
+import logging
+import threading
+from collections import deque, OrderedDict
+from timeit import default_timer
+
+from six import string_types, text_type
+
+
+#---------------------------------------------------------------------------
+# Timing records.
+
+class TimingRecord(object):
+    """
+        Timing information for a single recognition.
+
+        Phases are stored in the :attr:`phases` list as
+        ``(name, detail, offset, duration)`` tuples with times in seconds.
+    """
+
+    __slots__ = ("start", "end", "phases", "words", "grammar", "rule",
+                 "success", "_open_phases", "_pending")
+
+    def __init__(self, start):
+        self.start = start
+        self.end = None
+        self.phases = []
+        self.words = None
+        self.grammar = None
+        self.rule = None
+        self.success = False
+        self._open_phases = 0
+        self._pending = False
+
+    @property
+    def total(self):
+        """ Duration of the whole recognition in seconds. """
+        if self.end is None:
+            return None
+        return self.end - self.start
+
+    def phase_totals(self):
+        """
+            Return an ordered dictionary of total durations per phase
+            name.
+        """
+        totals = OrderedDict()
+        for name, _, _, duration in self.phases:
+            totals[name] = totals.get(name, 0.0) + duration
+        return totals
+
+    def to_dict(self):
+        """ Return a JSON-serializable dictionary of this record. """
+        return {
+            "words": list(self.words) if self.words else None,
+            "grammar": self.grammar,
+            "rule": self.rule,
+            "success": self.success,
+            "total": self.total,
+            "phases": [
+                {"name": name, "detail": detail, "offset": offset,
+                 "duration": duration}
+                for name, detail, offset, duration in self.phases
+            ],
+        }
+
+    def __repr__(self):
+        total = self.total
+        return "%s(%r, total=%s, phases=%d)" % (
+            self.__class__.__name__, self.words,
+            "%.6f" % total if total is not None else None, len(self.phases)
+        )
+
+
+#---------------------------------------------------------------------------
+# Timing sinks.
+
+class TimingSinkBase(object):
+    """ Base class for timing record sinks. """
+
+    def write(self, record):
+        """ Write a finished :class:`TimingRecord`. """
+        raise NotImplementedError()
+
+    def close(self):
+        """ Release any resources held by the sink. """
+
+
+class RingTimingSink(TimingSinkBase):
+    """
+        Sink keeping the *maxlen* most recent records in memory.  Records
+        are available through the :attr:`records` attribute.
+    """
+
+    def __init__(self, maxlen=100):
+        self.records = deque(maxlen=maxlen)
+
+    def write(self, record):
+        self.records.append(record)
+
+
+class LoggingTimingSink(TimingSinkBase):
+    """
+        Sink logging a one-line summary of each record at the given
+        *level* using the logger named *logger_name*.
+    """
+
+    def __init__(self, logger_name="engine.timing", level=logging.DEBUG):
+        self._log = logging.getLogger(logger_name)
+        self._level = level
+
+    def write(self, record):
+        if not self._log.isEnabledFor(self._level):
+            return
+        phases = ", ".join("%s=%.2fms" % (name, duration * 1000)
+                           for name, duration
+                           in record.phase_totals().items())
+        self._log.log(self._level, "Recognition %r (%s.%s) took %.2fms: %s",
+                      u" ".join(record.words or ()), record.grammar,
+                      record.rule, (record.total or 0.0) * 1000, phases)
+
+
+class JsonTimingSink(TimingSinkBase):
+    """
+        Sink appending each record to the file at *path* as a single line
+        of JSON.
+    """
+
+    def __init__(self, path):
+        self._file = io.open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        line = text_type(json.dumps(record.to_dict(), ensure_ascii=False))
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line + u"\n")
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+#---------------------------------------------------------------------------
+# Instrumentation state.
+
+_log = logging.getLogger("engine.timing")
+_sinks = []
+
+# The current record is kept per thread so that recognitions on separate
+# engine instances running concurrently are timed separately.
+_state = threading.local()
+
+
+def _get_current_record():
+    return getattr(_state, "record", None)
+
+
+def add_timing_sink(sink):
+    """ Add a timing sink, enabling instrumentation if necessary. """
+    if sink not in _sinks:
+        _sinks.append(sink)
+
+
+def remove_timing_sink(sink):
+    """
+        Remove a timing sink.  Instrumentation is disabled when no sinks
+        remain.  The sink is not closed.
+    """
+    try:
+        _sinks.remove(sink)
+    except ValueError:
+        pass
+    if not _sinks:
+        _state.record = None
+
+
+def timing_enabled():
+    """ Whether any timing sinks have been added. """
+    return bool(_sinks)
+
+
+def begin_record():
+    """
+        Start a new timing record for a recognition.  Any unfinished
+        record is finished first.
+    """
+    if not _sinks:
+        return
+    if _get_current_record() is not None:
+        finish_record(False)
+    _state.record = TimingRecord(default_timer())
+
+
+def set_record_result(words, rule):
+    """ Set the recognized words and rule of the current record. """
+    record = _get_current_record()
+    if record is None:
+        return
+    record.words = tuple(words) if words else None
+    if rule is not None:
+        record.rule = rule.name
+        grammar = getattr(rule, "grammar", None)
+        record.grammar = grammar.name if grammar is not None else None
+    record.success = True
+
+
+def finish_record(success=None):
+    """
+        Finish the current timing record and write it to each sink.
+
+        If phases enclosing the end of the recognition are still open,
+        e.g. the ``process_words`` phase of the recognized rule, the
+        record is written when the last of them ends.
+    """
+    record = _get_current_record()
+    if record is None:
+        return
+    _state.record = None
+    if success is not None:
+        record.success = success
+    if record._open_phases:
+        record._pending = True
+    else:
+        _write_record(record)
+
+
+def _write_record(record):
+    record.end = default_timer()
+    for sink in list(_sinks):
+        try:
+            sink.write(record)
+        except Exception as e:
+            _log.exception("Timing sink %r failed to write record: %s",
+                           sink, e)
+
+
+def _format_detail(detail):
+    # Phase details are formatted only when instrumentation is enabled so
+    # that call sites can pass objects without formatting overhead.
+    if detail is None or isinstance(detail, string_types):
+        return detail
+    elif isinstance(detail, type):
+        return detail.__name__
+    name = getattr(detail, "name", None)
+    grammar = getattr(detail, "grammar", None)
+    if name and grammar is not None:
+        return u"%s.%s" % (grammar.name, name)
+    elif name:
+        return name
+    return type(detail).__name__
+
+
+class _NullPhase(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+class _Phase(object):
+    __slots__ = ("name", "detail", "record", "start")
+
+    def __init__(self, name, detail, record):
+        self.name = name
+        self.detail = detail
+        self.record = record
+        self.start = None
+
+    def __enter__(self):
+        self.record._open_phases += 1
+        self.start = default_timer()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = default_timer()
+        record = self.record
+        record.phases.append((self.name, _format_detail(self.detail),
+                              self.start - record.start, end - self.start))
+        record._open_phases -= 1
+        if record._pending and not record._open_phases:
+            record._pending = False
+            _write_record(record)
+
+
+_null_phase = _NullPhase()
+
+
+def timed_phase(name, detail=None):
+    """
+        Return a context manager timing the named phase of the current
+        recognition.  This does nothing if instrumentation is disabled or
+        if no recognition is in progress.
+
+        *detail* may be a string, a grammar, a rule or a class; objects
+        are converted to names when the phase ends.
+    """
+    if not _sinks:
+        return _null_phase
+    record = _get_current_record()
+    if record is None:
+        return _null_phase
+    return _Phase(name, detail, record)
@@ -0,0 +1,50 @@
+"""
+Benchmark script for measuring how many Mouse action steps can be executed
+per second with the current platform's mouse implementation.
+
+The cursor is moved around its current position and the left mouse
+button is held down and released during the "drag" benchmark, so run this
+with the cursor over an empty area of the desktop.
+
+"""
+
+from __future__ import print_function
+
+import argparse
+import time
+
+from dragonfly import Mouse
+
+
+SPECS = {
+    "move": "<10, 0>, <0, 10>, <-10, 0>, <0, -10>",
+    "drag": "left:down, <10, 0>, <0, 10>, <-10, 0>, <0, -10>, left:up",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark Mouse action steps per second.")
+    parser.add_argument("benchmark", choices=sorted(SPECS.keys()),
+                        nargs="?", default="move",
+                        help="The benchmark to run.")
+    parser.add_argument("-n", "--iterations", type=int, default=200,
+                        help="Number of times to execute the action.")
+    args = parser.parse_args()
+
+    # Parse the spec once so that only event execution is measured.
+    spec = SPECS[args.benchmark]
+    action = Mouse(spec, static=True)
+    steps = len(spec.split(", ")) * args.iterations
+
+    start = time.time()
+    for _ in range(args.iterations):
+        action.execute()
+    elapsed = time.time() - start
+
+    print("%s: %d steps in %.3f seconds (%.1f steps/second)"
+          % (args.benchmark, steps, elapsed, steps / elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark script for measuring the cost of notifying recognition
+observers.
+
+A number of observers with different callback signatures are registered
+with a recognition observer manager. The notifications sent for one
+successful recognition (begin, recognition, end and post-recognition)
+are then repeated and the average cost per utterance is reported.
+
+"""
+
+from __future__ import print_function
+
+import argparse
+import time
+
+from dragonfly.engines.base import RecObsManagerBase
+
+
+class _Manager(RecObsManagerBase):
+    def _activate(self):
+        pass
+
+    def _deactivate(self):
+        pass
+
+
+class _WordsObserver(object):
+    def on_begin(self):
+        pass
+
+    def on_recognition(self, words):
+        pass
+
+    def on_post_recognition(self, words):
+        pass
+
+
+class _FullObserver(object):
+    def on_recognition(self, words, rule, node, results):
+        pass
+
+    def on_end(self, results):
+        pass
+
+
+class _KeywordsObserver(object):
+    def on_recognition(self, **kwargs):
+        pass
+
+    def on_failure(self, **kwargs):
+        pass
+
+
+OBSERVER_TYPES = (_WordsObserver, _FullObserver, _KeywordsObserver)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark recognition observer notifications.")
+    parser.add_argument("-o", "--observers", type=int, default=20,
+                        help="Number of observers to register.")
+    parser.add_argument("-n", "--iterations", type=int, default=10000,
+                        help="Number of utterances to notify observers of.")
+    args = parser.parse_args()
+
+    manager = _Manager(None)
+    for i in range(args.observers):
+        manager.register(OBSERVER_TYPES[i % len(OBSERVER_TYPES)]())
+
+    words = ("hello", "world")
+    start = time.time()
+    for _ in range(args.iterations):
+        manager.notify_begin()
+        manager.notify_recognition(words, None, None, None)
+        manager.notify_post_recognition(words, None, None, None)
+    elapsed = time.time() - start
+
+    print("%d observers: %d utterances in %.3f seconds (%.1f us/utterance)"
+          % (args.observers, args.iterations, elapsed,
+             elapsed / args.iterations * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Benchmark script for measuring the throughput of the Kaldi engine's voice
+activity detection (VAD) collector.
+
+A wave file (16kHz, 16-bit, mono) is segmented into phrases using
+``WavAudio.read_file_with_vad()`` a number of times and the number of
+audio blocks processed per second is reported.  Larger window sizes
+increase the amount of work done per block by window-based collectors.
+
+This requires the Kaldi engine's dependencies to be installed.
+
+"""
+
+from __future__ import print_function
+
+import argparse
+import time
+
+from dragonfly.engines.backend_kaldi.audio import WavAudio
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the Kaldi engine's VAD collector.")
+    parser.add_argument("file", help="Wave file to segment.")
+    parser.add_argument("-n", "--iterations", type=int, default=10,
+                        help="Number of times to segment the file.")
+    parser.add_argument("--start-window-ms", type=int, default=150,
+                        help="Window used to detect the start of phrases.")
+    parser.add_argument("--end-window-ms", type=int, default=150,
+                        help="Window used to detect the end of phrases.")
+    parser.add_argument("--complex-end-window-ms", type=int, default=None,
+                        help="Window used to detect the end of complex "
+                             "phrases.")
+    args = parser.parse_args()
+
+    blocks = phrases = 0
+    start = time.time()
+    for _ in range(args.iterations):
+        audio_iter = WavAudio.read_file_with_vad(
+            args.file, start_window_ms=args.start_window_ms,
+            end_window_ms=args.end_window_ms,
+            complex_end_window_ms=args.complex_end_window_ms)
+        for block in audio_iter:
+            if block is None:
+                phrases += 1
+            elif block is not False:
+                blocks += 1
+    elapsed = time.time() - start
+
+    # Blocks between phrases are not yielded by the collector, so count
+    # the blocks read from the file instead.
+    total_blocks = sum(1 for block in WavAudio.read_file(args.file)
+                       if block is not None) * args.iterations
+    print("%d blocks (%d in %d phrases) in %.3f seconds "
+          "(%.0f blocks/second)"
+          % (total_blocks, blocks, phrases, elapsed,
+             total_blocks / elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -28,6 +28,7 @@ import logging
 from six import string_types
 
 from ..engines         import get_engine
+from ..engines.base.timing import timed_phase
 from .rule_base        import Rule
 from .list             import ListBase
 from .context          import Context
@@ -85,6 +86,7 @@ class Grammar(object):
         self._loaded = False
         self._enabled = True
         self._in_context = False
+        self._begin_window = None
 
     def __del__(self):
         try:
@@ -139,6 +141,7 @@ class Grammar(object):
 
         """
         self._enabled = True
+        self._engine.bump_decode_generation()
 
     def disable(self):
         """
@@ -147,6 +150,7 @@ class Grammar(object):
 
         """
         self._enabled = False
+        self._engine.bump_decode_generation()
 
     enabled = property(lambda self: self._enabled,
                        doc="Whether a grammar is active to receive "
@@ -155,6 +159,7 @@ class Grammar(object):
     def set_exclusiveness(self, exclusive):
         """ Set the exclusiveness of this grammar. """
         self._engine.set_exclusiveness(self, exclusive)
+        self._engine.bump_decode_generation()
 
     def set_exclusive(self, exclusive):
         """ Alias of :meth:`set_exclusiveness`. """
@@ -373,6 +378,7 @@ class Grammar(object):
 
         # Activate the given rule.
         self._engine.activate_rule(rule, self)
+        self._engine.bump_decode_generation()
 
     def deactivate_rule(self, rule):
         """
@@ -398,6 +404,7 @@ class Grammar(object):
 
         # Deactivate the given rule.
         self._engine.deactivate_rule(rule, self)
+        self._engine.bump_decode_generation()
 
     def update_list(self, lst):
         """
@@ -422,6 +429,7 @@ class Grammar(object):
                                "strings." % lst.name)
 
         self._engine.update_list(lst, self)
+        self._engine.bump_decode_generation()
 
     # ----------------------------------------------------------------------
     # Methods for registering a grammar object instance in natlink.
@@ -438,6 +446,7 @@ class Grammar(object):
 
         self.add_all_dependencies()
         self._engine.load_grammar(self)
+        self._engine.bump_decode_generation()
         self._loaded = True
         self._in_context = False
 
@@ -463,6 +472,7 @@ class Grammar(object):
         self._log_load.debug("Grammar %s: unloading.", self._name)
 
         self._engine.unload_grammar(self)
+        self._engine.bump_decode_generation()
         self._loaded = False
         self._in_context = False
 
@@ -524,36 +534,41 @@ class Grammar(object):
         """
         # pylint: disable=expression-not-assigned
 
-        self._log_begin.debug("Grammar %s: detected beginning of "
-                              "utterance.", self._name)
-        self._log_begin.debug("Grammar %s: executable '%s', title '%s'.",
-                              self._name, executable, title)
-
-        if not self._enabled:
-            # Grammar is disabled, so deactivate all active rules.
-            [r.deactivate() for r in self._rules if r.active]
-
-        elif not self._context \
-                or self._context.matches(executable, title, handle):
-            # Grammar is within context.
-            if not self._in_context:
-                self._in_context = True
-                self.enter_context()
-            self._process_begin(executable, title, handle)
-            for r in self._rules:
-                if r.exported and hasattr(r, "process_begin"):
-                    r.process_begin(executable, title, handle)
-
-        else:
-            # Grammar's context doesn't match, deactivate active rules.
-            if self._in_context:
-                self._in_context = False
-                self.exit_context()
-            [r.deactivate() for r in self._rules if r.active]
-
-        self._log_begin.debug("Grammar %s:     active rules: %s.",
-                              self._name,
-                              [r.name for r in self._rules if r.active])
+        with timed_phase("process_begin", self):
+            self._log_begin.debug("Grammar %s: detected beginning of "
+                                  "utterance.", self._name)
+            self._log_begin.debug("Grammar %s: executable '%s', title '%s'.",
+                                  self._name, executable, title)
+
+            # Remember the window used for context matching, so that
+            # recognition observers can record it.
+            self._begin_window = (executable, title, handle)
+
+            if not self._enabled:
+                # Grammar is disabled, so deactivate all active rules.
+                [r.deactivate() for r in self._rules if r.active]
+
+            elif not self._context \
+                    or self._context.matches(executable, title, handle):
+                # Grammar is within context.
+                if not self._in_context:
+                    self._in_context = True
+                    self.enter_context()
+                self._process_begin(executable, title, handle)
+                for r in self._rules:
+                    if r.exported and hasattr(r, "process_begin"):
+                        r.process_begin(executable, title, handle)
+
+            else:
+                # Grammar's context doesn't match, deactivate active rules.
+                if self._in_context:
+                    self._in_context = False
+                    self.exit_context()
+                [r.deactivate() for r in self._rules if r.active]
+
+            self._log_begin.debug("Grammar %s:     active rules: %s.",
+                                  self._name,
+                                  [r.name for r in self._rules if r.active])
 
     def enter_context(self):
         """
@@ -40,6 +40,8 @@
 #""" % {"class": "list", "function": name})
 #   return "".join(output)
 #print construct_skeleton()
+from collections import OrderedDict
+
 from six import string_types
 
 #===========================================================================
@@ -285,3 +287,117 @@ class DictList(ListBase, dict):
     def update(self, *args, **kwargs):
         result = dict.update(self, *args, **kwargs)
         self._update(); return result
+
+#===========================================================================
+# Insertion-ordered set type.
+
+class SetList(ListBase):
+    """
+        Insertion-ordered set of strings that supports automatic engine
+        notification of changes.
+
+        Checking, adding and removing items takes constant time, which
+        makes this class suitable for large lists that are changed
+        incrementally. The bulk methods :meth:`update` and
+        :meth:`difference_update` notify the engine once, and modifying
+        methods only notify the engine if items were actually added or
+        removed.
+
+        Use :class:`~dragonfly.grammar.elements_basic.ListRef` elements
+        in a grammar rule to allow matching speech to set items.
+    """
+
+    def __init__(self, name, items=()):
+        ListBase.__init__(self, name)
+        self._items = OrderedDict()
+        self._add_items(self._check_items(items))
+
+    def __repr__(self):
+        return "%s(%r, %r)" % (self.__class__.__name__, self._name,
+                               list(self._items))
+
+    #-----------------------------------------------------------------------
+    # Accessor for the grammar to retrieve the list items.
+
+    def get_list_items(self):
+        return list(self._items)
+
+    #-----------------------------------------------------------------------
+    # Container methods.
+
+    def __contains__(self, item):
+        return item in self._items
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    #-----------------------------------------------------------------------
+    # Modifying methods.
+
+    def _validate_items(self):
+        # Items are validated before they are added instead.
+        pass
+
+    def _check_items(self, items):
+        items = list(items)
+        valid_types = self.valid_types
+        invalid = [i for i in items if not isinstance(i, valid_types)]
+        if invalid:
+            raise TypeError("Dragonfly lists can only contain"
+                            " string objects; received: %r" % invalid)
+        return items
+
+    def _add_items(self, items):
+        count = len(self._items)
+        for item in items:
+            self._items.setdefault(item)
+        return len(self._items) != count
+
+    def _remove_items(self, items):
+        count = len(self._items)
+        for item in items:
+            self._items.pop(item, None)
+        return len(self._items) != count
+
+    def add(self, item):
+        """ Add *item*, if not already present. """
+        if self._add_items(self._check_items([item])):
+            self._update()
+
+    def update(self, items):
+        """ Add each of *items* not already present, in order. """
+        if self._add_items(self._check_items(items)):
+            self._update()
+
+    def discard(self, item):
+        """ Remove *item*, if present. """
+        if self._remove_items([item]):
+            self._update()
+
+    def remove(self, item):
+        """ Remove *item*, raising *KeyError* if it is not present. """
+        if item not in self._items:
+            raise KeyError(item)
+        self.discard(item)
+
+    def difference_update(self, items):
+        """ Remove each of *items* that is present. """
+        if self._remove_items(items):
+            self._update()
+
+    def clear(self):
+        """ Remove all items. """
+        if self._items:
+            self._items.clear()
+            self._update()
+
+    def set(self, other):
+        """ Set the contents of this set to the items of *other*. """
+        items = list(OrderedDict.fromkeys(self._check_items(other)))
+        if items != list(self._items):
+            self._items.clear()
+            self._add_items(items)
+            self._update()
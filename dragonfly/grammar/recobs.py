@@ -24,10 +24,14 @@ Recognition observer classes
 
 """
 
+import datetime
+import io
+import json
+import os
 import time
 import logging
 
-from six import integer_types
+from six import integer_types, text_type
 
 from ..actions.actions  import Playback
 from ..engines          import get_engine
@@ -44,6 +48,15 @@ class RecognitionObserver(object):
 
     _log = logging.getLogger("grammar")
 
+    #: Whether events are delivered to this observer asynchronously.  If
+    #: *True*, the engine only queues each event and a shared worker
+    #: thread calls the observer's methods in order.  An
+    #: :class:`~dragonfly.engines.base.recobs.ObserverDeliveryBase`
+    #: instance may be used instead to choose the queue size, overflow
+    #: policy or thread, e.g. an asyncio event loop.  This must be set
+    #: before the observer is registered.
+    asynchronous = False
+
     def __init__(self):
         pass
 
@@ -53,19 +66,31 @@ class RecognitionObserver(object):
         except Exception:
             pass
 
-    def register(self):
+    #: Engine the observer was last registered with.
+    _engine = None
+
+    def register(self, engine=None):
         """
         Register the observer for recognition state events.
+
+        :param engine: engine to register with (default: the current
+            engine)
+        :type engine: EngineBase
         """
-        engine = get_engine()
+        if engine is None:
+            engine = get_engine()
         engine.register_recognition_observer(self)
+        self._engine = engine
 
     def unregister(self):
         """
         Unregister the observer for recognition state events.
         """
-        engine = get_engine()
+        engine = self._engine
+        if engine is None:
+            engine = get_engine()
         engine.unregister_recognition_observer(self)
+        self._engine = None
 
     def on_begin(self):
         """
@@ -167,7 +192,10 @@ class RecognitionHistory(list, RecognitionObserver):
     def on_recognition(self, words):
         """"""
         self._complete = True
-        self.append(self._recognition_to_item(words))
+        self._append_item(self._recognition_to_item(words))
+
+    def _append_item(self, item):
+        self.append(item)
         if self._length:
             while len(self) > self._length:
                 self.pop(0)
@@ -217,3 +245,114 @@ class PlaybackHistory(RecognitionHistory):
 
     def __getslice__(self, i, j):
         return self.__getitem__(slice(i, j))
+
+
+#---------------------------------------------------------------------------
+
+class CorpusRecorder(RecognitionHistory):
+    """
+        Storage class for recording a corpus of recognized utterances.
+
+        Instances of this class monitor recognitions and store a
+        dictionary for each one.  If *path* is specified, each dictionary
+        is also appended to that file as a single line of JSON.  The
+        resulting corpus file can be replayed through an engine using the
+        ``python -m dragonfly bench`` command or the
+        :mod:`dragonfly.bench` module.
+
+        Each corpus entry has the following keys:
+
+         * ``words`` -- list of recognized words.
+         * ``executable`` -- executable of the window the recognized
+           grammar's context was matched against at speech start.
+         * ``title`` -- title of that window.
+         * ``grammar`` -- name of the recognized grammar, if known.
+         * ``rule`` -- name of the recognized rule, if known.
+         * ``wav`` -- *optional* path to a wave file with the utterance
+           audio.
+
+        If *wav_dir* is specified, the audio of each utterance is written
+        to a wave file in that directory if the current engine makes it
+        available.  Currently only the Kaldi engine does this.  Subclasses
+        may override :meth:`_save_wav` to support other sources of audio.
+
+        Arguments:
+         - *path* (*str*, default: *None*) --
+           corpus file to append entries to.
+         - *length* (*int*, default: *None*) --
+           maximum number of entries to keep in memory; *None* for no
+           limit.
+         - *wav_dir* (*str*, default: *None*) --
+           directory to save utterance wave files in.
+
+    """
+
+    def __init__(self, path=None, length=None, wav_dir=None):
+        RecognitionHistory.__init__(self, length)
+        self._path = path
+        self._wav_dir = wav_dir
+        self._file = None
+
+    def on_recognition(self, words, rule=None, results=None):
+        """"""
+        # The entry needs the rule and results, which the base class does
+        # not pass to _recognition_to_item().
+        self._complete = True
+        entry = self._recognition_to_entry(words, rule, results)
+        self._append_item(entry)
+        if self._path:
+            self._write_entry(entry)
+
+    def _recognition_to_entry(self, words, rule, results):
+        # Use the window the recognized grammar's context was matched
+        # against.  This is the real foreground window unless a window
+        # was specified explicitly, e.g. by a mimic.
+        grammar = rule.grammar if rule else None
+        window = getattr(grammar, "_begin_window", None)
+        executable, title = window[:2] if window else (u"", u"")
+        entry = {
+            "words": [text_type(word) for word in words],
+            "executable": text_type(executable or u""),
+            "title": text_type(title or u""),
+            "grammar": grammar.name if grammar else None,
+            "rule": rule.name if rule else None,
+        }
+        wav_path = self._save_wav(results)
+        if wav_path:
+            entry["wav"] = wav_path
+        return entry
+
+    def _save_wav(self, results):
+        """
+            Save the audio of the current utterance to a wave file in
+            the *wav_dir* directory and return its path.  Return *None*
+            if no audio is available.
+        """
+        if not self._wav_dir or results is None:
+            return None
+        engine = getattr(results, "engine", None)
+        audio_store = getattr(engine, "audio_store", None)
+        if not audio_store:
+            return None
+        data = audio_store.current_audio_view
+        if not data:
+            return None
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S_%f")
+        filename = os.path.join(self._wav_dir, "utterance_%s.wav" % timestamp)
+        audio_store.audio_obj.write_wav(filename, data)
+        return filename
+
+    def _write_entry(self, entry):
+        if self._file is None:
+            self._file = io.open(self._path, "a", encoding="utf-8")
+        line = json.dumps(entry, ensure_ascii=False)
+        self._file.write(text_type(line) + u"\n")
+        self._file.flush()
+
+    def close(self):
+        """
+            Close the corpus file, if it is open.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
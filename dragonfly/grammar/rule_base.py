@@ -70,6 +70,18 @@ class Rule(object):
     # Counter ID used for anonymous rules to give them a unique name.
     _next_anonymous_id = 0
 
+    #: Decoding priority of this rule.  If adaptive rule ordering is
+    #: enabled for the engine, rules with a higher priority are tried
+    #: before rules with a lower priority.  See
+    #: :class:`~dragonfly.engines.base.ordering.RuleOrdering`.
+    priority = 0
+
+    #: Whether this rule is declared unambiguous, i.e. no other rule
+    #: matches the utterances it matches.  If adaptive rule ordering is
+    #: enabled for the engine, unambiguous rules may be tried before other
+    #: rules according to how often they match.
+    unambiguous = False
+
     def __init__(self, name=None, element=None, context=None,
                  imported=False, exported=True):
         # The default argument for *element* is NOT acceptable; this
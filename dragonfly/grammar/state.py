@@ -31,6 +31,7 @@ from logging import getLogger, DEBUG
 
 from six import PY2, text_type, binary_type
 
+from ..engines.base.timing import timed_phase
 from ..error import GrammarError
 
 
@@ -198,21 +199,10 @@ class State(object):
     # Methods for evaluation.
 
     def build_parse_tree(self):
-
-        root = None
-        node = None
-        for frame in self._stack:
-            while node and node.depth >= frame.depth:
-                node = node.parent
-            parent = node
-            node = Node(parent, frame.actor, self._results,
-                        frame.begin, frame.end, frame.depth, self._engine)
-            if parent:
-                parent.children.append(node)
-            else:
-                root = node
-
-        return root
+        with timed_phase("build_parse_tree"):
+            frames = [(frame.actor, frame.begin, frame.end, frame.depth)
+                      for frame in self._stack]
+            return Node.from_frames(frames, self._results, self._engine)
 
 
 # ---------------------------------------------------------------------------
@@ -236,6 +226,39 @@ class Node(object):
     def __repr__(self):
         return "Node: %s, %s" % (self.actor, self.words())
 
+    @classmethod
+    def from_frames(cls, frames, results, engine):
+        """
+        Build a parse tree from ``(actor, begin, end, depth)`` tuples of
+        its nodes in depth-first order and return its root node.
+        """
+        root = None
+        node = None
+        for actor, begin, end, depth in frames:
+            while node and node.depth >= depth:
+                node = node.parent
+            parent = node
+            node = cls(parent, actor, results, begin, end, depth, engine)
+            if parent:
+                parent.children.append(node)
+            else:
+                root = node
+        return root
+
+    def frames(self):
+        """
+        Return ``(actor, begin, end, depth)`` tuples of this node and the
+        nodes below it in depth-first order.  The parse tree can be
+        rebuilt from these using :meth:`from_frames`.
+        """
+        result = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            result.append((node.actor, node.begin, node.end, node.depth))
+            stack.extend(reversed(node.children))
+        return tuple(result)
+
     def words(self):
         return [w[0] for w in self.results[self.begin:self.end]]
 
@@ -46,6 +46,12 @@ common_names = [
     "test_rpc",
     "test_timer",
     "test_window",
+    "test_kaldi_audio",
+    "test_kaldi_compiler",
+    "test_kaldi_paths",
+    "test_kaldi_transcribe",
+    "test_x11_clipboard",
+    "test_x11_mouse",
     "documentation/test_action_base_doctest.txt",
     "documentation/test_grammar_elements_basic_doctest.txt",
     "documentation/test_grammar_elements_compound_doctest.txt",
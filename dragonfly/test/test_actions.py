@@ -19,16 +19,29 @@
 #   <http://www.gnu.org/licenses/>.
 #
 
+import os
+import shutil
+import tempfile
+import time
 import unittest
+import wave
 
 from six import PY2
 
 from dragonfly.actions.action_base import Repeat
+from dragonfly.actions.action_cmd import (CommandPool, RunCommand,
+                                         _shell_workers,
+                                         _terminate_shell_workers)
 from dragonfly.actions.action_function import Function
 from dragonfly.actions.action_key import Key
 from dragonfly.actions.action_mimic import Mimic
 from dragonfly.actions.action_paste import Paste
+from dragonfly.actions import action_playsound
+from dragonfly.actions.action_playsound import _AudioThread, _SoundCache
+from dragonfly.actions import action_text
 from dragonfly.actions.action_text import Text
+from dragonfly.engines import get_engine
+from dragonfly.engines.backend_natlink.dictation_format import StateFlags
 
 
 #===========================================================================
@@ -107,6 +120,309 @@ class TestRepeat(unittest.TestCase):
         self.assertEqual(r4.factor({"n": 3}), 6)
 
 
+class TestTextAutoformatState(unittest.TestCase):
+
+    def test_format_with_state(self):
+        """ Test formatting text using cached autoformat state. """
+
+        state = StateFlags()
+        self.assertEqual(Text._format_with_state("abc", state), " abc")
+        state = StateFlags("no_space_before", "cap_next")
+        self.assertEqual(Text._format_with_state("abc Def", state),
+                         "Abc Def")
+        state = StateFlags("upper_mode")
+        self.assertEqual(Text._format_with_state("abc", state), " ABC")
+        state = StateFlags("cap_mode")
+        self.assertEqual(Text._format_with_state("abc def\tghi", state),
+                         " Abc Def\tGhi")
+        state = StateFlags("no_space_before", "upper_next")
+        self.assertEqual(Text._format_with_state("abc def", state),
+                         "ABC def")
+
+    def test_state_after_text(self):
+        """ Test updating autoformat state from typed text. """
+
+        state = Text._state_after_text(" Hello there.", StateFlags())
+        self.assertTrue(state.cap_next)
+        self.assertFalse(state.no_space_before)
+        self.assertTrue(state.prev_ended_in_period)
+
+        state = Text._state_after_text(" (", StateFlags("cap_mode"))
+        self.assertTrue(state.no_space_before)
+        self.assertFalse(state.cap_next)
+        self.assertTrue(state.cap_mode)
+
+        # Empty text shouldn't change the state.
+        self.assertIs(Text._state_after_text("", state), state)
+
+    def test_cached_state_invalidation(self):
+        """ Test that cached autoformat state is discarded when stale. """
+
+        Text.clear_autofmt_state()
+        Text._autofmt_focus_handle = 1
+        state = StateFlags("no_space_before")
+        Text._autofmt_states[1] = (state, 0)
+        self.assertIsNone(Text._get_autofmt_state(1))
+        self.assertNotIn(1, Text._autofmt_states)
+
+        Text._autofmt_states[1] = (state, time.time())
+        self.assertIs(Text._get_autofmt_state(1), state)
+
+        # State is discarded if the foreground window changed, even if the
+        # window had the focus before.
+        Text._autofmt_states[2] = (StateFlags("cap_next"), time.time())
+        self.assertIsNone(Text._get_autofmt_state(2))
+        self.assertNotIn(2, Text._autofmt_states)
+        self.assertIsNone(Text._get_autofmt_state(1))
+        Text.clear_autofmt_state()
+
+    def test_typed_text_state(self):
+        """ Test that cached autoformat state is updated from typed text. """
+
+        class FakeWindow(object):
+            handle = 1
+
+            @classmethod
+            def get_foreground(cls):
+                return cls
+
+        class FakeKeyboard(object):
+            def get_typeable(self, character, is_text=False):
+                return self
+
+            def events(self, pause):
+                return []
+
+            def send_keyboard_events(self, events):
+                pass
+
+        original_window = action_text.Window
+        action_text.Window = FakeWindow
+        try:
+            Text.clear_autofmt_state()
+            Text.set_autofmt_state(StateFlags("no_space_before",
+                                              "cap_next"))
+            action = Text("%(text)s")
+            action._keyboard = FakeKeyboard()
+            action.execute({"text": "hello there."})
+            state = Text._get_autofmt_state(1)
+            self.assertTrue(state.cap_next)
+            self.assertFalse(state.no_space_before)
+            action.execute({"text": " (x"})
+            self.assertFalse(Text._get_autofmt_state(1).cap_next)
+        finally:
+            action_text.Window = original_window
+            Text.clear_autofmt_state()
+
+
+class TestPlaySoundCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "test.wav")
+        self.write_wave_file(100)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_wave_file(self, frames):
+        wf = wave.open(self.path, "wb")
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(16000)
+        wf.writeframes(b"\0\0" * frames)
+        wf.close()
+
+    def test_cached_sound(self):
+        """ Test that decoded wave files are cached until modified. """
+
+        cache = _SoundCache(max_bytes=1024 * 1024)
+        sound = cache.get(self.path)
+        self.assertEqual(len(sound.frames), 200)
+        self.assertIs(cache.get(self.path), sound)
+
+        # Modifying the file should invalidate the cached sound.
+        self.write_wave_file(50)
+        mtime = time.time() + 10
+        os.utime(self.path, (mtime, mtime))
+        sound = cache.get(self.path)
+        self.assertEqual(len(sound.frames), 100)
+        self.assertEqual(len(cache._sounds), 1)
+
+    def test_cache_size_limit(self):
+        """ Test that the sound cache size is bounded. """
+
+        cache = _SoundCache(max_bytes=100)
+        sound = cache.get(self.path)
+        self.assertIsNot(cache.get(self.path), sound)
+        self.assertEqual(cache._size, 0)
+
+    @unittest.skipIf(os.name == "nt", "sounds are played using winsound")
+    def test_audio_thread_pyaudio(self):
+        """ Test that the audio thread reuses one PyAudio instance. """
+
+        instances = []
+        played = []
+
+        class FakeStream(object):
+            def write(self, data):
+                played.append(data)
+
+            def stop_stream(self):
+                pass
+
+            def close(self):
+                pass
+
+        class FakePyAudio(object):
+            def __init__(self):
+                self.terminated = False
+                instances.append(self)
+
+            def get_format_from_width(self, width):
+                return width
+
+            def open(self, **kwargs):
+                return FakeStream()
+
+            def terminate(self):
+                self.terminated = True
+
+        class FakePyAudioModule(object):
+            PyAudio = FakePyAudio
+
+        original_pyaudio = action_playsound.pyaudio
+        action_playsound.pyaudio = FakePyAudioModule
+        try:
+            thread = _AudioThread()
+            thread.start()
+            for _ in range(3):
+                thread.enqueue(self.path, 0, True)
+            for _ in range(500):
+                if len(played) == 3:
+                    break
+                time.sleep(0.01)
+        finally:
+            action_playsound.pyaudio = original_pyaudio
+        self.assertEqual(len(played), 3)
+        self.assertEqual(len(instances), 1)
+        self.assertFalse(instances[0].terminated)
+
+
+@unittest.skipUnless(os.name == "posix", "requires a POSIX shell")
+class TestRunCommand(unittest.TestCase):
+
+    def test_future_result(self):
+        """ Test RunCommand futures for synchronous commands. """
+
+        output = []
+        action = RunCommand("echo testing", synchronous=True,
+                            process_command=lambda p: output.append(
+                                p.stdout.read()))
+        self.assertTrue(action.execute())
+        self.assertEqual(action.future.result(), 0)
+        self.assertEqual(output, [b"testing\n"])
+
+    def test_persistent_shell(self):
+        """ Test running commands using a persistent shell. """
+
+        output = []
+        process = lambda p: output.append(p.stdout.read())
+        action = RunCommand(["printf", "%s", "a b"], synchronous=True,
+                            persistent_shell=True, process_command=process)
+        self.assertTrue(action.execute())
+        action = RunCommand("sh -c 'exit 3'", synchronous=True,
+                            persistent_shell=True, process_command=process)
+        self.assertFalse(action.execute())
+        self.assertEqual(action.future.result(), 3)
+
+        # Command strings are split like for other commands, so the shell
+        # doesn't interpret them.
+        action = RunCommand("printf '%s;' $HOME 'a  b' ';' | *",
+                            synchronous=True, persistent_shell=True,
+                            process_command=process)
+        self.assertTrue(action.execute())
+        self.assertEqual(output, [b"a b", b"", b"$HOME;a  b;;;|;*;"])
+
+    def test_persistent_shell_async(self):
+        """ Test that asynchronous commands don't block the caller. """
+
+        start = time.time()
+        action = RunCommand("sleep 1", persistent_shell=True,
+                            process_command=lambda p: None)
+        self.assertTrue(action.execute())
+        self.assertLess(time.time() - start, 0.5)
+        self.assertEqual(action.future.result(timeout=5), 0)
+
+    def test_persistent_shell_pool(self):
+        """ Test persistent shells in pool workers and their termination.
+        """
+
+        shells = []
+        existing_workers = list(_shell_workers)
+        pool = CommandPool(max_workers=1)
+        for _ in range(2):
+            action = RunCommand("true", pool=pool, persistent_shell=True,
+                                process_command=lambda p: None)
+            self.assertTrue(action.execute())
+            self.assertEqual(action.future.result(timeout=5), 0)
+            shells.append([worker._proc.pid for worker in _shell_workers
+                           if worker not in existing_workers])
+
+        # Both commands should have been run by the same shell.
+        self.assertEqual(len(shells[0]), 1)
+        self.assertEqual(shells[0], shells[1])
+
+        # Shells are terminated when the engine disconnects.
+        engine = get_engine()
+        self.assertIn(_terminate_shell_workers,
+                      engine._disconnect_callbacks)
+        workers = list(_shell_workers)
+        _terminate_shell_workers()
+        for worker in workers:
+            self.assertIsNone(worker._proc)
+
+    def test_concurrent_executions(self):
+        """ Test that concurrent executions process their own process. """
+
+        processes = []
+
+        def process(proc):
+            processes.append(proc)
+            proc.wait()
+
+        pool = CommandPool(max_workers=2)
+        action = RunCommand("sleep 0.2", pool=pool, process_command=process)
+        futures = []
+        for _ in range(2):
+            self.assertTrue(action.execute())
+            futures.append(action.future)
+        for future in futures:
+            self.assertEqual(future.result(timeout=5), 0)
+        self.assertEqual(len(set(processes)), 2)
+        self.assertIsNone(action.process)
+
+    def test_pool(self):
+        """ Test running commands in a CommandPool. """
+
+        pool = CommandPool(max_workers=1)
+        futures = []
+        actions = [RunCommand("sleep 0.2", pool=pool,
+                              process_command=lambda p: None,
+                              callback=futures.append)
+                   for _ in range(3)]
+        for action in actions:
+            self.assertTrue(action.execute())
+
+        # Only the first command should be running.
+        time.sleep(0.1)
+        self.assertEqual(pool.cancel_pending(), 2)
+        self.assertEqual(actions[0].future.result(timeout=5), 0)
+        self.assertEqual(len(futures), 3)
+        self.assertTrue(actions[1].future.cancelled())
+        self.assertTrue(actions[2].future.cancelled())
+
+
 #===========================================================================
 
 if __name__ == "__main__":
@@ -20,12 +20,32 @@
 #
 
 import locale
+import os
+import shutil
+import tempfile
+import threading
 import unittest
 
 import six
 
-from dragonfly.engines import EngineBase
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+from dragonfly.bench import (CorpusEntry, percentile, read_corpus,
+                             replay_corpus)
+from dragonfly.engines import EngineBase, get_current_engine
+from dragonfly.engines.backend_text.engine import TextInputEngine
+from dragonfly.engines.base import (MimicFailure, RingTimingSink,
+                                    RuleOrdering, DecodeCache,
+                                    add_timing_sink, remove_timing_sink,
+                                    timing_enabled, ObserverDeliveryBase,
+                                    ThreadedObserverDelivery)
 from dragonfly import (Literal, Dictation, Sequence, CompoundRule,
+                       MappingRule, Function, Grammar, AppContext,
+                       CorpusRecorder, RecognitionHistory,
+                       RecognitionObserver, List, ListRef, SetList,
                        get_engine)
 from dragonfly.test import ElementTester, RecognitionFailure, RuleTestCase
 
@@ -69,3 +89,468 @@ class TestEngineText(unittest.TestCase):
         # Check that recognition failure is possible.
         results = tester.recognize(u"jalapeo")
         assert results is RecognitionFailure
+
+    def test_mimic_many(self):
+        """ Verify that the text engine can mimic many utterances. """
+        calls = []
+        grammar = Grammar("mimic_many_test", engine=self.engine,
+                          context=AppContext(executable="notepad"))
+        grammar.add_rule(MappingRule(name="mimic_many_rule", mapping={
+            "hello": Function(lambda: calls.append("hello")),
+            "say <text>": Function(lambda text: calls.append(str(text))),
+        }, extras=[Dictation("text")]))
+        begins = []
+        grammar._process_begin = lambda executable, title, handle: \
+            begins.append(executable)
+        grammar.load()
+        try:
+            window = {"executable": "notepad", "title": "", "handle": 1}
+            utterances = ["hello", "say SOMETHING", "goodbye",
+                          (["hello"], {"executable": "other"})]
+            results = list(self.engine.mimic_many(utterances, window,
+                                                  execute=False))
+            self.assertEqual([r.success for r in results],
+                             [True, True, False, False])
+            self.assertEqual(results[1].words, ("say", "SOMETHING"))
+            self.assertIs(results[0].grammar, grammar)
+            self.assertEqual(results[0].rule.name, "mimic_many_rule")
+            self.assertEqual(calls, [])
+
+            # Grammar contexts are only processed when the window context
+            # changes, even if execute is False.
+            self.assertEqual(begins, ["notepad"])
+
+            # Actions should be executed if execute is True.
+            results = list(self.engine.mimic_many(utterances[:2], window))
+            self.assertEqual(calls, ["hello", "something"])
+            self.assertEqual(begins, ["notepad"] * 3)
+        finally:
+            grammar.unload()
+
+    @unittest.skipIf(asyncio is None, "asyncio is not available")
+    def test_mimic_async(self):
+        """ Verify that mimic_async() runs on an asyncio event loop. """
+        threads = []
+        grammar = Grammar("mimic_async_test", engine=self.engine)
+        grammar.add_rule(MappingRule(name="mimic_async_rule", mapping={
+            "hello": Function(lambda: threads.append(
+                threading.current_thread())),
+        }))
+        grammar.load()
+        loop = asyncio.new_event_loop()
+        try:
+            # Schedule a mimic from another thread.
+            futures = []
+            thread = threading.Thread(target=lambda: futures.append(
+                self.engine.mimic_async("hello", loop=loop)))
+            thread.start()
+            thread.join()
+            self.assertIs(loop.run_until_complete(futures[0]), None)
+            self.assertEqual(threads, [threading.current_thread()])
+
+            # Mimic failures are set as future exceptions.
+            future = self.engine.mimic_async("goodbye", loop=loop)
+            self.assertRaises(MimicFailure, loop.run_until_complete, future)
+        finally:
+            loop.close()
+            grammar.unload()
+
+    def test_isolated_engines(self):
+        """ Verify concurrent mimics on isolated engine instances. """
+        sessions = [TextInputEngine(isolated=True) for _ in range(4)]
+        self.assertIs(get_engine("text"), self.engine)
+        self.assertIsNot(get_current_engine(), sessions[0])
+        results = dict((i, []) for i in range(len(sessions)))
+        errors = []
+
+        def run(engine):
+            try:
+                for _ in range(50):
+                    engine.mimic("hello")
+                    self.assertRaises(MimicFailure, engine.mimic, "world")
+            except Exception as e:
+                errors.append(e)
+
+        # Load a grammar with the same rule into each session.  Each
+        # session's observer must only see its own recognitions.
+        grammars, observers, threads = [], [], []
+        for i, engine in enumerate(sessions):
+            engine.connect()
+            grammar = Grammar("session_%d" % i, engine=engine)
+            grammar.add_rule(MappingRule(name="session_rule", mapping={
+                "hello": Function(lambda i=i: results[i].append(i)),
+            }))
+            grammar.load()
+            history = RecognitionHistory()
+            history.register(engine)
+            grammars.append(grammar)
+            observers.append(history)
+            threads.append(threading.Thread(target=run, args=(engine,)))
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(10)
+            self.assertEqual(errors, [])
+            for i in range(len(sessions)):
+                self.assertEqual(results[i], [i] * 50)
+                self.assertEqual(len(observers[i]), 10)
+
+            # The default engine has no knowledge of the sessions.
+            self.assertRaises(MimicFailure, self.engine.mimic, "hello")
+        finally:
+            for history, grammar in zip(observers, grammars):
+                history.unregister()
+                grammar.unload()
+
+    def test_rule_ordering(self):
+        """ Verify adaptive grammar and rule ordering. """
+        calls = []
+        first = Grammar("ordering_first", engine=self.engine)
+        first.add_rule(MappingRule(name="ambiguous", mapping={
+            "hello": Function(lambda: calls.append("ambiguous")),
+            "other": Function(lambda: calls.append("other")),
+        }))
+        second = Grammar("ordering_second", engine=self.engine)
+        rules = [
+            MappingRule(name="ambiguous", mapping={
+                "hello": Function(lambda: calls.append("shadowed")),
+            }),
+            MappingRule(name="cold", mapping={
+                "cold": Function(lambda: calls.append("cold")),
+            }),
+            MappingRule(name="hot", mapping={
+                "hot": Function(lambda: calls.append("hot")),
+            }),
+        ]
+        rules[1].unambiguous = rules[2].unambiguous = True
+        for rule in rules:
+            second.add_rule(rule)
+        for grammar in (first, second):
+            grammar.load()
+
+        ordering = RuleOrdering(decay=0.5)
+        self.engine.rule_ordering = ordering
+        try:
+            self.engine.mimic("hot")
+            self.engine.mimic("hot")
+            self.engine.mimic("cold")
+            self.engine.mimic("hello")
+
+            # Unambiguous rules are ordered by decayed match counts while
+            # other rules keep their order, so "hello" still matches the
+            # ambiguous rule.
+            self.assertEqual(calls, ["hot", "hot", "cold", "ambiguous"])
+            self.assertEqual(ordering.order_rules(second, second.rules),
+                             [rules[1], rules[2], rules[0]])
+            self.assertEqual(ordering.statistics(), [
+                (("ordering_first", "ambiguous"), 1.0),
+                (("ordering_second", "cold"), 0.5),
+                (("ordering_second", "hot"), 0.375),
+            ])
+
+            # Grammars are only moved if all their rules are unambiguous.
+            wrappers = [self.engine._get_grammar_wrapper(grammar)
+                        for grammar in (first, second)]
+            self.assertEqual(ordering.order_grammars(wrappers), wrappers)
+            rules[0].unambiguous = True
+            self.assertEqual(ordering.order_grammars(wrappers),
+                             wrappers[::-1])
+
+            # Rules with a higher priority are always tried first.  Rule
+            # attributes are only inspected again in a new generation.
+            generation = self.engine.decode_generation
+            self.assertEqual(ordering.order_rules(second, second.rules,
+                                                  generation),
+                             [rules[1], rules[2], rules[0]])
+            rules[0].priority = 1
+            self.assertEqual(ordering.order_rules(second, second.rules,
+                                                  generation),
+                             [rules[1], rules[2], rules[0]])
+            self.engine.bump_decode_generation()
+            del calls[:]
+            self.engine.mimic("hello")
+            self.assertEqual(calls, ["shadowed"])
+
+            # Rules with the same name in different grammars are counted
+            # separately.
+            self.assertEqual(ordering.rule_count(first, first.rules[0]), 0.5)
+            self.assertEqual(ordering.rule_count(second, rules[0]), 1.0)
+            self.assertRaises(ValueError, RuleOrdering, decay=0)
+        finally:
+            self.engine.rule_ordering = None
+            for grammar in (first, second):
+                grammar.unload()
+
+    def test_decode_cache(self):
+        """ Verify caching of decode results. """
+        calls = []
+        items = List("cache_items")
+        grammar = Grammar("cache_test", engine=self.engine)
+        grammar.add_rule(MappingRule(name="cache_rule", mapping={
+            "hello": Function(lambda: calls.append("hello")),
+            "say <text>": Function(lambda text: calls.append(text.format())),
+            "pick <item>": Function(lambda item: calls.append(item)),
+        }, extras=[Dictation("text"), ListRef("item", items)]))
+        grammar.load()
+        cache = DecodeCache(maxsize=10)
+        self.engine.decode_cache = cache
+        try:
+            # Repeated utterances are processed using cached results.
+            for words in ("hello", "say SOME TEXT") * 2:
+                self.engine.mimic(words)
+            self.assertEqual(calls, ["hello", "some text"] * 2)
+            self.assertEqual((cache.hits, cache.misses), (2, 2))
+            results = list(self.engine.mimic_many(["say SOME TEXT"],
+                                                  execute=False))
+            node = results[0].node.get_child_by_name("text")
+            self.assertEqual(node.words(), ["some", "text"])
+            self.assertEqual(node.value().format(), "some text")
+
+            # Failures are cached too, until the grammar changes.
+            self.assertRaises(MimicFailure, self.engine.mimic, "pick one")
+            self.assertRaises(MimicFailure, self.engine.mimic, "pick one")
+            self.assertEqual(cache.hits, 4)
+            items.append("one")
+            self.engine.mimic("pick one")
+            self.assertEqual(calls[-1], "one")
+            grammar.disable()
+            self.assertRaises(MimicFailure, self.engine.mimic, "pick one")
+            self.assertRaises(ValueError, DecodeCache, maxsize=0)
+        finally:
+            self.engine.decode_cache = None
+            grammar.unload()
+
+    def test_corpus_replay(self):
+        """ Verify that utterance corpora can be recorded and replayed. """
+        grammar = Grammar("corpus_test", engine=self.engine,
+                          context=AppContext(executable="notepad"))
+        grammar.add_rule(MappingRule(name="corpus_rule", mapping={
+            "hello": Function(lambda: None),
+        }))
+        grammar.load()
+        temp_dir = tempfile.mkdtemp()
+        try:
+            # Record a recognition.
+            path = os.path.join(temp_dir, "corpus.jsonl")
+            recorder = CorpusRecorder(path)
+            self.engine.register_recognition_observer(recorder)
+            try:
+                self.engine.mimic("hello", executable="notepad",
+                                  title="corpus window")
+            finally:
+                self.engine.unregister_recognition_observer(recorder)
+                recorder.close()
+            self.assertEqual(len(recorder), 1)
+            self.assertEqual(recorder[0]["words"], ["hello"])
+            self.assertEqual(recorder[0]["grammar"], "corpus_test")
+            self.assertEqual(recorder[0]["rule"], "corpus_rule")
+            self.assertEqual(recorder[0]["executable"], "notepad")
+
+            # Subclasses of the other history classes only get the words.
+            class UpperHistory(RecognitionHistory):
+                def _recognition_to_item(self, words):
+                    return [word.upper() for word in words]
+            history = UpperHistory()
+            self.engine.register_recognition_observer(history)
+            try:
+                self.engine.mimic("hello", executable="notepad")
+            finally:
+                self.engine.unregister_recognition_observer(history)
+            self.assertEqual(history, [["HELLO"]])
+            self.assertEqual(recorder[0]["title"], "corpus window")
+            entries = read_corpus(path)
+            self.assertEqual(entries[0].words, ("hello",))
+            self.assertEqual(entries[0].executable, "notepad")
+
+            # Replay entries with recorded window attributes.
+            entries = [
+                CorpusEntry(("hello",), "notepad", "", None),
+                CorpusEntry(("hello",), "other", "", None),
+            ]
+            results = replay_corpus(entries, self.engine, repeat=3)
+            self.assertEqual(len(results.samples), 6)
+            self.assertEqual(results.failures, 3)
+            summary = results.summary()
+            self.assertEqual(list(summary),
+                             ["(all)", "corpus_test", "(failure)"])
+            self.assertEqual(list(summary["corpus_test"]),
+                             ["decode", "process", "total"])
+            self.assertEqual(len(summary["(all)"]["total"]), 3)
+            self.assertIn("corpus_test", results.format_report())
+        finally:
+            grammar.unload()
+            shutil.rmtree(temp_dir)
+
+    def test_set_list(self):
+        """ Verify SetList contents and engine notification of changes. """
+        items = SetList("set_items", ["one", "two", "one"])
+        self.assertEqual(items.get_list_items(), ["one", "two"])
+        self.assertRaises(TypeError, items.update, ["three", 4])
+        self.assertEqual(list(items), ["one", "two"])
+
+        calls = []
+        grammar = Grammar("set_list_test", engine=self.engine)
+        grammar.add_rule(MappingRule(name="set_rule", mapping={
+            "pick <item>": Function(lambda item: calls.append(item)),
+        }, extras=[ListRef("item", items)]))
+        grammar.load()
+        updates = []
+        original_update_list = self.engine.update_list
+        self.engine.update_list = lambda lst, grammar: updates.append(lst)
+        try:
+            # Bulk changes notify the engine once; no-op changes don't.
+            items.update(["three", "four", "two"])
+            items.update(["one", "three"])
+            items.add("four")
+            items.discard("five")
+            items.difference_update(["one", "four", "five"])
+            items.set(["two", "three"])
+            self.assertEqual(updates, [items, items])
+            self.assertEqual(items.get_list_items(), ["two", "three"])
+            self.assertRaises(KeyError, items.remove, "one")
+            with items:
+                items.add("one")
+                items.remove("two")
+            self.assertEqual(len(updates), 3)
+            self.assertEqual(list(items), ["three", "one"])
+        finally:
+            self.engine.update_list = original_update_list
+
+        try:
+            self.engine.mimic("pick three")
+            self.assertEqual(calls, ["three"])
+            self.assertRaises(MimicFailure, self.engine.mimic, "pick two")
+        finally:
+            grammar.unload()
+
+    def test_timing_records(self):
+        """ Verify that recognition timing records are produced. """
+        grammar = Grammar("timing_test", engine=self.engine)
+        grammar.add_rule(MappingRule(name="timing_rule", mapping={
+            "hello": Function(lambda: None),
+        }))
+        grammar.load()
+        sink = RingTimingSink(maxlen=2)
+        add_timing_sink(sink)
+        try:
+            self.engine.mimic("hello")
+            self.assertRaises(MimicFailure, self.engine.mimic, "goodbye")
+            self.engine.mimic("hello")
+        finally:
+            remove_timing_sink(sink)
+            grammar.unload()
+
+        # Only the two most recent records are kept.
+        self.assertEqual(len(sink.records), 2)
+        failure, record = sink.records
+        self.assertFalse(failure.success)
+        self.assertTrue(record.success)
+        self.assertEqual(record.words, ("hello",))
+        self.assertEqual((record.grammar, record.rule),
+                         ("timing_test", "timing_rule"))
+        self.assertGreaterEqual(record.total, 0)
+        phases = set((name, detail) for name, detail, _, _
+                     in record.phases)
+        for phase in [("process_begin", "timing_test"),
+                      ("process_words", "timing_test.timing_rule"),
+                      ("build_parse_tree", None),
+                      ("observers", "on_recognition"),
+                      ("action", "Function")]:
+            self.assertIn(phase, phases)
+        self.assertFalse(timing_enabled())
+
+    def test_recobs_dispatch(self):
+        """ Verify observer dispatch after registering and unregistering. """
+        grammar = Grammar("recobs_test", engine=self.engine)
+        grammar.add_rule(MappingRule(name="recobs_rule", mapping={
+            "hello": Function(lambda: None),
+        }))
+        grammar.load()
+
+        # Equal observers are distinguished by identity.
+        history1, history2 = RecognitionHistory(), RecognitionHistory()
+        self.assertEqual(history1, history2)
+        calls = []
+
+        class KeywordsObserver(RecognitionObserver):
+            def on_recognition(self, **kwargs):
+                calls.append(sorted(kwargs))
+
+        observer = KeywordsObserver()
+        try:
+            for obs in (history1, history2, observer):
+                self.engine.register_recognition_observer(obs)
+            self.engine.unregister_recognition_observer(history2)
+            self.engine.mimic("hello")
+            self.assertEqual(history1, [("hello",)])
+            self.assertEqual(history2, [])
+            self.assertEqual(calls, [["node", "results", "rule", "words"]])
+        finally:
+            for obs in (history1, observer):
+                self.engine.unregister_recognition_observer(obs)
+            grammar.unload()
+
+    def test_recobs_async_delivery(self):
+        """ Verify asynchronous delivery of observer events. """
+        grammar = Grammar("recobs_async_test", engine=self.engine)
+        grammar.add_rule(MappingRule(name="recobs_async_rule", mapping={
+            "hello": Function(lambda: None),
+        }))
+        grammar.load()
+        events = []
+
+        class AsyncObserver(RecognitionObserver):
+            asynchronous = ThreadedObserverDelivery()
+
+            def on_begin(self):
+                events.append(("begin", threading.current_thread()))
+
+            def on_recognition(self, words):
+                events.append((words, threading.current_thread()))
+
+        observer = AsyncObserver()
+        try:
+            self.engine.register_recognition_observer(observer)
+            self.engine.mimic("hello")
+            self.engine.mimic("hello")
+            self.assertTrue(observer.asynchronous.flush(5))
+        finally:
+            self.engine.unregister_recognition_observer(observer)
+            grammar.unload()
+
+        # Events are delivered in order on the worker thread.
+        self.assertEqual([event for event, _ in events],
+                         ["begin", ("hello",)] * 2)
+        for _, thread in events:
+            self.assertIsNot(thread, threading.current_thread())
+
+    def test_recobs_delivery_overflow(self):
+        """ Verify overflow policies of observer event queues. """
+        class Delivery(ObserverDeliveryBase):
+            def _schedule(self):
+                pass
+
+        calls = []
+        for overflow, expected in [("drop_oldest", [2, 3]),
+                                   ("drop_newest", [1, 2])]:
+            delivery = Delivery(maxsize=2, overflow=overflow)
+            for i in (1, 2, 3):
+                delivery.put(None, "on_begin", lambda i=i: calls.append(i),
+                             {})
+            self.assertEqual(delivery.dropped, 1)
+            delivery._deliver_pending()
+            self.assertEqual(calls, expected)
+            self.assertTrue(delivery.flush(0))
+            del calls[:]
+        self.assertRaises(ValueError, Delivery, overflow="invalid")
+
+    def test_percentile(self):
+        """ Verify nearest-rank percentiles used by benchmark reports. """
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([3, 1, 2], 0), 1)
+        self.assertEqual(percentile([3, 1, 2], 100), 3)
+        self.assertIs(percentile([], 50), None)
@@ -0,0 +1,248 @@
+#
+# This file is part of Dragonfly.
+# (c) Copyright 2007, 2008 by Christo Butcher
+# Licensed under the LGPL.
+#
+#   Dragonfly is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU Lesser General Public License as published
+#   by the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   Dragonfly is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public
+#   License along with Dragonfly.  If not, see
+#   <http://www.gnu.org/licenses/>.
+#
+
+"""
+Tests for the audio classes of the Kaldi engine
+
+These tests don't require a Kaldi model or an audio device, only the
+webrtcvad package.
+"""
+
+import io
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+try:
+    from dragonfly.engines.backend_kaldi import audio
+except ImportError:
+    audio = None
+
+
+#===========================================================================
+
+class DummyAudio(object):
+    """ Audio object which records written wav files. """
+
+    def __init__(self):
+        self.written = []
+        self.started = threading.Event()
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def write_wav(self, filename, audio_data):
+        self.started.set()
+        self.gate.wait()
+        self.written.append((filename, audio_data))
+
+
+@unittest.skipIf(audio is None, "the Kaldi engine dependencies are not"
+                                " installed")
+class TestAudioStoreWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.save_dir = tempfile.mkdtemp()
+        self.audio_obj = DummyAudio()
+        self.writers = []
+
+    def tearDown(self):
+        self.audio_obj.gate.set()
+        for writer in self.writers:
+            writer.close()
+        shutil.rmtree(self.save_dir)
+
+    def create_writer(self, **kwargs):
+        writer = audio.AudioStoreWriter(self.audio_obj, self.save_dir,
+                                        **kwargs)
+        self.writers.append(writer)
+        return writer
+
+    def put(self, writer, name):
+        filename = os.path.join(self.save_dir, name + ".wav")
+        writer.put(filename, name.encode(), name + u"\n")
+
+    def read_lines(self):
+        path = os.path.join(self.save_dir, "retain.tsv")
+        if not os.path.exists(path):
+            return []
+        with io.open(path, encoding="utf-8") as f:
+            return f.read().splitlines()
+
+    def block_writer(self, writer):
+        # Make the writer thread wait inside write_wav().
+        self.audio_obj.gate.clear()
+        self.audio_obj.started.clear()
+        self.put(writer, "blocked")
+        self.assertTrue(self.audio_obj.started.wait(5))
+
+    def test_invalid_overflow(self):
+        """ Test that unknown overflow policies are rejected. """
+        self.assertRaises(ValueError, audio.AudioStoreWriter,
+                          self.audio_obj, self.save_dir, overflow="wait")
+
+    def test_batching(self):
+        """ Test that metadata lines are batched until flushed. """
+        writer = self.create_writer(flush_interval_s=60)
+        self.put(writer, "one")
+        self.put(writer, "two")
+        self.assertTrue(self.audio_obj.started.wait(5))
+        self.assertEqual(self.read_lines(), [])
+        self.assertTrue(writer.flush(5))
+        self.assertEqual(self.read_lines(), ["one", "two"])
+        self.assertEqual([data for _, data in self.audio_obj.written],
+                         [b"one", b"two"])
+
+        # Lines are also appended after the flush interval.
+        writer.flush_interval_s = 0.01
+        self.put(writer, "three")
+        for _ in range(500):
+            if len(self.read_lines()) == 3:
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.read_lines(), ["one", "two", "three"])
+
+    def test_drop_policy(self):
+        """ Test that recognitions are dropped when the queue is full. """
+        writer = self.create_writer(maxsize=1, overflow="drop")
+        self.block_writer(writer)
+        self.put(writer, "queued")
+        self.put(writer, "dropped")
+        self.assertEqual(writer.dropped, 1)
+
+        # Flushing times out while the queue is full.
+        self.assertFalse(writer.flush(0.05))
+        self.audio_obj.gate.set()
+        self.assertTrue(writer.flush(5))
+        self.assertEqual(self.read_lines(), ["blocked", "queued"])
+
+    def test_block_policy(self):
+        """ Test that the block policy waits for space in the queue. """
+        writer = self.create_writer(maxsize=1, overflow="block")
+        self.block_writer(writer)
+        self.put(writer, "queued")
+        thread = threading.Thread(target=self.put,
+                                  args=(writer, "waiting"))
+        thread.start()
+        thread.join(0.05)
+        self.assertTrue(thread.is_alive())
+        self.audio_obj.gate.set()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(writer.dropped, 0)
+        self.assertTrue(writer.flush(5))
+        self.assertEqual(self.read_lines(), ["blocked", "queued", "waiting"])
+
+    def test_close(self):
+        """ Test that closing writes queued recognitions. """
+        writer = self.create_writer(maxsize=1, flush_interval_s=60)
+        self.block_writer(writer)
+        self.put(writer, "queued")
+
+        # Closing times out while the queue is full.
+        self.assertFalse(writer.close(0.05))
+        self.audio_obj.gate.set()
+        self.assertTrue(writer.close(5))
+        self.assertEqual(self.read_lines(), ["blocked", "queued"])
+
+        # Flushing a closed writer doesn't wait.
+        self.assertTrue(writer.flush(0.05))
+        self.assertTrue(writer.close())
+
+
+#===========================================================================
+
+@unittest.skipIf(audio is None, "the Kaldi engine dependencies are not"
+                                " installed")
+class TestStreamAudio(unittest.TestCase):
+
+    def setUp(self):
+        self.block_size = audio.StreamAudio.BLOCK_SIZE_BYTES
+        self.streams = []
+
+    def tearDown(self):
+        for stream in self.streams:
+            stream.destroy()
+
+    def create_stream(self, source, **kwargs):
+        stream = audio.StreamAudio(source, **kwargs)
+        self.streams.append(stream)
+        return stream
+
+    def make_data(self, blocks):
+        size = int(blocks * self.block_size)
+        return bytes(bytearray(i % 256 for i in range(size)))
+
+    def read_all(self, stream):
+        blocks = []
+        while True:
+            block = stream.read()
+            if block is None:
+                return blocks
+            blocks.append(block)
+
+    def test_file_object(self):
+        """ Test reading blocks from a file-like object. """
+        data = self.make_data(2.5)
+        stream = self.create_stream(io.BytesIO(data), chunk_blocks=2)
+        blocks = self.read_all(stream)
+
+        # The incomplete block at the end is discarded.
+        self.assertEqual(len(blocks), 2)
+        for block in blocks:
+            self.assertIsInstance(block, bytes)
+        self.assertEqual(b"".join(blocks), data[:2 * self.block_size])
+        self.assertIsNone(stream.read())
+
+    def test_socket(self):
+        """ Test reading blocks split across writes to a socket. """
+        reader, writer = socket.socketpair()
+        try:
+            stream = self.create_stream(reader.makefile("rb", 0))
+            data = self.make_data(3)
+            writer.sendall(data[:self.block_size // 2])
+            writer.sendall(data[self.block_size // 2:])
+            writer.close()
+            blocks = self.read_all(stream)
+            self.assertEqual(b"".join(blocks), data)
+            self.assertEqual([len(block) for block in blocks],
+                             [self.block_size] * 3)
+        finally:
+            writer.close()
+            reader.close()
+
+    def test_invalid_path(self):
+        """ Test that missing files are rejected and connection errors
+            end the stream. """
+        temp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(temp_dir, "audio.raw")
+            self.assertRaises(audio.EngineError, audio.StreamAudio, path)
+            with open(path, "wb") as f:
+                f.write(self.make_data(1))
+            stream = self.create_stream(path, start=False)
+            os.remove(path)
+            stream.start()
+            self.assertEqual(self.read_all(stream), [])
+        finally:
+            shutil.rmtree(temp_dir)
@@ -0,0 +1,170 @@
+#
+# This file is part of Dragonfly.
+# (c) Copyright 2007, 2008 by Christo Butcher
+# Licensed under the LGPL.
+#
+#   Dragonfly is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU Lesser General Public License as published
+#   by the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   Dragonfly is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public
+#   License along with Dragonfly.  If not, see
+#   <http://www.gnu.org/licenses/>.
+#
+
+"""
+Tests for the rule signatures of the Kaldi compiler
+
+These tests don't require a Kaldi model, only the kaldi-active-grammar
+package.
+"""
+
+import collections
+import os
+import shutil
+import tempfile
+import unittest
+
+from dragonfly import (Grammar, List, ListRef, Literal, Rule, Sequence,
+                       get_engine)
+
+try:
+    from dragonfly.engines.backend_kaldi.compiler import (KaldiCompiler,
+                                                          RuleFstCache)
+except ImportError:
+    KaldiCompiler = None
+
+
+#===========================================================================
+
+class StubFSTCache(object):
+    def __init__(self):
+        self.cache = {"version": u"1", "dependencies_hash": u"hash"}
+
+    def fst_is_current(self, filepath):
+        return os.path.isfile(filepath)
+
+
+class StubKaldiRule(object):
+    def __init__(self, compiler, rule, grammar):
+        self.compiler = compiler
+        self.parent_rule = rule
+        self.parent_grammar = grammar
+        self.filename = None
+        self.compiled = False
+
+    filepath = property(lambda self: os.path.join(self.compiler.tmp_dir,
+                                                  self.filename))
+
+
+class StubModel(object):
+    def __init__(self, lexicon_words):
+        self.lexicon_words = set(lexicon_words)
+        self.longest_word = u"impossible"
+        self.fst_cache = StubFSTCache()
+
+
+@unittest.skipIf(KaldiCompiler is None, "kaldi-active-grammar is not"
+                                        " installed")
+class TestRuleSignature(unittest.TestCase):
+
+    def setUp(self):
+        # Create a compiler without loading a Kaldi model.
+        compiler = KaldiCompiler.__new__(KaldiCompiler)
+        compiler.model = StubModel([u"hello", u"world", u"red", u"blue"])
+        compiler.kaldi_rules_by_listreflist_dict = \
+            collections.defaultdict(set)
+        self.compiler = compiler
+        self.grammar = Grammar("signature_test", engine=get_engine("text"))
+
+    def signature(self, element):
+        rule = Rule("signature_rule", element, exported=True)
+        return self.compiler.get_rule_signature(rule, self.grammar, object())
+
+    def test_elements(self):
+        """ Test that signatures depend on the rule's elements. """
+        element = Sequence([Literal("hello"), Literal("world")])
+        signature = self.signature(element)
+        self.assertEqual(self.signature(Sequence([Literal("hello"),
+                                                  Literal("world")])),
+                         signature)
+        self.assertNotEqual(self.signature(Literal("hello world")),
+                            signature)
+        self.assertNotEqual(self.signature(Sequence([Literal("world"),
+                                                     Literal("hello")])),
+                            signature)
+
+    def test_lexicon(self):
+        """ Test that signatures depend on the rule's words' lexicon. """
+        lst = List("signature_list", ["red", "dark blue"])
+        element = Sequence([Literal("Hello"), ListRef("color", lst)])
+        signature = self.signature(element)
+
+        # Words not used by the rule don't matter.
+        lexicon_words = self.compiler.model.lexicon_words
+        lexicon_words.add(u"unused")
+        self.assertEqual(self.signature(element), signature)
+
+        # Adding one of the rule's words changes the signature, even if
+        # the lexicon size stays the same.
+        lexicon_words.remove(u"unused")
+        lexicon_words.remove(u"world")
+        lexicon_words.add(u"dark")
+        dark_signature = self.signature(element)
+        self.assertNotEqual(dark_signature, signature)
+
+        # Removing one of the rule's literal words also changes it.
+        lexicon_words.remove(u"hello")
+        self.assertNotEqual(self.signature(element), dark_signature)
+
+
+@unittest.skipIf(KaldiCompiler is None, "kaldi-active-grammar is not"
+                                        " installed")
+class TestRuleFstCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        compiler = KaldiCompiler.__new__(KaldiCompiler)
+        compiler.model = StubModel([u"hello", u"world"])
+        compiler.kaldi_rules_by_listreflist_dict = \
+            collections.defaultdict(set)
+        compiler.model.tmp_dir = self.tmp_dir
+        compiler.rule_fst_cache = RuleFstCache(
+            os.path.join(self.tmp_dir, "rule_fst_cache.json"))
+        compiler.rule_fst_cache_enabled = True
+        compiler._unbuilt_kaldi_rules = set()
+        compiler.built = []
+        compiler._build_rule_fst = lambda rule, grammar, kaldi_rule: \
+            (compiler.built.append(kaldi_rule),
+             compiler._unbuilt_kaldi_rules.discard(kaldi_rule))
+        self.compiler = compiler
+        self.grammar = Grammar("cache_test", engine=get_engine("text"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_cached_rule(self):
+        """ Test that cached rules are compiled without building FSTs. """
+        rule = Rule("cache_rule", Literal("hello world"), exported=True)
+        kaldi_rule = StubKaldiRule(self.compiler, rule, self.grammar)
+        signature = self.compiler.get_rule_signature(rule, self.grammar,
+                                                     kaldi_rule)
+        with open(os.path.join(self.tmp_dir, "cached.fst"), "w"):
+            pass
+        self.compiler.rule_fst_cache.put(signature, u"cached.fst")
+
+        self.compiler._compile_rule_root(rule, self.grammar, kaldi_rule)
+        self.assertTrue(kaldi_rule.compiled)
+        self.assertEqual(kaldi_rule.filename, u"cached.fst")
+        self.assertEqual(self.compiler.built, [])
+
+        # The rule's FST is built once, when it is needed.
+        self.compiler.build_rule_fst(kaldi_rule)
+        self.compiler.build_rule_fst(kaldi_rule)
+        self.assertEqual(self.compiler.built, [kaldi_rule])
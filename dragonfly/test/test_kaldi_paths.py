@@ -0,0 +1,246 @@
+#
+# This file is part of Dragonfly.
+# (c) Copyright 2007, 2008 by Christo Butcher
+# Licensed under the LGPL.
+#
+#   Dragonfly is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU Lesser General Public License as published
+#   by the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   Dragonfly is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public
+#   License along with Dragonfly.  If not, see
+#   <http://www.gnu.org/licenses/>.
+#
+
+"""
+Tests for building Kaldi parse trees from recognition paths
+
+These tests compile rules into a stub FST, so they don't require a Kaldi
+model, only the kaldi-active-grammar package.  The parse tree frames built
+from each recognition's path are compared with those built by decoding.
+"""
+
+import collections
+import unittest
+
+from dragonfly import (Alternative, Dictation, Grammar, IntegerRef, List,
+                       ListRef, Literal, Modifier, Optional, Repetition,
+                       Rule, RuleRef, Sequence, get_engine)
+from dragonfly.grammar.state import State
+
+try:
+    from dragonfly.engines.backend_kaldi.compiler import KaldiCompiler
+    from dragonfly.engines.backend_kaldi.paths import ElementPathGraph
+except ImportError:
+    KaldiCompiler = None
+
+
+#===========================================================================
+
+class StubWFST(object):
+    """ Stand-in for kaldi_active_grammar.WFST which only keeps arcs. """
+
+    eps = u'<eps>'
+    eps_disambig = u'#0'
+
+    def __init__(self):
+        self.num_states = 0
+        self.arcs = collections.defaultdict(list)
+
+    def add_state(self, initial=False, final=False):
+        self.num_states += 1
+        return self.num_states - 1
+
+    def add_arc(self, src_state, dst_state, label, olabel=None,
+                weight=None):
+        if label is None:
+            label = self.eps
+        self.arcs[src_state].append((dst_state, label))
+
+    def has_eps_path(self, path_src_state, path_dst_state,
+                     eps_like_labels=frozenset()):
+        eps_like_labels = frozenset((self.eps, self.eps_disambig)
+                                    ).union(eps_like_labels)
+        states = [path_src_state]
+        visited = set(states)
+        while states:
+            state = states.pop()
+            if state == path_dst_state:
+                return True
+            for dst_state, label in self.arcs[state]:
+                if label in eps_like_labels and dst_state not in visited:
+                    visited.add(dst_state)
+                    states.append(dst_state)
+        return False
+
+
+class AllWords(object):
+    """ Lexicon containing every word. """
+
+    def __contains__(self, word):
+        return True
+
+
+class StubModel(object):
+    lexicon_words = AllWords()
+    longest_word = u"impossible"
+
+
+class StubKaldiRule(object):
+    pass
+
+
+class CustomLiteral(Literal):
+    def decode(self, state):
+        return Literal.decode(self, state)
+
+
+@unittest.skipIf(KaldiCompiler is None, "kaldi-active-grammar is not"
+                                        " installed")
+class TestElementPathGraph(unittest.TestCase):
+
+    def setUp(self):
+        # Create a compiler without loading a Kaldi model.
+        compiler = KaldiCompiler.__new__(KaldiCompiler)
+        compiler.model = StubModel()
+        compiler.kaldi_rules_by_listreflist_dict = \
+            collections.defaultdict(set)
+        self.compiler = compiler
+        self.grammar = Grammar("path_test", engine=get_engine("text"))
+
+    def compile(self, element):
+        rule = Rule("path_rule", element, exported=True)
+        graph = ElementPathGraph(StubWFST())
+        start_state, final_state = self.compiler._compile_rule(
+            rule, self.grammar, StubKaldiRule(), graph)
+        return rule, graph.finish(start_state, final_state)
+
+    def decode_frames(self, rule, output):
+        words_rules = []
+        dictation = False
+        for token in output.split()[1:]:
+            if token.startswith(u"#nonterm:dictation"):
+                dictation = True
+            elif token == u"#nonterm:end":
+                dictation = False
+            else:
+                words_rules.append((token, 1 if dictation else 0))
+        state = State(tuple(words_rules), (rule.name, "dgndictation"),
+                      get_engine("text"))
+        state.initialize_decoding()
+        for _ in rule.decode(state):
+            if state.finished():
+                return state.build_parse_tree().frames()
+        self.fail("Could not decode %r" % output)
+
+    def assert_frames(self, element, *outputs):
+        rule, graph = self.compile(element)
+        for output in outputs:
+            output = u"#nonterm:rule0 " + output
+            words = [token for token in output.split()[1:]
+                     if not token.startswith(u"#nonterm:")]
+            frames = graph.parse_frames(output, words)
+            self.assertIsNotNone(frames, output)
+            self.assertEqual(tuple(frames), self.decode_frames(rule, output),
+                             output)
+
+    def assert_no_frames(self, element, output):
+        rule, graph = self.compile(element)
+        output = u"#nonterm:rule0 " + output
+        words = [token for token in output.split()[1:]
+                 if not token.startswith(u"#nonterm:")]
+        self.assertIsNone(graph.parse_frames(output, words))
+
+    def test_sequence(self):
+        """ Test sequences of literals and rule references. """
+        inner = Rule("inner", Literal("there"), exported=False)
+        self.assert_frames(Sequence([Literal("hello"), RuleRef(inner),
+                                     Literal("big world")]),
+                           "hello there big world")
+
+    def test_optional(self):
+        """ Test optional elements, matched and skipped. """
+        self.assert_frames(Sequence([Literal("hello"),
+                                     Optional(Literal("there")),
+                                     Literal("world")]),
+                           "hello there world", "hello world")
+
+    def test_ambiguous_alternatives(self):
+        """ Test alternatives that match the same words. """
+        self.assert_frames(Alternative([
+            Literal("go left"),
+            Sequence([Literal("go"), Literal("left")]),
+            Sequence([Literal("go"), Optional(Literal("left"))]),
+        ]), "go left", "go")
+        self.assert_frames(Sequence([Optional(Literal("up")),
+                                     Alternative([Literal("up"),
+                                                  Literal("up up")])]),
+                           "up", "up up", "up up up")
+
+    def test_repetition(self):
+        """ Test repetitions with different minimum and maximum counts. """
+        # The maximum count is exclusive.
+        child = Alternative([Literal("one"), Literal("two")])
+        self.assert_frames(Repetition(child, min=1, max=4),
+                           "one", "one two", "two two one")
+        self.assert_frames(Repetition(child, min=0, max=3),
+                           "", "one", "one two")
+        self.assert_frames(Repetition(child, min=2, max=4),
+                           "one two", "one two one")
+        self.assert_frames(Sequence([Literal("say"),
+                                     Repetition(child, min=1, max=3),
+                                     Literal("done")]),
+                           "say one done", "say one two done")
+
+        # The FST doesn't limit the number of iterations.
+        self.assert_no_frames(Repetition(child, min=1, max=3),
+                              "one two one")
+        self.assert_no_frames(Repetition(child, min=2, max=4), "one")
+
+    def test_list_ref(self):
+        """ Test list references, which only match exact list items. """
+        lst = List("path_list", ["red", "dark blue"])
+        self.assert_frames(Sequence([Literal("color"),
+                                     ListRef("color", lst)]),
+                           "color red", "color dark blue")
+
+        # The FST is compiled from lowercased items, so paths may match
+        # words that decoding would not.
+        lst = List("path_case_list", ["Red"])
+        self.assert_no_frames(ListRef("color", lst), "red")
+
+    def test_dictation(self):
+        """ Test dictation elements. """
+        self.assert_frames(Sequence([Literal("say"), Dictation("text"),
+                                     Literal("stop")]),
+                           "say #nonterm:dictation hello there "
+                           "#nonterm:end stop")
+
+    def test_integer_ref(self):
+        """ Test integer references and modifiers. """
+        self.assert_frames(Sequence([Literal("number"),
+                                     IntegerRef("n", 1, 30)]),
+                           "number one", "number twenty three")
+        self.assert_frames(Modifier(Literal("hello"), lambda x: x),
+                           "hello")
+
+    def test_fallback(self):
+        """ Test that elements which decode differently are not mapped. """
+        self.assert_no_frames(Sequence([Literal("hello"),
+                                        CustomLiteral("world")]),
+                              "hello world")
+
+    def test_nested_repetition(self):
+        """ Test that nested repetitions are not mapped. """
+        child = Repetition(Literal("one"), min=1, max=3)
+        self.assert_no_frames(Repetition(child, min=1, max=3),
+                              "one one")
+        inner = Rule("inner", child, exported=False)
+        self.assert_no_frames(Repetition(RuleRef(inner), min=1, max=3),
+                              "one one")
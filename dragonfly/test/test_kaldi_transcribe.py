@@ -0,0 +1,121 @@
+#
+# This file is part of Dragonfly.
+# (c) Copyright 2007, 2008 by Christo Butcher
+# Licensed under the LGPL.
+#
+#   Dragonfly is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU Lesser General Public License as published
+#   by the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   Dragonfly is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public
+#   License along with Dragonfly.  If not, see
+#   <http://www.gnu.org/licenses/>.
+#
+
+"""
+Tests for the Kaldi batch transcription helpers
+
+These tests don't require the Kaldi engine's dependencies.
+"""
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from dragonfly.engines.backend_kaldi import transcribe
+from dragonfly.engines.backend_kaldi.transcribe import (read_file_list,
+                                                        word_errors,
+                                                        TranscriptionItem,
+                                                        TranscriptionStats)
+
+
+#===========================================================================
+
+class TestTranscribe(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_read_file_list(self):
+        """ Test reading plain file lists and retain.tsv files. """
+        abs_wav = os.path.abspath(os.path.join(self.temp_dir, "abs.wav"))
+        path = os.path.join(self.temp_dir, "retain.tsv")
+        with io.open(path, "w", encoding="utf-8") as f:
+            f.write(u"# comment\n"
+                    u"\n"
+                    u"plain.wav\n"
+                    u"retain_1.wav\t1.5\tgrammar\trule\thello world\t-1\n"
+                    u"\t1.5\tgrammar\trule\tno audio\t-1\n"
+                    u"%s\t1.5\tgrammar\trule\tcaf\xe9\r\n" % abs_wav)
+        items = read_file_list(path)
+        self.assertEqual(items, [
+            TranscriptionItem(os.path.join(self.temp_dir, "plain.wav"),
+                              None),
+            TranscriptionItem(os.path.join(self.temp_dir, "retain_1.wav"),
+                              u"hello world"),
+            TranscriptionItem(abs_wav, u"caf\xe9"),
+        ])
+        self.assertRaises(IOError, read_file_list,
+                          os.path.join(self.temp_dir, "missing.tsv"))
+
+    def test_word_errors(self):
+        """ Test counting word substitutions, deletions and insertions. """
+        self.assertEqual(word_errors([], []), 0)
+        self.assertEqual(word_errors(["a", "b"], ["a", "b"]), 0)
+        self.assertEqual(word_errors(["a", "b"], ["a", "c"]), 1)
+        self.assertEqual(word_errors(["a", "b", "c"], ["a", "c"]), 1)
+        self.assertEqual(word_errors(["a"], ["b", "a", "c"]), 2)
+        self.assertEqual(word_errors(["a", "b"], []), 2)
+        self.assertEqual(word_errors([], ["a"]), 1)
+
+    def test_transcription_stats(self):
+        """ Test accuracy statistics of transcription results. """
+        stats = TranscriptionStats()
+        self.assertIsNone(stats.sentence_accuracy)
+        self.assertIsNone(stats.word_error_rate)
+        stats.add({"wav": "1.wav", "words": ["a", "b"], "text": "a b",
+                   "word_errors": 0})
+        stats.add({"wav": "2.wav", "words": ["a"], "text": "a b c",
+                   "word_errors": 2})
+        stats.add({"wav": "3.wav", "words": ["a"]})
+        stats.add({"wav": "4.wav", "error": "IOError: missing"})
+        self.assertEqual((stats.count, stats.errors, stats.scored),
+                         (4, 1, 2))
+        self.assertEqual(stats.correct, 1)
+        self.assertEqual(stats.sentence_accuracy, 0.5)
+        self.assertEqual(stats.word_error_rate, 2 / 5.0)
+        report = stats.format_report()
+        self.assertIn("4 file(s) transcribed, 1 error(s), 2 scored", report)
+        self.assertIn("sentence accuracy: 50.00% (1/2)", report)
+        self.assertIn("word error rate: 40.00% (2/5)", report)
+
+    def test_engine_error(self):
+        """ Test that engine initialization errors are reported per item. """
+        def create_engine(module_files, engine_options):
+            raise ValueError("bad options")
+
+        original_create_engine = transcribe._create_engine
+        transcribe._create_engine = create_engine
+        try:
+            items = [TranscriptionItem("1.wav", None),
+                     TranscriptionItem("2.wav", "hello")]
+            results = list(transcribe.transcribe_files(items, processes=1))
+        finally:
+            transcribe._create_engine = original_create_engine
+            transcribe._worker_engine = transcribe._worker_error = None
+        self.assertEqual([result["wav"] for result in results],
+                         ["1.wav", "2.wav"])
+        for result in results:
+            self.assertEqual(sorted(result), ["error", "wav"])
+            self.assertIn("ValueError: bad options", result["error"])
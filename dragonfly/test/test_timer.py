@@ -22,7 +22,16 @@
 import unittest
 import time
 import logging
+from threading import Event
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
 from dragonfly.engines import get_engine
+from dragonfly.engines.base import AsyncioTimerManager, ThreadedTimerManager
+from dragonfly.engines.base.timer import Timer
 
 
 #===========================================================================
@@ -90,6 +99,61 @@ class TestTimer(unittest.TestCase):
             # Stop the timer at the end regardless of the result.
             timer.stop()
 
+    def test_timer_order(self):
+        """ Test that due timers are called in order of their deadlines. """
+        manager = ThreadedTimerManager(0.02, self.engine)
+        manager.disable()
+        calls = []
+        timers = [Timer(lambda n=n: calls.append(n), interval, manager,
+                        repeating=False)
+                  for n, interval in [(3, 0.03), (1, 0.01), (2, 0.02)]]
+        self.assertAlmostEqual(manager.next_deadline(), timers[1].next_time)
+
+        # Stopped timers are not called.
+        timers[2].stop()
+        time.sleep(0.04)
+        manager.main_callback()
+        self.assertEqual(calls, [1, 3])
+        self.assertEqual(manager.next_deadline(), None)
+
+    def test_threaded_timer_deadline(self):
+        """ Test that the timer thread wakes up when a timer is due. """
+        # Use a long manager interval: the thread should wait for the
+        # timer's deadline instead.
+        manager = ThreadedTimerManager(60, self.engine)
+        called = Event()
+        start = time.time()
+        timer = Timer(called.set, 0.05, manager, repeating=False)
+        try:
+            self.assertTrue(called.wait(5))
+            self.assertLess(time.time() - start, 5)
+            self.assertFalse(timer.active)
+        finally:
+            timer.stop()
+
+    @unittest.skipIf(asyncio is None, "asyncio is not available")
+    def test_asyncio_timer_manager(self):
+        """ Test that timers can be called on an asyncio event loop. """
+        loop = asyncio.new_event_loop()
+        manager = AsyncioTimerManager(0.02, self.engine, loop)
+        calls = []
+        done = asyncio.Future(loop=loop)
+
+        def callback():
+            calls.append(time.time())
+            if len(calls) == 3:
+                timer.stop()
+                done.set_result(None)
+
+        timer = Timer(callback, 0.01, manager)
+        try:
+            loop.run_until_complete(asyncio.wait_for(done, 5))
+            self.assertEqual(len(calls), 3)
+            self.assertEqual(manager.timers, [])
+        finally:
+            timer.stop()
+            loop.close()
+
 #===========================================================================
 
 if __name__ == "__main__":
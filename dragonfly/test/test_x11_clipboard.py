@@ -0,0 +1,195 @@
+# -*- encoding: utf-8 -*-
+#
+# This file is part of Dragonfly.
+# (c) Copyright 2007, 2008 by Christo Butcher
+# Licensed under the LGPL.
+#
+#   Dragonfly is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU Lesser General Public License as published
+#   by the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   Dragonfly is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public
+#   License along with Dragonfly.  If not, see
+#   <http://www.gnu.org/licenses/>.
+#
+
+"""
+Tests for the X11 selection handling of the X11Clipboard class
+
+These tests use a fake display connection, so they don't require an X
+server, only python-xlib.
+"""
+
+import threading
+import unittest
+
+from dragonfly.windows import x11_clipboard
+from dragonfly.windows.x11_clipboard import _SelectionManager
+
+if x11_clipboard.Display is not None:
+    from Xlib import X, Xatom
+    from Xlib.error import ConnectionClosedError
+    from Xlib.xobject.drawable import Window
+else:
+    Window = object
+
+
+#===========================================================================
+
+class FakeRequestor(Window):
+    def __init__(self):
+        Window.__init__(self, None, 0x100)
+        self.properties = {}
+        self.sent_events = []
+
+    def change_property(self, prop, type, format, data):
+        self.properties[prop] = (type, format, data)
+
+    def send_event(self, event, **kwargs):
+        self.sent_events.append(event)
+
+
+class FakeDisplay(object):
+    def __init__(self, events=()):
+        self.events = list(events)
+        self.flushes = 0
+
+    def flush(self):
+        self.flushes += 1
+
+    def next_event(self):
+        if not self.events:
+            raise ConnectionClosedError("server")
+        return self.events.pop(0)
+
+
+class FakeEvent(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+@unittest.skipIf(x11_clipboard.Display is None, "python-xlib is not installed")
+class TestSelectionManager(unittest.TestCase):
+
+    clipboard = 101
+    utf8_string = 102
+
+    def setUp(self):
+        # Create a manager without connecting to an X server.
+        manager = _SelectionManager.__new__(_SelectionManager)
+        manager._display = FakeDisplay()
+        manager._atoms = {"CLIPBOARD": self.clipboard,
+                          "PRIMARY": Xatom.PRIMARY}
+        manager._targets = 103
+        manager._timestamp = 104
+        manager._utf8_string = self.utf8_string
+        manager._text = 105
+        manager._incr = 106
+        manager._property = 107
+        manager._owned = {}
+        manager._change_counts = dict((atom, 0) for atom in
+                                      manager._atoms.values())
+        manager._cache = {}
+        manager._xfixes = False
+        manager._condition = threading.Condition()
+        manager._notify_event = None
+        manager.closed = False
+        self.manager = manager
+
+    def request(self, target, property=200, selection=None):
+        requestor = FakeRequestor()
+        event = FakeEvent(type=X.SelectionRequest, time=5,
+                          requestor=requestor, target=target,
+                          property=property,
+                          selection=selection or self.clipboard)
+        self.manager._handle_event(event)
+        self.assertEqual(len(requestor.sent_events), 1)
+        notify = requestor.sent_events[0]
+        self.assertEqual(notify.target, target)
+        self.assertEqual(notify.selection, event.selection)
+        return requestor, notify
+
+    def test_utf8_request(self):
+        """ Test that owned text is sent as UTF-8. """
+        self.manager._owned[self.clipboard] = u"café"
+        requestor, notify = self.request(self.utf8_string)
+        self.assertEqual(notify.property, 200)
+        self.assertEqual(requestor.properties[200],
+                         (self.utf8_string, 8, u"café".encode("utf-8")))
+
+    def test_string_request(self):
+        """ Test that owned text is sent as Latin-1 for STRING targets. """
+        self.manager._owned[self.clipboard] = u"café €"
+        requestor, notify = self.request(Xatom.STRING)
+        self.assertEqual(requestor.properties[200],
+                         (Xatom.STRING, 8, b"caf\xe9 ?"))
+
+    def test_targets_request(self):
+        """ Test that the supported targets are listed. """
+        self.manager._owned[self.clipboard] = u"text"
+        requestor, notify = self.request(103)
+        prop_type, format, targets = requestor.properties[200]
+        self.assertEqual((prop_type, format), (Xatom.ATOM, 32))
+        self.assertIn(self.utf8_string, targets)
+        self.assertIn(Xatom.STRING, targets)
+
+    def test_obsolete_requestor(self):
+        """ Test that the target is used if no property is given. """
+        self.manager._owned[self.clipboard] = u"text"
+        requestor, notify = self.request(self.utf8_string,
+                                         property=X.NONE)
+        self.assertEqual(notify.property, self.utf8_string)
+        self.assertIn(self.utf8_string, requestor.properties)
+
+    def test_refused_requests(self):
+        """ Test refusing unsupported targets and unowned selections. """
+        self.manager._owned[self.clipboard] = u"text"
+        requestor, notify = self.request(999)
+        self.assertEqual(notify.property, X.NONE)
+        self.assertEqual(requestor.properties, {})
+        requestor, notify = self.request(self.utf8_string,
+                                         selection=Xatom.PRIMARY)
+        self.assertEqual(notify.property, X.NONE)
+        self.assertEqual(requestor.properties, {})
+
+    def test_selection_clear(self):
+        """ Test that ownership is dropped on SelectionClear events. """
+        self.manager._owned[self.clipboard] = u"text"
+        self.manager._handle_event(FakeEvent(type=X.SelectionClear,
+                                             atom=self.clipboard))
+        self.assertNotIn(self.clipboard, self.manager._owned)
+        self.assertEqual(self.manager._change_counts[self.clipboard], 1)
+
+    def test_own_text(self):
+        """ Test that owned text is returned without a round trip. """
+        self.manager._owned[self.clipboard] = u"text"
+        self.assertEqual(self.manager.get_text("CLIPBOARD"), u"text")
+
+    def test_event_loop_connection_closed(self):
+        """ Test that the event loop stops when the connection closes. """
+        requestor = FakeRequestor()
+        self.manager._owned[self.clipboard] = u"text"
+        self.manager._display = FakeDisplay([
+            FakeEvent(type=X.SelectionRequest, time=5, requestor=None,
+                      target=self.utf8_string, property=200,
+                      selection=self.clipboard),
+            FakeEvent(type=X.SelectionRequest, time=5, requestor=requestor,
+                      target=self.utf8_string, property=200,
+                      selection=self.clipboard),
+        ])
+
+        # Handler errors are logged and the loop continues until the
+        # connection is closed.
+        self.manager._event_loop()
+        self.assertEqual(len(requestor.sent_events), 1)
+        self.assertTrue(self.manager.closed)
+        self.assertEqual(self.manager._owned, {})
+        self.assertRaises(RuntimeError, self.manager.get_text, "CLIPBOARD")
+        self.assertRaises(RuntimeError, self.manager.set_text, "CLIPBOARD",
+                          u"text")
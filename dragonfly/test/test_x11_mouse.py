@@ -0,0 +1,119 @@
+#
+# This file is part of Dragonfly.
+# (c) Copyright 2007, 2008 by Christo Butcher
+# Licensed under the LGPL.
+#
+#   Dragonfly is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU Lesser General Public License as published
+#   by the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   Dragonfly is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public
+#   License along with Dragonfly.  If not, see
+#   <http://www.gnu.org/licenses/>.
+#
+
+"""
+Tests for the event queueing of the XTest mouse implementation
+
+These tests use a fake display connection, so they don't require an X
+server, only python-xlib.
+"""
+
+import importlib
+import sys
+import unittest
+
+try:
+    from Xlib import X
+    import Xlib.display
+except ImportError:
+    X = None
+
+
+#===========================================================================
+
+class FakeDisplay(object):
+    def __init__(self):
+        self.flushes = 0
+
+    def has_extension(self, name):
+        return True
+
+    def flush(self):
+        self.flushes += 1
+
+
+class FakeXTest(object):
+    def __init__(self):
+        self.inputs = []
+
+    def fake_input(self, display, event_type, detail=0, x=0, y=0):
+        if event_type == X.MotionNotify:
+            self.inputs.append(("motion", detail, x, y))
+        else:
+            self.inputs.append((event_type, detail))
+
+
+def import_xtest_mouse():
+    # Import the module with a fake display connection, without keeping it
+    # in sys.modules.
+    name = "dragonfly.actions.mouse._x11_xtest"
+    original_display = Xlib.display.Display
+    original_module = sys.modules.pop(name, None)
+    Xlib.display.Display = FakeDisplay
+    try:
+        return importlib.import_module(name)
+    finally:
+        Xlib.display.Display = original_display
+        if original_module is None:
+            sys.modules.pop(name, None)
+        else:
+            sys.modules[name] = original_module
+
+
+@unittest.skipIf(X is None, "python-xlib is not installed")
+class TestXTestMouse(unittest.TestCase):
+
+    def setUp(self):
+        self.module = import_xtest_mouse()
+        self.xtest = self.module.xtest = FakeXTest()
+
+    def execute(self, *events):
+        for event in events:
+            event.execute(None)
+        self.module.flush_events()
+
+    def button(self, down):
+        flags = self.module.PLATFORM_BUTTON_FLAGS["left"]
+        return self.module.ButtonEvent(flags[0 if down else 1])
+
+    def move(self, x, y):
+        return self.module.XTestMoveRelativeEvent(x, y)
+
+    def test_merged_motion(self):
+        """ Test that movements without buttons held down are merged. """
+        self.module.set_cursor_position(10, 20)
+        self.execute(self.move(5, 5), self.move(1, 2))
+        self.assertEqual(self.xtest.inputs, [("motion", False, 16, 27)])
+        self.assertEqual(self.module._display.flushes, 1)
+
+    def test_drag(self):
+        """ Test that each movement of a drag is sent. """
+        self.execute(self.move(1, 1), self.move(2, 2), self.button(True),
+                     self.move(10, 0), self.move(10, 0), self.move(0, 10),
+                     self.button(False), self.move(3, 3), self.move(4, 4))
+        self.assertEqual(self.xtest.inputs, [
+            ("motion", True, 3, 3),
+            (X.ButtonPress, 1),
+            ("motion", True, 10, 0),
+            ("motion", True, 10, 0),
+            ("motion", True, 0, 10),
+            (X.ButtonRelease, 1),
+            ("motion", True, 7, 7),
+        ])
@@ -18,6 +18,7 @@
 #   <http://www.gnu.org/licenses/>.
 #
 
+import os
 import sys
 
 # Import classes that work on all platforms.
@@ -27,6 +28,10 @@ from .window      import Window
 from .fake_window import FakeWindow
 from .monitor     import Monitor, monitors
 
-# Windows-specific
+# Platform-specific clipboard class, used throughout dragonfly.
 if sys.platform.startswith("win"):
-    from .clipboard    import Clipboard
+    from .clipboard     import Clipboard
+elif os.environ.get("XDG_SESSION_TYPE") == "x11":
+    from .x11_clipboard import X11Clipboard as Clipboard
+else:
+    from ..util         import Clipboard
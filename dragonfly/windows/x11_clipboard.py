@@ -0,0 +1,347 @@
+#
+# This file is part of Dragonfly.
+# (c) Copyright 2007, 2008 by Christo Butcher
+# Licensed under the LGPL.
+#
+#   Dragonfly is free software: you can redistribute it and/or modify it
+#   under the terms of the GNU Lesser General Public License as published
+#   by the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   Dragonfly is distributed in the hope that it will be useful, but
+#   WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#   Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public
+#   License along with Dragonfly.  If not, see
+#   <http://www.gnu.org/licenses/>.
+#
+
+"""
+This file implements an in-process interface to the X11 clipboard.
+
+Instead of running *xclip* or *xsel* for each clipboard operation, as
+*pyperclip* does, the :class:`X11Clipboard` class uses a persistent
+display connection to own the CLIPBOARD and PRIMARY selections directly.
+Requests for selection data from other applications are answered by a
+helper thread.
+
+If the X server supports the XFixes extension, selection owner changes are
+counted so that clipboard contents are only fetched from other
+applications when they have changed.
+
+Note that X11 selection data is owned by the application that set it.
+Text copied to the clipboard using this class is therefore no longer
+available after the Python process exits, unless a clipboard manager is
+running.
+"""
+
+import logging
+import threading
+
+from six import text_type
+
+from ..util.clipboard import Clipboard
+
+# Attempt to import python-xlib.  If this fails, the pyperclip
+#  implementation is used instead.
+try:
+    import Xlib.threaded
+    from Xlib import X, Xatom
+    from Xlib.error import ConnectionClosedError
+    from Xlib.display import Display
+    from Xlib.protocol import event as xevent
+except ImportError:
+    Display = None
+
+
+#===========================================================================
+
+class _SelectionManager(object):
+    """
+    Class for owning and retrieving X11 selections on a persistent display
+    connection.
+    """
+
+    _log = logging.getLogger("clipboard")
+
+    # Number of seconds to wait for a selection owner to send its data.
+    timeout = 1.0
+
+    def __init__(self):
+        self._display = Display()
+        self._window = self._display.screen().root.create_window(
+            0, 0, 1, 1, 0, X.CopyFromParent
+        )
+        atom = lambda name: self._display.intern_atom(name)
+        self._atoms = {
+            "CLIPBOARD": atom("CLIPBOARD"),
+            "PRIMARY": Xatom.PRIMARY,
+        }
+        self._targets = atom("TARGETS")
+        self._timestamp = atom("TIMESTAMP")
+        self._utf8_string = atom("UTF8_STRING")
+        self._text = atom("TEXT")
+        self._incr = atom("INCR")
+        self._property = atom("DRAGONFLY_SELECTION")
+
+        # Text content of owned selections.
+        self._owned = {}
+
+        # Change counters and cached content of each selection.
+        self._change_counts = dict((atom, 0) for atom in self._atoms.values())
+        self._cache = {}
+
+        # Ask the X server to notify us of selection owner changes, if
+        # possible.
+        self._xfixes = self._display.has_extension("XFIXES")
+        if self._xfixes:
+            self._display.xfixes_query_version()
+            self._xfixes_event_code = (self._display.extension_event
+                                       .SetSelectionOwnerNotify[0])
+            for atom in self._atoms.values():
+                # Select owner change, window destruction and client close
+                # notifications.
+                self._display.xfixes_select_selection_input(
+                    self._window, atom, 0x7
+                )
+
+        self._condition = threading.Condition()
+        self._notify_event = None
+        self.closed = False
+        self._display.flush()
+
+        # Start the helper thread which handles selection events.
+        self._thread = threading.Thread(target=self._event_loop,
+                                        name="X11SelectionThread")
+        self._thread.daemon = True
+        self._thread.start()
+
+    #-----------------------------------------------------------------------
+    # Event handling methods.
+
+    def _event_loop(self):
+        while True:
+            try:
+                event = self._display.next_event()
+            except ConnectionClosedError as e:
+                self._log.warning("X11 display connection closed: %s", e)
+                self._close()
+                return
+            try:
+                self._handle_event(event)
+            except Exception as e:
+                self._log.exception("Error handling X11 selection event:"
+                                    " %s", e)
+
+    def _close(self):
+        # Our selections are lost along with the connection.
+        with self._condition:
+            self.closed = True
+            for atom in list(self._owned):
+                self._change_counts[atom] += 1
+            self._owned.clear()
+            self._cache.clear()
+            self._condition.notify_all()
+
+    def _handle_event(self, event):
+        if event.type == X.SelectionRequest:
+            self._handle_selection_request(event)
+        elif event.type == X.SelectionClear:
+            with self._condition:
+                self._owned.pop(event.atom, None)
+                self._change_counts[event.atom] += 1
+        elif event.type == X.SelectionNotify:
+            with self._condition:
+                self._notify_event = event
+                self._condition.notify_all()
+        elif self._xfixes and event.type == self._xfixes_event_code:
+            with self._condition:
+                if event.selection in self._change_counts:
+                    self._change_counts[event.selection] += 1
+
+    def _handle_selection_request(self, event):
+        content = self._owned.get(event.selection)
+        prop = event.property
+        if prop == X.NONE:
+            # Obsolete clients use the target as the property.
+            prop = event.target
+        requestor = event.requestor
+        target = event.target
+
+        if content is None:
+            prop = X.NONE
+        elif target == self._targets:
+            targets = [self._targets, self._timestamp, self._utf8_string,
+                       self._text, Xatom.STRING]
+            requestor.change_property(prop, Xatom.ATOM, 32, targets)
+        elif target == self._timestamp:
+            requestor.change_property(prop, Xatom.INTEGER, 32,
+                                      [X.CurrentTime])
+        elif target in (self._utf8_string, self._text):
+            requestor.change_property(prop, self._utf8_string, 8,
+                                      content.encode("utf-8"))
+        elif target == Xatom.STRING:
+            requestor.change_property(prop, Xatom.STRING, 8,
+                                      content.encode("latin-1", "replace"))
+        else:
+            prop = X.NONE
+
+        notify = xevent.SelectionNotify(
+            time=event.time, requestor=requestor, selection=event.selection,
+            target=target, property=prop
+        )
+        requestor.send_event(notify)
+        self._display.flush()
+
+    #-----------------------------------------------------------------------
+    # Methods for getting and setting selection text.
+
+    def set_text(self, selection, content):
+        atom = self._atoms[selection]
+        with self._condition:
+            if self.closed:
+                raise RuntimeError("The X11 display connection is closed")
+            self._owned[atom] = content
+            self._window.set_selection_owner(atom, X.CurrentTime)
+            owner = self._display.get_selection_owner(atom)
+            if owner != self._window:
+                self._owned.pop(atom, None)
+                raise RuntimeError("Failed to take ownership of the %s"
+                                   " selection" % selection)
+
+            # Our own changes don't need to be fetched again.
+            self._change_counts[atom] += 1
+            self._cache[atom] = (self._change_counts[atom], content)
+
+    def get_text(self, selection):
+        atom = self._atoms[selection]
+        with self._condition:
+            if self.closed:
+                raise RuntimeError("The X11 display connection is closed")
+            # Use our own content if we still own the selection.
+            content = self._owned.get(atom)
+            if content is not None:
+                return content
+
+            # Use the cached content if the selection owner hasn't changed.
+            change_count = self._change_counts[atom]
+            if self._xfixes and atom in self._cache:
+                cached_count, content = self._cache[atom]
+                if cached_count == change_count:
+                    return content
+
+            content = self._fetch_text(atom)
+            self._cache[atom] = (change_count, content)
+            return content
+
+    def _fetch_text(self, atom):
+        # Note: this must be called with the condition's lock held.
+        if self._display.get_selection_owner(atom) == X.NONE:
+            return u""
+
+        for target in (self._utf8_string, Xatom.STRING):
+            self._notify_event = None
+            self._window.convert_selection(atom, target, self._property,
+                                           X.CurrentTime)
+            self._display.flush()
+            self._condition.wait(self.timeout)
+            event = self._notify_event
+            if event is None:
+                raise RuntimeError("Timed out waiting for selection data")
+            if event.property == X.NONE:
+                # The owner can't convert to this target.
+                continue
+
+            prop = self._window.get_full_property(self._property,
+                                                  X.AnyPropertyType)
+            self._window.delete_property(self._property)
+            if prop is None:
+                return u""
+            if prop.property_type == self._incr:
+                raise RuntimeError("Incremental selection transfers are not"
+                                   " supported")
+            value = prop.value
+            if isinstance(value, text_type):
+                return value
+            encoding = "utf-8" if target == self._utf8_string else "latin-1"
+            return value.decode(encoding, "replace")
+        return u""
+
+
+#===========================================================================
+
+class X11Clipboard(Clipboard):
+    """
+    Clipboard class for X11 that owns and retrieves the CLIPBOARD selection
+    in-process using `python-xlib`_.
+
+    This is Dragonfly's default clipboard class on X11.  It falls back on
+    the *pyperclip* methods of :class:`dragonfly.util.clipboard.Clipboard`
+    if python-xlib is not available or a selection operation fails.
+
+    .. _python-xlib: https://github.com/python-xlib/python-xlib
+
+    """
+
+    _log = logging.getLogger("clipboard")
+
+    #: The X11 selection used by this class: "CLIPBOARD" or "PRIMARY".
+    #: The *pyperclip* fallback is only used for the CLIPBOARD selection.
+    selection = "CLIPBOARD"
+
+    _manager = None
+    _manager_failed = False
+    _manager_lock = threading.Lock()
+
+    @classmethod
+    def _get_manager(cls):
+        with cls._manager_lock:
+            if X11Clipboard._manager and X11Clipboard._manager.closed:
+                # Try to connect again.
+                X11Clipboard._manager = None
+            if (X11Clipboard._manager is None and Display is not None and
+                    not X11Clipboard._manager_failed):
+                try:
+                    X11Clipboard._manager = _SelectionManager()
+                except Exception as e:
+                    cls._log.warning("Failed to initialize X11 selection"
+                                     " handling, using pyperclip instead:"
+                                     " %s", e)
+                    X11Clipboard._manager_failed = True
+            return X11Clipboard._manager
+
+    # ----------------------------------------------------------------------
+
+    @classmethod
+    def get_system_text(cls):
+        manager = cls._get_manager()
+        if manager:
+            try:
+                return manager.get_text(cls.selection)
+            except Exception as e:
+                if cls.selection != "CLIPBOARD":
+                    raise
+                cls._log.debug("Failed to get %s selection text: %s",
+                               cls.selection, e)
+        return super(X11Clipboard, cls).get_system_text()
+
+    @classmethod
+    def set_system_text(cls, content):
+        if not content:
+            content = u""
+        if not isinstance(content, text_type):
+            content = content.decode("utf-8")
+        manager = cls._get_manager()
+        if manager:
+            try:
+                manager.set_text(cls.selection, content)
+                return
+            except Exception as e:
+                if cls.selection != "CLIPBOARD":
+                    raise
+                cls._log.debug("Failed to set %s selection text: %s",
+                               cls.selection, e)
+        super(X11Clipboard, cls).set_system_text(content)
+
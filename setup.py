@@ -96,6 +96,7 @@ setup(
                         "six",
                         "pyperclip >= 1.7.0",
                         "enum34;python_version<'3.4'",
+                        "futures;python_version<'3.2'",
                         "regex",
                         "decorator",
                         "lark-parser == 0.8.*",